@@ -0,0 +1,387 @@
+"""
+DatabaseManager benchmark suite for COPE Telegram Referral Bot
+Fills a temporary SQLite database with deterministic synthetic data, times the
+main DatabaseManager query paths and records their EXPLAIN QUERY PLAN output.
+Runs fully offline.
+
+Usage: python -m benchmarks.db_benchmark --scale 10k --output report.json
+       python -m benchmarks.db_benchmark --scale 1m --compare report.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import REFERRAL_REWARD_PERCENTAGE
+from database.db_manager import DatabaseManager, _connector
+from utils.amounts import WEI_PER_TOKEN, apply_percentage
+from utils.periods import week_start
+
+
+logger = logging.getLogger(__name__)
+
+# Dataset presets, named by swap count
+SCALES = {
+    '10k': {'users': 1_000, 'mappings': 800, 'swaps': 10_000},
+    '1m': {'users': 100_000, 'mappings': 80_000, 'swaps': 1_000_000},
+    '10m': {'users': 1_000_000, 'mappings': 800_000, 'swaps': 10_000_000},
+}
+
+# Rows per executemany while generating
+GENERATE_CHUNK_SIZE = 50_000
+
+# Swaps per record_swap_events call (roughly one busy block range)
+INGEST_BATCH_SIZE = 500
+
+# Statements that have no query plan worth recording
+_UNPLANNED_PREFIXES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA', 'ATTACH')
+
+
+class DatasetGenerator:
+    """Deterministic synthetic users, wallets, referral mappings and swaps"""
+    
+    def __init__(self, seed: int, users: int, mappings: int, swaps: int,
+                 weeks: int = 4, referrer_ratio: float = 0.05, mapped_trade_ratio: float = 0.9):
+        self.seed = seed
+        self.users = users
+        self.mappings = min(mappings, users)
+        self.swaps = swaps
+        self.weeks = weeks
+        self.referrer_ratio = referrer_ratio
+        self.mapped_trade_ratio = mapped_trade_ratio
+        # Swaps cover the `weeks` full weeks before the current one plus the current week so far
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.start = week_start(self.now) - timedelta(days=7 * weeks)
+        self.wallets: List[str] = []
+        self.referrers: List[str] = []
+        self.mapped: List[str] = []
+    
+    def params(self) -> Dict:
+        return {
+            'seed': self.seed,
+            'users': self.users,
+            'mappings': self.mappings,
+            'swaps': self.swaps,
+            'weeks': self.weeks,
+            'referrer_ratio': self.referrer_ratio,
+            'mapped_trade_ratio': self.mapped_trade_ratio,
+        }
+    
+    def swap_rows(self, rng: random.Random, count: int, first_index: int,
+                  start: datetime, end: datetime):
+        """Swap rows with block numbers and timestamps increasing with the index"""
+        span = (end - start).total_seconds()
+        for i in range(count):
+            index = first_index + i
+            if self.mapped and rng.random() < self.mapped_trade_ratio:
+                trader = rng.choice(self.mapped)
+            else:
+                trader = rng.choice(self.wallets)
+            cope_amount = rng.randint(1, 1_000_000) * WEI_PER_TOKEN + rng.randrange(WEI_PER_TOKEN)
+            yield (
+                f"0x{rng.getrandbits(256):064x}",
+                trader,
+                'buy' if rng.random() < 0.5 else 'sell',
+                str(cope_amount),
+                '0',
+                str(apply_percentage(cope_amount, 0.06)),
+                30_000_000 + index,
+                start + timedelta(seconds=span * i / max(count, 1)),
+            )
+    
+    def populate(self, db_path: str) -> Dict:
+        """Write the dataset into an initialised database file; returns row counts"""
+        rng = random.Random(self.seed)
+        self.wallets = [f"0x{rng.getrandbits(160):040x}" for _ in range(self.users)]
+        self.referrers = self.wallets[:max(1, int(self.users * self.referrer_ratio))]
+        candidates = self.wallets[len(self.referrers):]
+        self.mapped = rng.sample(candidates, min(self.mappings, len(candidates)))
+        # Referral popularity is heavy-tailed: a few referrers bring most wallets
+        weights = [1.0 / (rank + 1) for rank in range(len(self.referrers))]
+        
+        conn = _connector(db_path)()
+        try:
+            conn.executemany(
+                "INSERT INTO users (telegram_id, username) VALUES (?, ?)",
+                ((100_000 + i, f"user{i}") for i in range(self.users))
+            )
+            conn.executemany(
+                "INSERT INTO wallets (telegram_id, wallet_address) VALUES (?, ?)",
+                ((100_000 + i, wallet) for i, wallet in enumerate(self.wallets))
+            )
+            conn.executemany(
+                "INSERT INTO referral_codes (referral_code, referrer_wallet) VALUES (?, ?)",
+                ((f"{i:08X}", wallet) for i, wallet in enumerate(self.referrers))
+            )
+            referrer_of = rng.choices(self.referrers, weights=weights, k=len(self.mapped))
+            conn.executemany(
+                """INSERT INTO wallet_referrer_mapping (referred_wallet, referrer_wallet, is_locked)
+                   VALUES (?, ?, 0)""",
+                zip(self.mapped, referrer_of)
+            )
+            
+            for first in range(0, self.swaps, GENERATE_CHUNK_SIZE):
+                count = min(GENERATE_CHUNK_SIZE, self.swaps - first)
+                chunk_start = self.start + (self.now - self.start) * first / self.swaps
+                chunk_end = self.start + (self.now - self.start) * (first + count) / self.swaps
+                conn.executemany(
+                    """INSERT INTO swap_events 
+                       (transaction_hash, trader_wallet, swap_type, cope_amount, 
+                        bnb_amount, cope_tax_amount, block_number, block_timestamp)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    self.swap_rows(rng, count, first, chunk_start, chunk_end)
+                )
+            
+            # Same first-trade lock the ingestion path applies
+            conn.execute(
+                """UPDATE wallet_referrer_mapping 
+                   SET is_locked = 1,
+                       (first_trade_hash, first_trade_at) = (
+                           SELECT se.transaction_hash, se.block_timestamp
+                           FROM swap_events se
+                           WHERE se.trader_wallet = wallet_referrer_mapping.referred_wallet
+                           ORDER BY se.block_number, se.id
+                           LIMIT 1
+                       )
+                   WHERE referred_wallet IN (SELECT trader_wallet FROM swap_events)"""
+            )
+            conn.commit()
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+        
+        return {
+            'users': self.users,
+            'referrers': len(self.referrers),
+            'mappings': len(self.mapped),
+            'swaps': self.swaps,
+        }
+
+
+class DatabaseBenchmark:
+    """Times DatabaseManager methods and captures the SQL they run"""
+    
+    def __init__(self, db: DatabaseManager, dataset: DatasetGenerator, repeats: int):
+        self.db = db
+        self.dataset = dataset
+        self.repeats = max(1, repeats)
+        self.rng = random.Random(dataset.seed + 1)
+        self._statements: List[str] = []
+    
+    def _connections(self):
+        return self.db._readers + ([self.db._writer] if self.db._writer else [])
+    
+    async def _trace(self, enabled: bool):
+        callback = self._statements.append if enabled else None
+        for conn in self._connections():
+            await conn.set_trace_callback(callback)
+    
+    async def _query_plans(self, statements: List[str]) -> List[Dict]:
+        """
+        EXPLAIN QUERY PLAN for each distinct traced statement
+        Traced SQL has its parameters inlined, so plain INSERT ... VALUES rows
+        (which have no plan) are left out rather than listed once per row
+        """
+        plans, seen = [], set()
+        async with self.db._read() as conn:
+            for sql in statements:
+                normalized = " ".join(sql.split())
+                if normalized in seen or normalized.upper().startswith(_UNPLANNED_PREFIXES):
+                    continue
+                seen.add(normalized)
+                try:
+                    async with conn.execute(f"EXPLAIN QUERY PLAN {sql}") as cursor:
+                        rows = await cursor.fetchall()
+                except sqlite3.Error as e:
+                    plans.append({'sql': normalized, 'error': str(e)})
+                    continue
+                if rows:
+                    plans.append({'sql': normalized, 'plan': [row[3] for row in rows]})
+        return plans
+    
+    async def measure(self, name: str, call: Callable[[], Awaitable]) -> Dict:
+        """Run a warm-up call, one traced call for the query plans, then `repeats` timed calls"""
+        await call()
+        self._statements = []
+        await self._trace(True)
+        try:
+            await call()
+        finally:
+            await self._trace(False)
+        plans = await self._query_plans(self._statements)
+        
+        runs = []
+        for _ in range(self.repeats):
+            started = time.perf_counter()
+            await call()
+            runs.append((time.perf_counter() - started) * 1000)
+        
+        result = {
+            'runs_ms': [round(run, 3) for run in runs],
+            'min_ms': round(min(runs), 3),
+            'median_ms': round(statistics.median(runs), 3),
+            'max_ms': round(max(runs), 3),
+            'statements': len(self._statements),
+            'query_plans': plans,
+        }
+        logger.info(f"{name}: median {result['median_ms']:.3f} ms over {self.repeats} runs")
+        return result
+    
+    def _new_swaps(self) -> List[Dict]:
+        """A fresh ingestion batch in the current week"""
+        rows = self.dataset.swap_rows(
+            self.rng, INGEST_BATCH_SIZE, self.dataset.swaps + self.rng.randrange(10 ** 9),
+            week_start(self.dataset.now), self.dataset.now
+        )
+        fields = ('transaction_hash', 'trader_wallet', 'swap_type', 'cope_amount',
+                  'bnb_amount', 'cope_tax_amount', 'block_number', 'block_timestamp')
+        return [dict(zip(fields, row)) for row in rows]
+    
+    async def _resolve_traders(self):
+        """Cold-cache referrer lookup for one ingestion batch's traders"""
+        traders = [swap['trader_wallet'] for swap in self._new_swaps()]
+        self.db._referrer_by_wallet.clear()
+        self.db._unmapped_wallets.clear()
+        return await self.db.get_referrers_for_wallets(traders)
+    
+    async def run(self) -> Dict[str, Dict]:
+        period_start = week_start(self.dataset.now) - timedelta(days=7)
+        period_end = period_start + timedelta(days=7)
+        referrers = self.dataset.referrers
+        # Settlement passes the taxes it already computed, so save_weekly_rewards doesn't re-query
+        taxes = await self.db.calculate_weekly_taxes(period_start, period_end)
+        rewards = {wallet: apply_percentage(tax, REFERRAL_REWARD_PERCENTAGE) for wallet, tax in taxes.items()}
+        # Build swap_events_all on every pooled connection up front so it isn't traced or timed
+        for conn in self._connections():
+            await self.db._ensure_swap_view(conn)
+        
+        cases: List[Tuple[str, Callable[[], Awaitable]]] = [
+            ('get_referral_stats', lambda: self.db.get_referral_stats(self.rng.choice(referrers))),
+            ('get_leaderboard', lambda: self.db.get_leaderboard(10)),
+            ('calculate_weekly_rewards', lambda: self.db.calculate_weekly_rewards(period_start, period_end)),
+            ('save_weekly_rewards', lambda: self.db.save_weekly_rewards(
+                period_start, period_end, rewards, "0x" + "00" * 32, taxes=taxes)),
+            ('record_swap_events', lambda: self.db.record_swap_events(self._new_swaps())),
+            ('get_referrers_for_wallets', self._resolve_traders),
+        ]
+        return {name: await self.measure(name, call) for name, call in cases}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline: Dict, report: Dict):
+    """Print median timings against a previous report"""
+    print(f"{'method':<28}{'baseline ms':>14}{'current ms':>14}{'ratio':>9}")
+    for name, result in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            print(f"{name:<28}{'-':>14}{result['median_ms']:>14.3f}{'-':>9}")
+            continue
+        ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        print(f"{name:<28}{old['median_ms']:>14.3f}{result['median_ms']:>14.3f}{ratio:>8.2f}x")
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    params = dict(SCALES[args.scale])
+    for key in ('users', 'mappings', 'swaps'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    dataset = DatasetGenerator(args.seed, weeks=args.weeks, **params)
+    
+    workdir = tempfile.mkdtemp(prefix="cope_bench_")
+    db_path = os.path.join(workdir, "bench.db")
+    # Schema only; bulk data goes in over a plain connection
+    setup = DatabaseManager(db_path)
+    await setup.init_db()
+    await setup.close()
+    
+    started = time.perf_counter()
+    counts = dataset.populate(db_path)
+    generate_s = time.perf_counter() - started
+    logger.info(f"Generated {counts} in {generate_s:.1f}s at {db_path}")
+    
+    db = DatabaseManager(db_path)
+    await db.init_db()  # Backfills referrer_aggregates from the generated rows
+    try:
+        started = time.perf_counter()
+        await db.rebuild_referrer_aggregates()
+        rebuild_s = time.perf_counter() - started
+        results = await DatabaseBenchmark(db, dataset, args.repeats).run()
+    finally:
+        await db.close()
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            os.rmdir(workdir)
+    
+    return {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'scale': args.scale,
+        'params': dataset.params(),
+        'dataset': {
+            **counts,
+            'generate_s': round(generate_s, 3),
+            'rebuild_aggregates_s': round(rebuild_s, 3),
+            'path': db_path if args.keep else None,
+        },
+        'repeats': args.repeats,
+        'results': results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="COPE bot DatabaseManager benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default='10k', help="dataset preset")
+    parser.add_argument("--users", type=int, help="override the preset's user/wallet count")
+    parser.add_argument("--mappings", type=int, help="override the preset's referral mapping count")
+    parser.add_argument("--swaps", type=int, help="override the preset's swap count")
+    parser.add_argument("--weeks", type=int, default=4, help="completed weeks of swap history")
+    parser.add_argument("--seed", type=int, default=1, help="generator seed")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per method")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to compare medians against")
+    parser.add_argument("--keep", action="store_true", help="keep the generated database")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = asyncio.run(run(args))
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Transfer log decoding benchmark for COPE Telegram Referral Bot
+Times the per-event decode path the listener used to run (string slicing plus a
+pool list rebuilt for every event) against chain.decoder.TransferDecoder on the
+same eth_getLogs-shaped fixture. Runs fully offline.
+
+Usage: python -m benchmarks.decode_benchmark --events 100000 --output report.json
+       python -m benchmarks.decode_benchmark --fixture logs.json.gz --compare report.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+from config import APPROVED_LIQUIDITY_POOLS, TOKEN_CONTRACT
+from benchmarks.db_benchmark import _git_commit, compare_reports
+from chain.decoder import TransferDecoder, address_topic
+from chain.replay import FIXTURE_VERSION, load_fixture, save_fixture
+from chain.rpc import normalize_log
+
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_EVENT_SIGNATURE = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+class FixtureGenerator:
+    """Deterministic raw Transfer logs, shaped like an eth_getLogs result"""
+    
+    def __init__(self, seed: int, events: int, pools: Sequence[str], pool_ratio: float = 0.9,
+                 wallets: int = 5_000):
+        self.seed = seed
+        self.events = events
+        self.pools = list(pools)
+        self.pool_ratio = pool_ratio
+        self.wallets = wallets
+    
+    def params(self) -> Dict:
+        return {
+            'seed': self.seed,
+            'events': self.events,
+            'pools': len(self.pools),
+            'pool_ratio': self.pool_ratio,
+            'wallets': self.wallets,
+        }
+    
+    def logs(self) -> List[Dict]:
+        rng = random.Random(self.seed)
+        wallets = ["0x%040x" % rng.getrandbits(160) for _ in range(self.wallets)]
+        logs = []
+        block = 40_000_000
+        for i in range(self.events):
+            if rng.random() < 0.3:
+                block += 1
+            wallet = rng.choice(wallets)
+            if rng.random() < self.pool_ratio:
+                pool = rng.choice(self.pools)
+                sender, recipient = (pool, wallet) if rng.random() < 0.5 else (wallet, pool)
+            else:
+                sender, recipient = wallet, rng.choice(wallets)
+            logs.append({
+                'address': TOKEN_CONTRACT.lower(),
+                'topics': [TRANSFER_EVENT_SIGNATURE, address_topic(sender), address_topic(recipient)],
+                'data': "0x%064x" % rng.randrange(10 ** 15, 10 ** 24),
+                'blockNumber': hex(block),
+                'blockHash': "0x%064x" % block,
+                'transactionHash': "0x%064x" % (i + 1),
+                'transactionIndex': hex(i % 200),
+                'logIndex': hex(i % 500),
+                'removed': False,
+            })
+        return logs
+
+
+def fixture_transfers(fixture: Dict) -> List[Dict]:
+    """The token's Transfer logs in a replay fixture (recorded ones also hold pair Swap logs)"""
+    token = fixture.get('token', TOKEN_CONTRACT).lower()
+    return [
+        log for log in fixture['logs']
+        if log['topics'][0] == TRANSFER_EVENT_SIGNATURE and log['address'].lower() == token
+    ]
+
+
+def per_event_decode(events: Sequence[Dict], pools: Sequence[str]) -> List[tuple]:
+    """The listener's original decode path, one event at a time"""
+    decoded = []
+    for row, event in enumerate(events):
+        from_address = "0x" + event['topics'][1][-40:]
+        to_address = "0x" + event['topics'][2][-40:]
+        amount = int(event['data'], 16)
+        pool_addresses = [pool.lower() for pool in pools]
+        if to_address.lower() in pool_addresses:
+            decoded.append((row, "sell", from_address.lower(), amount))
+        elif from_address.lower() in pool_addresses:
+            decoded.append((row, "buy", to_address.lower(), amount))
+    return decoded
+
+
+def batch_decode(decoder: TransferDecoder, events: Sequence[Dict]) -> List[tuple]:
+    """TransferDecoder, unpacked to the same tuples for the equivalence check"""
+    batch = decoder.decode(events)
+    return [
+        (batch.rows[i], batch.swap_type(i), batch.traders[i], batch.amounts[i])
+        for i in range(len(batch))
+    ]
+
+
+def measure(name: str, call: Callable[[], object], events: int, repeats: int) -> Dict:
+    """One warm-up call, then `repeats` timed calls"""
+    call()
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        runs.append((time.perf_counter() - started) * 1000)
+    
+    median = statistics.median(runs)
+    result = {
+        'runs_ms': [round(run, 3) for run in runs],
+        'min_ms': round(min(runs), 3),
+        'median_ms': round(median, 3),
+        'max_ms': round(max(runs), 3),
+        'events_per_second': round(events / (median / 1000)) if median else None,
+    }
+    logger.info(f"{name}: median {result['median_ms']:.3f} ms over {repeats} runs")
+    return result
+
+
+def run(args: argparse.Namespace) -> Dict:
+    pools = [pool.lower() for pool in APPROVED_LIQUIDITY_POOLS]
+    # Extra synthetic pools show how each path scales with the approved pool list
+    rng = random.Random(args.seed)
+    pools += ["0x%040x" % rng.getrandbits(160) for _ in range(args.extra_pools)]
+    
+    if args.fixture:
+        raw = fixture_transfers(load_fixture(args.fixture))
+        params = {'fixture': args.fixture, 'events': len(raw), 'pools': len(pools)}
+    else:
+        generator = FixtureGenerator(args.seed, args.events, pools, args.pool_ratio)
+        raw = generator.logs()
+        params = generator.params()
+        if args.save_fixture:
+            save_fixture(args.save_fixture, {
+                'version': FIXTURE_VERSION,
+                'generated': params,
+                'token': TOKEN_CONTRACT.lower(),
+                'pools': pools,
+                'logs': raw,
+            })
+            logger.info(f"Fixture written to {args.save_fixture}")
+    
+    # The listener decodes normalized logs (int block numbers), so both paths get those
+    events = [normalize_log(log) for log in raw]
+    decoder = TransferDecoder(pools)
+    
+    expected = per_event_decode(events, pools)
+    if batch_decode(decoder, events) != expected:
+        raise RuntimeError("TransferDecoder disagrees with the per-event decode path")
+    
+    results = {
+        'per_event': measure('per_event', lambda: per_event_decode(events, pools), len(events), args.repeats),
+        'batch': measure('batch', lambda: decoder.decode(events), len(events), args.repeats),
+    }
+    speedup = results['per_event']['median_ms'] / results['batch']['median_ms'] if results['batch']['median_ms'] else None
+    
+    return {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'params': params,
+        'swaps_decoded': len(expected),
+        'repeats': args.repeats,
+        'speedup': round(speedup, 2) if speedup else None,
+        'results': results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="COPE bot Transfer log decoding benchmark")
+    parser.add_argument("--events", type=int, default=100_000, help="synthetic Transfer logs to generate")
+    parser.add_argument("--pool-ratio", type=float, default=0.9, help="share of generated logs that touch a pool")
+    parser.add_argument("--extra-pools", type=int, default=0, help="synthetic pools added to APPROVED_LIQUIDITY_POOLS")
+    parser.add_argument("--seed", type=int, default=1, help="generator seed")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per path")
+    parser.add_argument("--fixture", help="decode the Transfers of a saved or recorded replay fixture instead")
+    parser.add_argument("--save-fixture", help="write the generated logs here for later runs")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to compare medians against")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = run(args)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+End-to-end ingestion benchmark for COPE Telegram Referral Bot
+Replays a chain fixture (recorded from a node, or generated) through
+COPEEventListener into a temporary SQLite database, with optional injected RPC
+latency and errors, and reports logs/sec for the sequential and pipelined
+ingestion loops. Runs fully offline once a fixture exists.
+
+Usage: python -m benchmarks.ingest_benchmark --events 50000 --latency 0.05 --output report.json
+       python -m benchmarks.ingest_benchmark --record --from-block 40000000 --to-block 40010000 --fixture chain.json.gz
+       python -m benchmarks.ingest_benchmark --fixture chain.json.gz --compare report.json --max-regression 1.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+from config import APPROVED_LIQUIDITY_POOLS, RPC_ENDPOINTS, TOKEN_CONTRACT
+from benchmarks.db_benchmark import _git_commit, compare_reports
+from benchmarks.decode_benchmark import FixtureGenerator
+from chain.decoder import TransferDecoder, address_topic
+from chain.event_listener import COPEEventListener, DEXSwapEventListener
+from chain.pipeline import IngestionPipeline
+from chain.replay import (
+    FIXTURE_VERSION, ChainRecorder, InjectedTimeout, ReplayRPCClient, call_key, load_fixture, save_fixture
+)
+from chain.rpc import AsyncRPCClient, normalize_log
+from database.db_manager import DatabaseManager
+
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sequential', 'pipeline')
+
+# Wallet every mapped trader is referred by
+REFERRER_WALLET = "0x" + "ab" * 20
+
+# Share of a buy's pre-tax amount that reaches the buyer in generated Swaps
+_BUY_RECEIVED = (94, 100)
+
+
+def synthetic_fixture(generator: FixtureGenerator) -> Dict:
+    """
+    Replay fixture from generated Transfer logs: each pool Transfer is followed by
+    its pair's Swap log, with COPE as token0 of every pair
+    """
+    pool_by_topic = {address_topic(pool): pool.lower() for pool in generator.pools}
+    logs = []
+    for log in generator.logs():
+        logs.append(log)
+        from_topic, to_topic = log['topics'][1], log['topics'][2]
+        amount = int(log['data'], 16)
+        if to_topic in pool_by_topic:
+            pool, words = pool_by_topic[to_topic], (amount, 0, 0, amount // 5000)
+        elif from_topic in pool_by_topic:
+            sent = amount * _BUY_RECEIVED[1] // _BUY_RECEIVED[0]
+            pool, words = pool_by_topic[from_topic], (0, sent // 5000, sent, 0)
+        else:
+            continue
+        logs.append({
+            **log,
+            'address': pool,
+            'topics': [DEXSwapEventListener.SWAP_EVENT_SIGNATURE, address_topic(pool), to_topic],
+            'data': "0x" + "".join("%064x" % word for word in words),
+            'logIndex': hex(int(log['logIndex'], 16) + 1),
+        })
+    
+    blocks = sorted({int(log['blockNumber'], 16) for log in logs})
+    headers = {
+        str(number): {
+            'number': hex(number),
+            'hash': "0x%064x" % number,
+            'parentHash': "0x%064x" % (number - 1),
+            'timestamp': hex(1_767_600_000 + 3 * (number - blocks[0])),
+        }
+        for number in blocks
+    }
+    # token0() returns the address as one 32-byte word
+    token0 = address_topic(TOKEN_CONTRACT)
+    return {
+        'version': FIXTURE_VERSION,
+        'generated': generator.params(),
+        'token': TOKEN_CONTRACT.lower(),
+        'pools': list(pool_by_topic.values()),
+        'from_block': blocks[0],
+        'to_block': blocks[-1],
+        'logs': logs,
+        'blocks': headers,
+        'calls': {
+            call_key({'to': pool, 'data': DEXSwapEventListener.TOKEN0_SELECTOR}): token0
+            for pool in pool_by_topic.values()
+        },
+    }
+
+
+def fixture_traders(fixture: Dict) -> List[str]:
+    """Distinct traders of the fixture's pool Transfers, in first-seen order"""
+    transfers = [
+        log for log in fixture['logs']
+        if log['topics'][0] == COPEEventListener.TRANSFER_EVENT_SIGNATURE
+        and log['address'].lower() == fixture['token'].lower()
+    ]
+    batch = TransferDecoder(fixture['pools']).decode([normalize_log(log) for log in transfers])
+    return list(dict.fromkeys(batch.traders))
+
+
+async def _template_database(path: str, traders: Sequence[str]):
+    """Schema plus a referral mapping for each of `traders`"""
+    db = DatabaseManager(path)
+    await db.init_db()
+    try:
+        for trader in traders:
+            await db.create_referral_mapping(trader, REFERRER_WALLET)
+    finally:
+        await db.close()
+
+
+async def _swap_rows(db: DatabaseManager) -> List[tuple]:
+    async with db._read() as conn:
+        async with conn.execute(
+            """SELECT transaction_hash, trader_wallet, swap_type, cope_amount, bnb_amount, cope_tax_amount
+               FROM swap_events ORDER BY transaction_hash"""
+        ) as cursor:
+            return await cursor.fetchall()
+
+
+async def _run_sequential(listener: COPEEventListener, to_block: int, max_restarts: int) -> int:
+    """
+    poll_once until caught up, retrying straight away after injected timeouts
+    Any other error, or more than max_restarts restarts, fails the run
+    Returns: the restarts
+    """
+    restarts = 0
+    while True:
+        try:
+            if await listener.poll_once() and listener.last_processed_block >= to_block:
+                return restarts
+        except InjectedTimeout as e:
+            restarts += 1
+            if restarts > max_restarts:
+                raise RuntimeError(f"Sequential ingestion gave up after {max_restarts} restarts") from e
+            logger.debug(f"Sequential poll failed, retrying: {e!r}")
+
+
+async def _run_pipeline(listener: COPEEventListener, to_block: int, depth: int, max_restarts: int) -> int:
+    """
+    Run the staged pipeline until the checkpoint reaches to_block, restarting it
+    after injected timeouts; any other error, or more than max_restarts restarts,
+    fails the run
+    Returns: the restarts
+    """
+    listener.pipeline = IngestionPipeline(listener, depth)
+    listener.is_running = True
+    restarts = 0
+    task = None
+    try:
+        while listener.last_processed_block < to_block:
+            task = asyncio.create_task(listener.pipeline.run())
+            while not task.done() and listener.last_processed_block < to_block:
+                await asyncio.wait({task}, timeout=0.01)
+            if task.done() and task.exception() is not None:
+                error = task.exception()
+                if not isinstance(error, InjectedTimeout):
+                    raise error
+                restarts += 1
+                if restarts > max_restarts:
+                    raise RuntimeError(f"Pipelined ingestion gave up after {max_restarts} restarts") from error
+                logger.debug(f"Pipeline failed, restarting: {error!r}")
+    finally:
+        listener.is_running = False
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    return restarts
+
+
+async def ingest_once(fixture: Dict, template: str, workdir: str, mode: str, args: argparse.Namespace) -> Dict:
+    """Replay the whole fixture into a fresh copy of the template database"""
+    db_path = os.path.join(workdir, f"{mode}.db")
+    shutil.copyfile(template, db_path)
+    db = DatabaseManager(db_path)
+    await db.init_db()
+    rpc = ReplayRPCClient(
+        fixture, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        seed=args.seed, max_concurrency=args.concurrency
+    )
+    # Historical blocks: everything is final, so no provisional staging
+    listener = COPEEventListener(db, rpc=rpc, confirmations=0)
+    listener.last_processed_block = fixture['from_block'] - 1
+    try:
+        started = time.perf_counter()
+        if mode == 'pipeline':
+            restarts = await _run_pipeline(listener, fixture['to_block'], args.depth, args.max_restarts)
+        else:
+            restarts = await _run_sequential(listener, fixture['to_block'], args.max_restarts)
+        elapsed = time.perf_counter() - started
+        rows = await _swap_rows(db)
+        metrics = listener.metrics()
+    finally:
+        await rpc.close()
+        await db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    return {
+        'elapsed_s': elapsed,
+        'rows': rows,
+        'restarts': restarts,
+        'requests': rpc.requests,
+        'injected_errors': rpc.injected_errors,
+        'pipeline': metrics['pipeline'] if mode == 'pipeline' else None,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    if args.fixture:
+        fixture = load_fixture(args.fixture)
+        source = {'fixture': args.fixture}
+    else:
+        generator = FixtureGenerator(args.seed, args.events, APPROVED_LIQUIDITY_POOLS, args.pool_ratio)
+        fixture = synthetic_fixture(generator)
+        source = generator.params()
+        if args.save_fixture:
+            save_fixture(args.save_fixture, fixture)
+            logger.info(f"Fixture written to {args.save_fixture}")
+    
+    traders = fixture_traders(fixture)
+    mapped = traders[:int(len(traders) * args.mapped_ratio)]
+    workdir = tempfile.mkdtemp(prefix="cope_ingest_")
+    template = os.path.join(workdir, "template.db")
+    try:
+        await _template_database(template, mapped)
+        modes = MODES if args.mode == 'both' else (args.mode,)
+        results, reference = {}, None
+        for mode in modes:
+            runs = [await ingest_once(fixture, template, workdir, mode, args) for _ in range(args.repeats)]
+            for result in runs:
+                if reference is None:
+                    reference = result['rows']
+                elif result['rows'] != reference:
+                    raise RuntimeError(f"{mode} ingestion recorded different swaps than the first run")
+            
+            median = statistics.median(result['elapsed_s'] for result in runs)
+            results[mode] = {
+                'runs_ms': [round(result['elapsed_s'] * 1000, 3) for result in runs],
+                'median_ms': round(median * 1000, 3),
+                'logs_per_second': round(len(fixture['logs']) / median) if median else None,
+                'blocks_per_second': round((fixture['to_block'] - fixture['from_block'] + 1) / median) if median else None,
+                'requests': runs[-1]['requests'],
+                'injected_errors': runs[-1]['injected_errors'],
+                'restarts': [result['restarts'] for result in runs],
+                'pipeline': runs[-1]['pipeline'],
+            }
+            logger.info(
+                f"{mode}: median {results[mode]['median_ms']:.1f} ms, "
+                f"{results[mode]['logs_per_second']} logs/s over {args.repeats} runs, "
+                f"{sum(results[mode]['restarts'])} restarts after injected timeouts"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'source': source,
+        'fixture': {
+            'logs': len(fixture['logs']),
+            'from_block': fixture['from_block'],
+            'to_block': fixture['to_block'],
+            'traders': len(traders),
+            'mapped_traders': len(mapped),
+        },
+        'swaps_recorded': len(reference or []),
+        'replay': {
+            'latency_s': args.latency,
+            'jitter_s': args.jitter,
+            'error_rate': args.error_rate,
+            'concurrency': args.concurrency,
+            'pipeline_depth': args.depth,
+        },
+        'repeats': args.repeats,
+        'results': results,
+    }
+
+
+async def record(args: argparse.Namespace) -> int:
+    rpc = AsyncRPCClient(args.rpc_url or RPC_ENDPOINTS)
+    try:
+        fixture = await ChainRecorder(rpc).record(args.from_block, args.to_block)
+    finally:
+        await rpc.close()
+    save_fixture(args.fixture, fixture)
+    logger.info(f"Recorded {len(fixture['logs'])} logs and {len(fixture['blocks'])} headers to {args.fixture}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="COPE bot end-to-end ingestion benchmark")
+    parser.add_argument("--record", action="store_true", help="record --from-block..--to-block from a node into --fixture")
+    parser.add_argument("--from-block", type=int, help="--record: first block")
+    parser.add_argument("--to-block", type=int, help="--record: last block")
+    parser.add_argument("--rpc-url", action="append", help="--record: RPC endpoint (repeatable; default RPC_ENDPOINTS)")
+    parser.add_argument("--fixture", help="replay this recorded fixture (.json or .json.gz) instead of generating one")
+    parser.add_argument("--save-fixture", help="write the generated fixture here for later runs")
+    parser.add_argument("--events", type=int, default=20_000, help="synthetic Transfer logs to generate")
+    parser.add_argument("--pool-ratio", type=float, default=0.9, help="share of generated Transfers that touch a pool")
+    parser.add_argument("--mapped-ratio", type=float, default=0.5, help="share of traders given a referrer")
+    parser.add_argument("--seed", type=int, default=1, help="generator and error-injection seed")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every replayed RPC request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of replayed requests that time out")
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight replayed requests")
+    parser.add_argument("--depth", type=int, default=2, help="pipeline queue depth")
+    parser.add_argument("--max-restarts", type=int, default=100,
+                        help="restarts after injected timeouts allowed per run before it fails")
+    parser.add_argument("--mode", choices=MODES + ('both',), default='both', help="ingestion loop(s) to time")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per mode")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON report to compare medians against")
+    parser.add_argument("--max-regression", type=float,
+                        help="with --compare: exit 1 if any mode's median is this many times the baseline's")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.record:
+        if args.from_block is None or args.to_block is None or not args.fixture:
+            parser.error("--record needs --from-block, --to-block and --fixture")
+        return asyncio.run(record(args))
+    
+    try:
+        report = asyncio.run(run(args))
+    except Exception:
+        logger.exception("Ingestion benchmark failed")
+        return 1
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Report written to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        compare_reports(baseline, report)
+        if args.max_regression:
+            regressed = [
+                mode for mode, result in report['results'].items()
+                if mode in baseline.get('results', {}) and baseline['results'][mode]['median_ms']
+                and result['median_ms'] > args.max_regression * baseline['results'][mode]['median_ms']
+            ]
+            if regressed:
+                logger.error(f"Ingestion regressed beyond {args.max_regression}x: {', '.join(regressed)}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
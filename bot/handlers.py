@@ -11,6 +11,8 @@ import json
 import logging
 
 from database.db_manager import DatabaseManager
+from rewards.leaderboard import LeaderboardEngine
+from utils.amounts import from_wei
 from utils.wallet_verification import (
     generate_verification_message, 
     verify_signature,
@@ -19,7 +21,7 @@ from utils.wallet_verification import (
 )
 from config import (
     TOKEN_NAME, TOKEN_SYMBOL, TOKEN_CONTRACT, CHAIN,
-    MIN_WITHDRAWAL_THRESHOLD, BOT_MESSAGES
+    MIN_WITHDRAWAL_THRESHOLD, BOT_MESSAGES, LEADERBOARD_SIZE
 )
 
 logger = logging.getLogger(__name__)
@@ -28,8 +30,9 @@ logger = logging.getLogger(__name__)
 class BotHandlers:
     """Handles all Telegram bot commands"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, leaderboard: Optional[LeaderboardEngine] = None):
         self.db = db_manager
+        self.leaderboard = leaderboard
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command - Initialize user"""
@@ -422,8 +425,8 @@ Share your link and start earning! 🚀"""
         message = f"""📊 **Your Referral Stats**
 
 👤 **Referrals:** {stats['referred_count']} active wallets
-📈 **Trade Volume:** {stats['total_volume']:,.2f} {TOKEN_SYMBOL}
-💰 **Accrued Reward:** {stats['accrued_rewards']:,.2f} {TOKEN_SYMBOL}
+📈 **Trade Volume:** {from_wei(stats['total_volume']):,.2f} {TOKEN_SYMBOL}
+💰 **Accrued Reward:** {from_wei(stats['accrued_rewards']):,.2f} {TOKEN_SYMBOL}
 
 🏦 **Withdraw Status:** {status_emoji} {status_text}
 📉 **Min. Threshold:** {MIN_WITHDRAWAL_THRESHOLD:,} {TOKEN_SYMBOL}
@@ -441,18 +444,27 @@ Share your link and start earning! 🚀"""
             await update.message.reply_text(message, parse_mode='Markdown')
     
     async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /leaderboard command - Show top referrers"""
-        leaderboard = await self.db.get_leaderboard(limit=10)
+        """Handle /leaderboard command - Show top referrers (/leaderboard week for this week)"""
+        weekly = bool(context.args) and context.args[0].lower() == "week"
+        
+        # Served from memory when the leaderboard engine is running
+        if self.leaderboard is not None:
+            leaderboard = self.leaderboard.get_leaderboard(limit=LEADERBOARD_SIZE, weekly=weekly)
+        elif weekly:
+            leaderboard = []
+        else:
+            leaderboard = await self.db.get_leaderboard(limit=LEADERBOARD_SIZE)
         
         if not leaderboard:
             await update.message.reply_text("📊 No referrals yet. Be the first!")
             return
         
-        message = "🏆 **Top Referrers**\n\n"
+        title = "Top Referrers This Week" if weekly else "Top Referrers"
+        message = f"🏆 **{title}**\n\n"
         for i, (wallet, rewards, count) in enumerate(leaderboard, 1):
             medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
             message += f"{medal} `{format_wallet_address(wallet)}`\n"
-            message += f"   Rewards: {rewards:,.2f} {TOKEN_SYMBOL}\n"
+            message += f"   Rewards: {from_wei(rewards):,.2f} {TOKEN_SYMBOL}\n"
             message += f"   Referrals: {count}\n\n"
         
         await update.message.reply_text(message, parse_mode='Markdown')
@@ -520,7 +532,7 @@ Share your link and start earning! 🚀"""
 
 **Wallet:** `{format_wallet_address(wallet_address)}`
 
-**Accrued Rewards:** {stats['accrued_rewards']:,.2f} {TOKEN_SYMBOL}
+**Accrued Rewards:** {from_wei(stats['accrued_rewards']):,.2f} {TOKEN_SYMBOL}
 
 **Withdrawal Eligibility:** {'✅ Eligible' if stats['withdrawable'] else '⏳ Below threshold'}
 
@@ -555,10 +567,10 @@ Check back after the distribution period!"""
         
         message = f"""💰 **COPE Withdrawal & Rewards**
 
-🏦 **Settled Rewards:** `{settled_total:,.2f} {TOKEN_SYMBOL}`
+🏦 **Settled Rewards:** `{from_wei(settled_total):,.2f} {TOKEN_SYMBOL}`
 *These have been finalized in previous cycles and are available for on-chain claim.*
 
-⏳ **Accrued (This Cycle):** `{stats['accrued_rewards']:,.2f} {TOKEN_SYMBOL}`
+⏳ **Accrued (This Cycle):** `{from_wei(stats['accrued_rewards']):,.2f} {TOKEN_SYMBOL}`
 *These will be settled in the next weekly distribution (Every Monday 00:00 UTC).*
 
 📊 **Status:** {status_emoji} {eligibility}
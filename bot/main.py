@@ -20,7 +20,9 @@ from database.db_manager import DatabaseManager
 from bot.handlers import BotHandlers
 from bot.trade_handlers import TradeHandlers
 from chain.event_listener import COPEEventListener
+from chain.rpc import AsyncRPCClient
 from rewards.distribution import RewardDistributor
+from rewards.leaderboard import LeaderboardEngine
 import schedule
 import threading
 
@@ -42,8 +44,11 @@ class COPEReferralBot:
     
     def __init__(self):
         self.db = DatabaseManager()
-        self.handlers = BotHandlers(self.db)
-        self.trade_handlers = TradeHandlers(self.db)
+        self.leaderboard = LeaderboardEngine(self.db)
+        # One RPC session shared by the listener and the trade UI
+        self.rpc = AsyncRPCClient()
+        self.handlers = BotHandlers(self.db, self.leaderboard)
+        self.trade_handlers = TradeHandlers(self.db, self.rpc)
         self.event_listener = None
         self.distributor = RewardDistributor(self.db)
         self.application = None
@@ -54,8 +59,10 @@ class COPEReferralBot:
         await self.db.init_db()
         logger.info("Database initialized")
         
+        await self.leaderboard.seed()
+        
         # Initialize event listener
-        self.event_listener = COPEEventListener(self.db)
+        self.event_listener = COPEEventListener(self.db, rpc=self.rpc, leaderboard=self.leaderboard)
         await self.event_listener.initialize()
         logger.info("Event listener initialized")
     
@@ -133,16 +140,9 @@ class COPEReferralBot:
         """Setup weekly reward distribution scheduler"""
         def run_distribution():
             """Run weekly distribution (call from scheduler thread)"""
-            from datetime import datetime
-            from config import WEEKLY_DISTRIBUTION_DAY, WEEKLY_DISTRIBUTION_HOUR
-            
-            # Calculate current period
-            now = datetime.utcnow()
+            # Settle the week that ended at this Monday's trigger, not the one just starting
             distributor = RewardDistributor(self.db)
-            period_start, period_end = distributor.calculate_weekly_period(now)
-            
-            # Run distribution
-            asyncio.run(distributor.settle_weekly_rewards(period_start, period_end))
+            asyncio.run(distributor.settle_completed_week())
         
         # Schedule weekly distribution (every Monday at midnight UTC)
         schedule.every().monday.at("00:00").do(run_distribution)
@@ -170,6 +170,7 @@ class COPEReferralBot:
         
         # Start event listener
         self.start_event_listener()
+        self.leaderboard.start_reconciliation()
         
         # Setup weekly distribution
         self.setup_weekly_distribution()
@@ -191,6 +192,10 @@ class COPEReferralBot:
             logger.info("Shutting down...")
             if self.event_listener:
                 self.event_listener.stop()
+        finally:
+            self.leaderboard.stop()
+            await self.rpc.close()
+            await self.db.close()
 
 
 async def main():
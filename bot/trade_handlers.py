@@ -14,6 +14,7 @@ from config import (
 )
 from database.db_manager import DatabaseManager
 from chain.token_utils import TokenUtils
+from chain.rpc import AsyncRPCClient
 
 import html
 
@@ -22,9 +23,9 @@ logger = logging.getLogger(__name__)
 class TradeHandlers:
     """Handles /buy, /sell and associated trading interface logic"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, rpc: Optional[AsyncRPCClient] = None):
         self.db = db_manager
-        self.token_utils = TokenUtils()
+        self.token_utils = TokenUtils(rpc)
         # In-memory session state for users (simple version)
         # In prod, this should be in DB if it needs to persist across reboots
         self.user_sessions = {} # telegram_id -> {mode, gas, amount_selection, etc}
@@ -0,0 +1,206 @@
+"""
+Parallel historical backfill for COPE swaps
+Fetches and decodes block chunks concurrently but commits them strictly in
+block order, so first-trade locking sees trades in chain order and the
+backfill checkpoint only ever covers a contiguous prefix.
+The backfill keeps its own checkpoint and stops where live ingestion began,
+so it can run alongside the listener. A referrer mapping that live ingestion
+already locked keeps its first trade even if the backfill finds an earlier one.
+Usage: python -m chain.backfill [--from-block N] [--to-block M]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from config import (
+    DATABASE_PATH, RPC_ENDPOINTS, BACKFILL_START_BLOCK, BACKFILL_CHUNK_BLOCKS,
+    BACKFILL_WORKERS, BACKFILL_RETRIES, BACKFILL_PROGRESS_INTERVAL
+)
+from database.db_manager import DatabaseManager
+from chain.event_listener import COPEEventListener
+from chain.ranges import is_range_error
+from chain.rpc import AsyncRPCClient
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillEngine:
+    """Indexes a block range with a bounded pool of concurrent fetches and in-order commits"""
+    
+    # Key of the backfill's row in listener_state, apart from the live listener's
+    CHECKPOINT_NAME = "cope_backfill"
+    
+    def __init__(self, listener: COPEEventListener, chunk_size: int = BACKFILL_CHUNK_BLOCKS,
+                 workers: int = BACKFILL_WORKERS, retries: int = BACKFILL_RETRIES,
+                 progress_interval: float = BACKFILL_PROGRESS_INTERVAL,
+                 on_progress: Optional[Callable[[Dict], None]] = None):
+        self.listener = listener
+        self.chunk_size = max(1, chunk_size)
+        self.workers = max(1, workers)
+        self.retries = max(1, retries)
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self._fetch_slots: Optional[asyncio.Semaphore] = None
+        self.stats: Dict = {}
+    
+    async def resolve_range(self, from_block: Optional[int], to_block: Optional[int]) -> Tuple[int, int]:
+        """
+        Start after the backfill's saved checkpoint (so an interrupted backfill resumes),
+        else at from_block / BACKFILL_START_BLOCK; end at to_block or the newest
+        confirmed block (backfilled swaps are recorded as final), but no later than
+        the block live ingestion started after
+        """
+        db = self.listener.db
+        checkpoint = await db.get_listener_checkpoint(self.CHECKPOINT_NAME)
+        start = from_block if from_block is not None else BACKFILL_START_BLOCK
+        if checkpoint is not None:
+            if checkpoint + 1 > start:
+                logger.info(f"Resuming after backfill checkpoint {checkpoint}")
+            start = max(start, checkpoint + 1)
+        if to_block is None:
+            to_block = await self.listener.rpc.block_number() - self.listener.confirmations
+        
+        live_origin = await db.get_listener_checkpoint(self.listener.ORIGIN_NAME)
+        if live_origin is None:
+            # Listeners from before the origin was recorded: stop at their checkpoint;
+            # any overlap with what they ingested is skipped as duplicate swaps
+            live_origin = await db.get_listener_checkpoint(self.listener.CHECKPOINT_NAME)
+        if live_origin is not None and live_origin < to_block:
+            logger.info(f"Stopping at block {live_origin}; live ingestion covers the blocks after it")
+            to_block = live_origin
+        return start, to_block
+    
+    async def run(self, from_block: Optional[int] = None, to_block: Optional[int] = None) -> Dict:
+        """Backfill [from_block, to_block]; returns the final progress stats"""
+        start, end = await self.resolve_range(from_block, to_block)
+        self.stats = {
+            'start_block': start,
+            'end_block': end,
+            'committed_block': start - 1,
+            'blocks_done': 0,
+            'blocks_total': max(end - start + 1, 0),
+            'logs': 0,
+            'swaps_recorded': 0,
+            'blocks_per_second': 0.0,
+            'eta_seconds': None,
+        }
+        if start > end:
+            logger.info(f"Nothing to backfill between blocks {start} and {end}")
+            return self.stats
+        
+        logger.info(
+            f"Backfilling blocks {start} to {end} in {self.chunk_size}-block chunks "
+            f"with {self.workers} workers"
+        )
+        self._fetch_slots = asyncio.Semaphore(self.workers)
+        chunks = ((s, min(s + self.chunk_size - 1, end)) for s in range(start, end + 1, self.chunk_size))
+        # Prepared chunks waiting to commit; bounded so memory stays flat on long ranges
+        pending: Deque[asyncio.Task] = deque()
+        started = time.monotonic()
+        last_report = started
+        
+        try:
+            for chunk in chunks:
+                pending.append(asyncio.create_task(self._prepare(*chunk)))
+                if len(pending) >= self.workers * 2:
+                    await self._commit(await pending.popleft(), started)
+                    if time.monotonic() - last_report >= self.progress_interval:
+                        self._report()
+                        last_report = time.monotonic()
+            while pending:
+                await self._commit(await pending.popleft(), started)
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        self._report()
+        return self.stats
+    
+    async def _prepare(self, start: int, end: int) -> Tuple[int, int, List[Dict], List[Dict]]:
+        """Fetch and decode one chunk; runs concurrently with other chunks"""
+        async with self._fetch_slots:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    events = await self._fetch(start, end)
+                    swaps = await self.listener.decode_block_range(events)
+                    return start, end, events, swaps
+                except Exception as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"Blocks {start}-{end} failed (attempt {attempt}), retrying: {e}")
+                    await asyncio.sleep(2 ** attempt)
+    
+    async def _fetch(self, start: int, end: int) -> List[Dict]:
+        """Fetch a chunk's logs, splitting it in half whenever the node rejects the range"""
+        try:
+            return await self.listener.fetch_swap_logs(start, end)
+        except Exception as e:
+            if start < end and is_range_error(e):
+                middle = (start + end) // 2
+                return await self._fetch(start, middle) + await self._fetch(middle + 1, end)
+            raise
+    
+    async def _commit(self, prepared: Tuple[int, int, List[Dict], List[Dict]], started: float):
+        """Record a chunk and advance the checkpoint to its last block"""
+        start, end, events, swaps = prepared
+        recorded = await self.listener.commit_block_range(events, swaps, end, self.CHECKPOINT_NAME)
+        
+        stats = self.stats
+        stats['committed_block'] = end
+        stats['blocks_done'] += end - start + 1
+        stats['logs'] += len(events)
+        stats['swaps_recorded'] += len(recorded)
+        elapsed = time.monotonic() - started
+        if elapsed > 0:
+            stats['blocks_per_second'] = round(stats['blocks_done'] / elapsed, 1)
+            remaining = stats['blocks_total'] - stats['blocks_done']
+            stats['eta_seconds'] = round(remaining / stats['blocks_per_second']) if stats['blocks_per_second'] else None
+    
+    def _report(self):
+        stats = self.stats
+        percent = 100.0 * stats['blocks_done'] / stats['blocks_total'] if stats['blocks_total'] else 100.0
+        logger.info(
+            f"Backfill {percent:.1f}%: block {stats['committed_block']} of {stats['end_block']}, "
+            f"{stats['swaps_recorded']} swaps, {stats['blocks_per_second']} blocks/s, "
+            f"ETA {stats['eta_seconds']}s"
+        )
+        if self.on_progress is not None:
+            self.on_progress(dict(stats))
+
+
+async def run(args: argparse.Namespace) -> int:
+    db = DatabaseManager(args.database)
+    await db.init_db()
+    rpc = AsyncRPCClient(args.rpc_url or RPC_ENDPOINTS)
+    try:
+        listener = COPEEventListener(db, rpc=rpc)
+        engine = BackfillEngine(listener, chunk_size=args.chunk_size, workers=args.workers)
+        stats = await engine.run(args.from_block, args.to_block)
+        print(f"Backfilled to block {stats['committed_block']}: {stats['swaps_recorded']} swaps recorded")
+        return 0
+    finally:
+        await rpc.close()
+        await db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill COPE swaps from chain history")
+    parser.add_argument("--from-block", type=int, help=f"first block when no backfill checkpoint exists (default {BACKFILL_START_BLOCK})")
+    parser.add_argument("--to-block", type=int, help="last block (default: newest confirmed block)")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_BLOCKS, help="blocks per chunk")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="concurrent chunk fetches")
+    parser.add_argument("--database", default=DATABASE_PATH, help="SQLite database path")
+    parser.add_argument("--rpc-url", action="append", help="JSON-RPC endpoint, repeatable (default: RPC_ENDPOINTS)")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Block timestamp lookup for the chain listeners
+Timestamps are cached per block number; cache misses for a range are fetched
+together in one JSON-RPC batch request
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from config import BLOCK_CACHE_SIZE, BLOCK_FETCH_BATCH_SIZE, BLOCK_TIMESTAMP_MODE
+from database.cache import TTLCache, MISSING
+from chain.rpc import AsyncRPCClient, BatchNotSupported
+
+
+logger = logging.getLogger(__name__)
+
+
+class BlockTimestampCache:
+    """Bounded block number -> timestamp cache backed by batched header fetches"""
+    
+    def __init__(self, rpc: AsyncRPCClient, maxsize: int = BLOCK_CACHE_SIZE,
+                 batch_size: int = BLOCK_FETCH_BATCH_SIZE, mode: str = BLOCK_TIMESTAMP_MODE):
+        self.rpc = rpc
+        self.batch_supported = True
+        self.batch_size = max(1, batch_size)
+        self.interpolate = mode == "interpolate"
+        # Headers don't change once fetched, so entries never expire
+        self._timestamps = TTLCache(maxsize, float('inf'))
+    
+    def stats(self) -> Dict:
+        return self._timestamps.stats()
+    
+    async def get_timestamps(self, block_numbers: Iterable[int]) -> Dict[int, datetime]:
+        """UTC timestamp for each block number, fetching only the blocks not cached"""
+        blocks = sorted(set(block_numbers))
+        if not blocks:
+            return {}
+        
+        # Interpolation only needs the range endpoints
+        needed = [blocks[0], blocks[-1]] if self.interpolate else blocks
+        timestamps = {}
+        missing = []
+        for number in needed:
+            cached = self._timestamps.get(number)
+            if cached is MISSING:
+                missing.append(number)
+            else:
+                timestamps[number] = cached
+        
+        for start in range(0, len(missing), self.batch_size):
+            fetched = await self._fetch(missing[start:start + self.batch_size])
+            for number, timestamp in fetched.items():
+                self._timestamps.set(number, timestamp)
+                timestamps[number] = timestamp
+        
+        if self.interpolate and len(blocks) > 2:
+            first, last = blocks[0], blocks[-1]
+            slope = (timestamps[last] - timestamps[first]) / (last - first)
+            for number in blocks[1:-1]:
+                timestamps[number] = round(timestamps[first] + (number - first) * slope)
+        
+        return {number: datetime.utcfromtimestamp(timestamps[number]) for number in blocks}
+    
+    async def _fetch(self, block_numbers: List[int]) -> Dict[int, int]:
+        """Fetch header timestamps (unix seconds) for the given blocks"""
+        headers = await self.get_headers(block_numbers)
+        return {number: int(header['timestamp'], 16) for number, header in headers.items()}
+    
+    async def get_headers(self, block_numbers: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Fetch current headers (always from the node, for hash checks), batched;
+        their timestamps are cached on the way through
+        """
+        block_numbers = sorted(set(block_numbers))
+        headers = {}
+        for start in range(0, len(block_numbers), self.batch_size):
+            chunk = block_numbers[start:start + self.batch_size]
+            for number, block in zip(chunk, await self._fetch_blocks(chunk)):
+                if block is None:
+                    raise RuntimeError(f"Block {number} unavailable from RPC node")
+                headers[number] = block
+                self._timestamps.set(number, int(block['timestamp'], 16))
+        return headers
+    
+    def discard(self, block_numbers: Iterable[int]):
+        """Forget cached timestamps, e.g. for blocks replaced by a reorg"""
+        for number in block_numbers:
+            self._timestamps.invalidate(number)
+    
+    async def _fetch_blocks(self, block_numbers: List[int]) -> List[Optional[Dict]]:
+        if self.batch_supported and len(block_numbers) > 1:
+            try:
+                return await self.rpc.batch(
+                    [('eth_getBlockByNumber', [hex(number), False]) for number in block_numbers]
+                )
+            except BatchNotSupported:
+                logger.warning("RPC endpoint rejected batch request, fetching block headers singly")
+                self.batch_supported = False
+        
+        return [await self.rpc.get_block(number) for number in block_numbers]
@@ -0,0 +1,75 @@
+"""
+Batch decoder for COPE Transfer logs
+Classifies a whole eth_getLogs result against the approved pools in a single
+per-log loop (pool topics precomputed, no per-event address lowercasing) and
+keeps the decoded swaps in columns. Parsing is still per log: uint256 amounts
+and hex topics have no fixed-width array form to vectorise over.
+"""
+from array import array
+from typing import Dict, Iterable, List, Sequence
+
+from config import APPROVED_LIQUIDITY_POOLS
+
+
+# Side codes stored in TransferBatch.sides
+BUY = 1
+SELL = -1
+
+SWAP_TYPES = {BUY: "buy", SELL: "sell"}
+
+
+def address_topic(address: str) -> str:
+    """An address as it appears in an indexed event topic (32 bytes, left-padded)"""
+    return "0x" + "0" * 24 + address[2:].lower()
+
+
+class TransferBatch:
+    """
+    Decoded swap Transfers, one entry per swap in log order
+    `rows` points back into the decoded event list; amounts are uint256 so they
+    stay Python ints rather than a fixed-width array
+    """
+    
+    def __init__(self):
+        self.rows = array('I')
+        self.block_numbers = array('Q')
+        self.sides = array('b')
+        self.traders: List[str] = []
+        self.amounts: List[int] = []
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def swap_type(self, i: int) -> str:
+        return SWAP_TYPES[self.sides[i]]
+
+
+class TransferDecoder:
+    """Decodes COPE Transfer logs, keeping only transfers to or from an approved pool"""
+    
+    def __init__(self, pools: Iterable[str] = APPROVED_LIQUIDITY_POOLS):
+        # Matched against raw topics, so no per-event address slicing or lowercasing
+        self.pool_topics = frozenset(address_topic(pool) for pool in pools)
+    
+    def decode(self, events: Sequence[Dict]) -> TransferBatch:
+        """Classify and decode every Transfer in `events` (normalized logs, hex-string topics)"""
+        pool_topics = self.pool_topics
+        batch = TransferBatch()
+        rows, blocks, sides = batch.rows.append, batch.block_numbers.append, batch.sides.append
+        traders, amounts = batch.traders.append, batch.amounts.append
+        
+        for row, event in enumerate(events):
+            topics = event['topics']
+            from_topic, to_topic = topics[1], topics[2]
+            if to_topic in pool_topics or to_topic.lower() in pool_topics:
+                sides(SELL)
+                traders("0x" + from_topic[-40:].lower())
+            elif from_topic in pool_topics or from_topic.lower() in pool_topics:
+                sides(BUY)
+                traders("0x" + to_topic[-40:].lower())
+            else:
+                continue
+            rows(row)
+            blocks(event['blockNumber'])
+            amounts(int(event['data'], 16))
+        return batch
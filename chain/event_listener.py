@@ -2,18 +2,34 @@
 BNB Chain event listener for COPE token swaps
 Tracks buy/sell events and calculates tax amounts
 """
-from web3 import Web3
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 import asyncio
 import logging
 
-from config import BNB_CHAIN_RPC_URL, TOKEN_CONTRACT, APPROVED_LIQUIDITY_POOLS
+from config import (
+    TOKEN_CONTRACT, APPROVED_LIQUIDITY_POOLS, BNB_CHAIN_RPC_WS_URL,
+    LISTENER_MODE, LISTENER_WS_RECONNECT_DELAY, LISTENER_DEDUPE_SIZE, LISTENER_START_LOOKBACK,
+    LISTENER_POLL_INTERVAL, LISTENER_CATCHUP_THRESHOLD, LISTENER_CATCHUP_MODE, LISTENER_CONFIRMATIONS,
+    LISTENER_PIPELINE_DEPTH
+)
 from database.db_manager import DatabaseManager
+from database.cache import TTLCache, MISSING
+from chain.blocks import BlockTimestampCache
+from chain.decoder import TransferDecoder, address_topic
+from chain.pipeline import IngestionPipeline
+from chain.rpc import AsyncRPCClient
+from chain.subscriptions import LogSubscription
+from chain.ranges import BlockRangeController, is_range_error
+from rewards.leaderboard import LeaderboardEngine
+from utils.amounts import apply_percentage, from_wei
 
 
 logger = logging.getLogger(__name__)
 
+# Seconds without a new pushed log before the buffered block is decoded
+_PUSH_FLUSH_DELAY = 0.5
+
 
 class COPEEventListener:
     """Listens for COPE token swap events on BNB Chain"""
@@ -21,47 +37,87 @@ class COPEEventListener:
     # ERC20 Transfer event signature
     TRANSFER_EVENT_SIGNATURE = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
     
-    def __init__(self, db_manager: DatabaseManager, w3: Optional[Web3] = None):
+    # Key of this listener's row in listener_state
+    CHECKPOINT_NAME = "cope_transfers"
+    # listener_state row holding the block before live ingestion first started;
+    # chain.backfill fills history up to it
+    ORIGIN_NAME = "cope_transfers_origin"
+    # listener_state row holding the newest block whose staged swaps are all promoted,
+    # with its timestamp; weekly settlement waits for it to pass the end of the week
+    CONFIRMED_NAME = "cope_transfers_confirmed"
+    
+    def __init__(self, db_manager: DatabaseManager, rpc: Optional[AsyncRPCClient] = None,
+                 leaderboard: Optional[LeaderboardEngine] = None, confirmations: int = LISTENER_CONFIRMATIONS):
         self.db = db_manager
-        self.w3 = w3 or Web3(Web3.HTTPProvider(BNB_CHAIN_RPC_URL))
+        self.rpc = rpc or AsyncRPCClient()
+        self.leaderboard = leaderboard
+        self.block_times = BlockTimestampCache(self.rpc)
+        self.dex = DEXSwapEventListener(db_manager, self.rpc)
+        self.ranges = BlockRangeController()
+        # (transaction hash, log index) of recently processed logs, so logs seen by
+        # both the WebSocket subscription and the polling path are decoded once
+        self._seen_logs = TTLCache(LISTENER_DEDUPE_SIZE, float('inf'))
         self.token_contract = TOKEN_CONTRACT
+        self.pools = frozenset(pool.lower() for pool in APPROVED_LIQUIDITY_POOLS)
+        self.decoder = TransferDecoder(self.pools)
+        # Approved pools as 32-byte indexed-address topics, for node-side log filtering
+        self.pool_topics = [address_topic(pool) for pool in APPROVED_LIQUIDITY_POOLS]
         self.is_running = False
         self.last_processed_block = None
+        # Swaps less than this many blocks deep are staged in pending_swaps until confirmed
+        self.confirmations = max(0, confirmations)
+        self.confirmed_block: Optional[int] = None
+        self.reorgs = 0
+        # Staged fetch/decode/enrich/persist loop used in poll mode (None: one range at a time)
+        self.pipeline = IngestionPipeline(self) if LISTENER_PIPELINE_DEPTH > 0 else None
     
     async def initialize(self):
-        """Initialize event listener - get last processed block"""
-        # In production, store last processed block in database
-        # For now, start from current block minus some lookback
+        """Initialize event listener - resume from the saved checkpoint"""
         try:
-            current_block = self.w3.eth.block_number
-            self.last_processed_block = max(current_block - 1000, 0)  # Lookback 1000 blocks
-            logger.info(f"Initialized event listener at block {self.last_processed_block}")
+            current_block = await self.rpc.block_number()
+            checkpoint = await self.db.get_listener_checkpoint(self.CHECKPOINT_NAME)
+            
+            if checkpoint is None:
+                # First run: start from current block minus some lookback
+                self.last_processed_block = max(current_block - LISTENER_START_LOOKBACK, 0)
+                await self.db.save_listener_checkpoint(self.ORIGIN_NAME, self.last_processed_block)
+                logger.info(f"No checkpoint saved, starting event listener at block {self.last_processed_block}")
+                return
+            
+            gap = current_block - checkpoint
+            if gap > LISTENER_CATCHUP_THRESHOLD and LISTENER_CATCHUP_MODE == "skip":
+                self.last_processed_block = max(current_block - LISTENER_START_LOOKBACK, checkpoint)
+                logger.warning(
+                    f"Checkpoint {checkpoint} is {gap} blocks behind; skipping blocks "
+                    f"{checkpoint + 1} to {self.last_processed_block} (LISTENER_CATCHUP_MODE=skip)"
+                )
+                return
+            
+            self.last_processed_block = checkpoint
+            logger.info(f"Resuming event listener after block {checkpoint} ({gap} blocks behind)")
         except Exception as e:
             logger.error(f"Failed to initialize event listener: {e}")
             raise
     
-    def get_swap_type(self, from_address: str, to_address: str) -> Optional[str]:
-        """
-        Determine if a transfer is a buy or sell
-        Buy: Transfer to approved pool (user receives COPE)
-        Sell: Transfer from approved pool (user sends COPE)
-        """
-        from_lower = from_address.lower()
-        to_lower = to_address.lower()
-        
-        # Check if this involves an approved liquidity pool
-        pool_addresses = [pool.lower() for pool in APPROVED_LIQUIDITY_POOLS]
-        
-        if to_lower in pool_addresses:
-            return "sell"  # User sending COPE to pool = sell
-        elif from_lower in pool_addresses:
-            return "buy"   # User receiving COPE from pool = buy
-        
-        return None  # Not a swap event
+    def next_batch_end(self, current_block: int) -> int:
+        """Last block of the next batch, sized by the adaptive range controller"""
+        return min(self.last_processed_block + self.ranges.window, current_block)
+    
+    def metrics(self) -> Dict:
+        """Fetch window, throughput, pipeline stages and RPC endpoint health, for monitoring"""
+        return {
+            **self.ranges.stats(),
+            'last_processed_block': self.last_processed_block,
+            'confirmed_block': self.confirmed_block,
+            'reorgs': self.reorgs,
+            'block_cache': self.block_times.stats(),
+            'rpc': self.rpc.stats(),
+            'pipeline': self.pipeline.stats() if self.pipeline is not None else None,
+        }
     
-    def calculate_tax(self, amount: int, swap_type: str) -> float:
+    def calculate_tax(self, amount: int, swap_type: str) -> int:
         """
-        Calculate COPE tax amount from transfer
+        Calculate COPE tax amount (wei) from transfer amount (wei)
         Note: This assumes the tax is already deducted in the transfer amount
         In production, you may need to compare expected vs actual amounts
         or listen to specific tax events if the contract emits them
@@ -81,146 +137,525 @@ class COPEEventListener:
         
         # Placeholder: Return 5% as tax (adjust based on actual contract)
         tax_rate = 0.06  # 5% - UPDATE THIS BASED ON ACTUAL CONTRACT
-        tax_amount = float(amount) * tax_rate
+        tax_amount = apply_percentage(amount, tax_rate)
         
         return tax_amount
     
-    async def process_transfer_event(self, event: Dict, block_timestamp: datetime):
+    def _swap_record(self, event: Dict, swap_type: str, trader_wallet: str, amount: int,
+                     block_timestamp: datetime, dex_swap: Optional[Dict], referrer: Optional[str]) -> Optional[Dict]:
+        """Build the swap record for a classified Transfer (None without a referrer or tax)"""
+        # If no referrer, this trade doesn't generate referral rewards
+        if not referrer:
+            logger.debug(f"No referrer for wallet {trader_wallet}, skipping referral reward")
+            return None
+        
+        # Calculate tax amount
+        # Amounts stay in integer wei; conversion happens only for display
+        cope_amount = amount
+        bnb_amount = 0
+        if dex_swap is not None and swap_type == "buy":
+            # The pair paid out cope_out; whatever didn't reach the buyer was taxed,
+            # so a buyer who received all of it paid no tax
+            cope_amount, bnb_amount = dex_swap['cope_out'], dex_swap['bnb_in']
+            tax_amount = cope_amount - amount
+        elif dex_swap is not None:
+            # A sell's tax is taken before the pair receives the tokens, so only
+            # the amounts are exact here
+            cope_amount, bnb_amount = dex_swap['cope_in'], dex_swap['bnb_out']
+            tax_amount = self.calculate_tax(cope_amount, swap_type)
+        else:
+            tax_amount = self.calculate_tax(cope_amount, swap_type)
+        
+        if tax_amount <= 0:
+            return None  # No tax, skip
+        
+        return {
+            'transaction_hash': event['transactionHash'],
+            'trader_wallet': trader_wallet,
+            'swap_type': swap_type,
+            'cope_amount': cope_amount,
+            'bnb_amount': bnb_amount,
+            'cope_tax_amount': tax_amount,
+            'block_number': event['blockNumber'],
+            'block_timestamp': block_timestamp,
+            'log_index': event.get('logIndex', 0),
+            'block_hash': event.get('blockHash'),
+            'referrer_wallet': referrer,
+        }
+    
+    async def process_block_range(self, events: List[Dict], end_block: Optional[int] = None,
+                                  headers: Optional[Dict[int, Dict]] = None) -> List[Dict]:
         """
-        Process a Transfer event and record swap if applicable
-        Uses wallet-referrer mapping to assign rewards
+        Decode every Transfer in a block range and record the swaps in one batch
+        If end_block is given the listener checkpoint advances to it in the same transaction.
+        With `headers` (the range's unconfirmed block headers) the swaps are staged
+        provisionally instead, to be promoted by promote_confirmed
+        Returns: the swaps that were newly recorded as final
         """
-        try:
-            # Parse event data
-            from_address = "0x" + event['topics'][1].hex()[-40:]
-            to_address = "0x" + event['topics'][2].hex()[-40:]
-            amount = int(event['data'], 16)
-            
-            # Check if this is a swap (involves approved pool)
-            swap_type = self.get_swap_type(from_address, to_address)
-            if not swap_type:
-                return  # Not a swap event
-            
-            # Determine trader wallet
-            trader_wallet = to_address if swap_type == "buy" else from_address
-            
-            # Get referrer for this wallet using wallet-referrer mapping
-            referrer = await self.db.get_referrer_for_wallet(trader_wallet)
-            
-            # If no referrer, this trade doesn't generate referral rewards
-            # But we still record it for community pool tracking
-            if not referrer:
-                logger.debug(f"No referrer for wallet {trader_wallet}, skipping referral reward")
-                # Still record for community pool, but skip referral reward assignment
-                return
-            
-            # Calculate tax amount
-            cope_amount = amount / 1e18  # Convert from wei (assuming 18 decimals)
-            tax_amount = self.calculate_tax(cope_amount, swap_type)
-            
-            if tax_amount <= 0:
-                return  # No tax, skip
-            
-            # Get transaction details
-            tx_hash = event['transactionHash'].hex()
-            block_number = event['blockNumber']
-            
-            # Record swap event
-            # Note: BNB amount would need to be calculated from the swap event
-            # For now, we'll set it to 0 and update later if needed
-            await self.db.record_swap_event(
-                transaction_hash=tx_hash,
-                trader_wallet=trader_wallet,
-                swap_type=swap_type,
-                cope_amount=cope_amount,
-                bnb_amount=0.0,  # Would need to calculate from swap event
-                cope_tax_amount=tax_amount,
-                block_number=block_number,
-                block_timestamp=block_timestamp
-            )
-            
-            logger.info(
-                f"Recorded {swap_type} swap: {trader_wallet[:10]}... "
-                f"Tax: {tax_amount:.2f} COPE, Referrer: {referrer[:10]}..."
+        events = self.unseen(events)
+        swaps = await self.decode_block_range(events)
+        if headers is not None:
+            await self.stage_block_range(events, swaps, end_block, headers)
+            return []
+        return await self.commit_block_range(events, swaps, end_block)
+    
+    def unseen(self, events: List[Dict]) -> List[Dict]:
+        """The logs in `events` this listener has not recorded yet"""
+        return [event for event in events if self._seen_logs.get(_log_key(event)) is MISSING]
+    
+    async def decode_block_range(self, events: List[Dict]) -> List[Dict]:
+        """
+        Decode a range's Transfers into swap records (no database writes)
+        Swap logs from the approved pairs in `events` are joined to their Transfers
+        """
+        return await self.enrich_block_range(await self.classify_block_range(events))
+    
+    async def classify_block_range(self, events: List[Dict]) -> Dict:
+        """
+        First half of decode_block_range: classify the range's pool Transfers, join
+        them to the pairs' Swap events and look up their block timestamps
+        """
+        transfers = [
+            event for event in events
+            if event['address'].lower() == self.token_contract.lower()
+            and event['topics'][0] == self.TRANSFER_EVENT_SIGNATURE
+        ]
+        dex_swaps = await self.dex.decode_swap_events([event for event in events if self.dex.is_swap_log(event)])
+        
+        # Classify the whole range in one pass; only pool transfers go further
+        batch = self.decoder.decode(transfers)
+        
+        # One header fetch per distinct block, batched; a failure here retries the whole range
+        timestamps = await self.block_times.get_timestamps(batch.block_numbers)
+        return {
+            'transfers': transfers,
+            'batch': batch,
+            'matched': self.dex.match_transfers(transfers, dex_swaps),
+            'timestamps': timestamps,
+        }
+    
+    async def enrich_block_range(self, decoded: Dict) -> List[Dict]:
+        """
+        Second half of decode_block_range: referrers and amounts for each classified swap
+        The referrers of all the range's traders are resolved in one lookup
+        """
+        transfers, batch, matched, timestamps = (
+            decoded['transfers'], decoded['batch'], decoded['matched'], decoded['timestamps']
+        )
+        referrers = await self.db.get_referrers_for_wallets(batch.traders) if len(batch) else {}
+        swaps = []
+        for i in range(len(batch)):
+            event = transfers[batch.rows[i]]
+            try:
+                swap = self._swap_record(
+                    event, batch.swap_type(i), batch.traders[i], batch.amounts[i],
+                    timestamps[batch.block_numbers[i]], matched.get(_log_key(event)), referrers[batch.traders[i]]
+                )
+                if swap is not None:
+                    swaps.append(swap)
+            except Exception as e:
+                logger.error(f"Error processing transfer event: {e}")
+        return swaps
+    
+    async def commit_block_range(self, events: List[Dict], swaps: List[Dict],
+                                 end_block: Optional[int] = None,
+                                 checkpoint_name: Optional[str] = None) -> List[Dict]:
+        """
+        Record a decoded range (and the checkpoint, if end_block is given) in one transaction
+        `checkpoint_name` defaults to this listener's own (the backfill keeps a separate one)
+        """
+        checkpoint = (checkpoint_name or self.CHECKPOINT_NAME, end_block) if end_block is not None else None
+        recorded = await self.db.record_swap_events(swaps, checkpoint=checkpoint)
+        if end_block is not None:
+            self.last_processed_block = end_block
+        for event in events:
+            self._seen_logs.set(_log_key(event), True)
+        for swap in recorded:
+            self._log_swap(swap)
+        if self.leaderboard is not None:
+            self.leaderboard.apply_swaps(recorded)
+        return recorded
+    
+    async def stage_block_range(self, events: List[Dict], swaps: List[Dict],
+                                end_block: Optional[int], headers: Dict[int, Dict]):
+        """Stage an unconfirmed range's swaps and block hashes (and the checkpoint) in one transaction"""
+        blocks = [(number, header['hash'], header['parentHash']) for number, header in headers.items()]
+        staged = await self.db.record_pending_swaps(self.CHECKPOINT_NAME, swaps, blocks, end_block)
+        if end_block is not None:
+            self.last_processed_block = end_block
+        for event in events:
+            self._seen_logs.set(_log_key(event), True)
+        if staged:
+            logger.info(f"Staged {staged} provisional swaps awaiting {self.confirmations} confirmations")
+    
+    async def promote_confirmed(self, current_block: int) -> List[Dict]:
+        """
+        Promote staged swaps that are now `confirmations` deep into swap_events,
+        after checking their blocks are still on the canonical chain
+        Returns: the swaps newly recorded as final
+        """
+        confirmed = current_block - self.confirmations
+        if self.confirmed_block is not None and confirmed <= self.confirmed_block:
+            return []
+        
+        pending = await self.db.get_pending_swap_blocks(confirmed)
+        if pending:
+            canonical = await self.block_times.get_headers(number for number, _ in pending)
+            if any(canonical[number]['hash'] != block_hash for number, block_hash in pending):
+                await self.handle_reorg()
+                return []
+        
+        # Everything up to here is final: confirmed, and already fetched
+        final = confirmed if self.last_processed_block is None else min(confirmed, self.last_processed_block)
+        final_at = (await self.block_times.get_timestamps([final]))[final]
+        recorded = await self.db.promote_pending_swaps(
+            self.CHECKPOINT_NAME, confirmed, checkpoint=(self.CONFIRMED_NAME, final, final_at)
+        )
+        self.confirmed_block = confirmed
+        for swap in recorded:
+            self._log_swap(swap)
+        if self.leaderboard is not None:
+            self.leaderboard.apply_swaps(recorded)
+        return recorded
+    
+    async def handle_reorg(self) -> Optional[int]:
+        """
+        Find the newest block the listener built on that is still canonical,
+        discard everything staged above it and resume from there
+        Returns: that fork block, or None if no remembered hash differs from the chain
+        """
+        known = await self.db.get_block_hashes(self.CHECKPOINT_NAME)
+        if not known:
+            return None
+        canonical = await self.block_times.get_headers(number for number, _ in known)
+        
+        # A block can have several remembered hashes (header and pushed logs); all must match
+        remembered: Dict[int, set] = {}
+        for number, block_hash in known:
+            remembered.setdefault(number, set()).add(block_hash)
+        fork_block, first_bad = None, None
+        for number in sorted(remembered):
+            if remembered[number] != {canonical[number]['hash']}:
+                first_bad = number
+                break
+            fork_block = number
+        if first_bad is None:
+            logger.warning("Parent hash mismatch but every remembered block is canonical; retrying")
+            return None
+        if fork_block is None:
+            fork_block = first_bad - 1
+            logger.error(
+                f"Reorg reaches below the oldest remembered block {first_bad}; "
+                f"swaps confirmed before block {first_bad} were not rechecked"
             )
-            
+        
+        previous_block = self.last_processed_block
+        discarded = await self.db.rollback_listener(self.CHECKPOINT_NAME, fork_block)
+        self.reorgs += 1
+        self.last_processed_block = min(previous_block, fork_block) if previous_block is not None else fork_block
+        # Replaced blocks may carry the same transactions at different positions
+        self._seen_logs.clear()
+        if previous_block is not None:
+            self.block_times.discard(range(fork_block + 1, previous_block + 1))
+        logger.warning(
+            f"Chain reorg: blocks after {fork_block} replaced, {discarded} provisional swaps "
+            f"discarded; re-ingesting from block {fork_block + 1}"
+        )
+        return fork_block
+    
+    def _log_swap(self, swap: Dict):
+        logger.info(
+            f"Recorded {swap['swap_type']} swap: {swap['trader_wallet'][:10]}... "
+            f"Tax: {from_wei(swap['cope_tax_amount']):.2f} COPE, Referrer: {swap['referrer_wallet'][:10]}..."
+        )
+    
+    async def poll_once(self) -> bool:
+        """
+        Fetch and record the next batch of blocks after the checkpoint
+        Returns: True once the listener has caught up with the chain head
+        """
+        current_block = await self.rpc.block_number()
+        
+        if self.last_processed_block is None:
+            await self.initialize()
+        
+        if self.confirmations:
+            await self.promote_confirmed(current_block)
+        
+        if current_block <= self.last_processed_block:
+            return True
+        
+        # Process blocks in batches
+        start_block = self.last_processed_block + 1
+        end_block = self.next_batch_end(current_block)
+        
+        # Ranges that reach into unconfirmed blocks are staged, and must extend
+        # the chain we already built on
+        headers = None
+        if self.confirmations and end_block > current_block - self.confirmations:
+            headers = await self.block_times.get_headers({start_block, end_block})
+            known = await self.db.get_block_hashes(self.CHECKPOINT_NAME, up_to_block=start_block - 1)
+            parent = [block_hash for number, block_hash in known if number == start_block - 1]
+            if parent and headers[start_block]['parentHash'] not in parent:
+                logger.warning(f"Block {start_block} does not extend block {start_block - 1} as recorded")
+                await self.handle_reorg()
+                return False
+        
+        logger.info(f"Processing blocks {start_block} to {end_block}")
+        
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            events = await self.fetch_swap_logs(start_block, end_block)
         except Exception as e:
-            logger.error(f"Error processing transfer event: {e}")
+            if is_range_error(e) and self.ranges.shrink():
+                logger.warning(
+                    f"Blocks {start_block}-{end_block} rejected ({e}); "
+                    f"retrying with a {self.ranges.window}-block window"
+                )
+                return False  # Not caught up: the caller retries straight away
+            raise
+        fetched = loop.time()
+        
+        # Decode and record the whole range, and the checkpoint, in one transaction
+        await self.process_block_range(events, end_block, headers)
+        
+        self.ranges.record(end_block - start_block + 1, len(events), fetched - started, loop.time() - started)
+        return end_block >= current_block
+    
+    async def fetch_swap_logs(self, start_block: int, end_block: int) -> List[Dict]:
+        """
+        Get COPE Transfers to or from an approved pool, filtered by the node,
+        and the pools' PancakeSwap Swap events
+        Buys have the pool in topic1 (from), sells in topic2 (to); the three
+        queries run concurrently and the results are merged in chain order
+        """
+        base = {'fromBlock': start_block, 'toBlock': end_block, 'address': self.token_contract}
+        buys, sells, dex_swaps = await asyncio.gather(
+            self.rpc.get_logs({**base, 'topics': [self.TRANSFER_EVENT_SIGNATURE, self.pool_topics]}),
+            self.rpc.get_logs({**base, 'topics': [self.TRANSFER_EVENT_SIGNATURE, None, self.pool_topics]}),
+            self.rpc.get_logs(self.dex.log_filter(start_block, end_block))
+        )
+        # A pool-to-pool transfer matches both Transfer queries
+        merged = {_log_key(event): event for event in buys + sells + dex_swaps}
+        return sorted(merged.values(), key=lambda event: (event['blockNumber'], event.get('logIndex', 0)))
+    
+    async def catch_up(self):
+        """Poll batch after batch until the checkpoint reaches the chain head"""
+        while self.is_running and not await self.poll_once():
+            pass
     
     async def listen_for_events(self):
         """Main event listening loop"""
         self.is_running = True
         logger.info("Starting COPE event listener...")
         
+        if LISTENER_MODE == "websocket":
+            await self.listen_via_websocket()
+            return
+        
+        while self.is_running and self.pipeline is not None:
+            try:
+                await self.pipeline.run()
+            except Exception as e:
+                # Nothing past the checkpoint was written, so the stages restart from it
+                logger.error(f"Error in event listener pipeline: {e}")
+                await asyncio.sleep(30)  # Wait longer on error
+        
         while self.is_running:
             try:
-                current_block = self.w3.eth.block_number
-                
-                if self.last_processed_block is None:
-                    await self.initialize()
-                
-                # Process blocks in batches
-                if current_block > self.last_processed_block:
-                    end_block = min(self.last_processed_block + 100, current_block)
-                    
-                    logger.info(f"Processing blocks {self.last_processed_block} to {end_block}")
-                    
-                    # Get Transfer events for COPE token
-                    transfer_filter = self.w3.eth.filter({
-                        'fromBlock': self.last_processed_block,
-                        'toBlock': end_block,
-                        'address': self.token_contract,
-                        'topics': [self.TRANSFER_EVENT_SIGNATURE]
-                    })
-                    
-                    events = transfer_filter.get_all_entries()
-                    
-                    # Process each event
-                    for event in events:
-                        # Get block timestamp
-                        block = self.w3.eth.get_block(event['blockNumber'])
-                        block_timestamp = datetime.utcfromtimestamp(block['timestamp'])
-                        
-                        await self.process_transfer_event(event, block_timestamp)
-                    
-                    self.last_processed_block = end_block
-                    
-                    # Save last processed block (in production, save to DB)
-                
-                # Wait before next check
-                await asyncio.sleep(12)  # BNB Chain block time ~3s, check every 4 blocks
+                if await self.poll_once():
+                    # Wait before next check
+                    await asyncio.sleep(LISTENER_POLL_INTERVAL)  # BNB Chain block time ~3s
+                # Otherwise still catching up, fetch the next batch straight away
                 
             except Exception as e:
                 logger.error(f"Error in event listener loop: {e}")
                 await asyncio.sleep(30)  # Wait longer on error
     
+    async def listen_via_websocket(self, url: str = BNB_CHAIN_RPC_WS_URL):
+        """
+        Push mode: record Transfers as the node pushes them over a log subscription
+        The polling path still runs after every (re)connect and every
+        LISTENER_POLL_INTERVAL, to fill gaps the subscription missed and to
+        advance the checkpoint, and carries ingestion alone while the subscription
+        is down; logs seen by both paths are processed once.
+        """
+        loop = asyncio.get_running_loop()
+        reconnect_delay = LISTENER_WS_RECONNECT_DELAY
+        subscription_filter = {
+            'address': [self.token_contract] + self.dex.pools,
+            'topics': [[self.TRANSFER_EVENT_SIGNATURE, self.dex.SWAP_EVENT_SIGNATURE]],
+        }
+        
+        while self.is_running:
+            try:
+                async with LogSubscription(subscription_filter, url) as subscription:
+                    reconnect_delay = LISTENER_WS_RECONNECT_DELAY
+                    # Logs pushed while catching up queue on the socket until we read them
+                    await self.catch_up()
+                    next_poll = loop.time() + LISTENER_POLL_INTERVAL
+                    # Pushed logs of the current block, decoded together so each
+                    # Transfer meets the Swap event that follows it
+                    pushed: List[Dict] = []
+                    
+                    while self.is_running:
+                        timeout = _PUSH_FLUSH_DELAY if pushed else max(next_poll - loop.time(), 0)
+                        try:
+                            log = await asyncio.wait_for(subscription.next(), timeout=timeout)
+                        except asyncio.TimeoutError:
+                            if pushed:
+                                await self._process_pushed(pushed)
+                                pushed = []
+                                continue
+                            await self.catch_up()
+                            next_poll = loop.time() + LISTENER_POLL_INTERVAL
+                            continue
+                        
+                        if log.get('removed'):
+                            continue  # Dropped by a reorg; the polling path sees the canonical chain
+                        if pushed and log['blockNumber'] != pushed[0]['blockNumber']:
+                            await self._process_pushed(pushed)
+                            pushed = []
+                        pushed.append(log)
+                        
+            except Exception as e:
+                logger.error(f"Log subscription failed, polling until reconnecting in {reconnect_delay:.0f}s: {e}")
+                await self._poll_until(loop.time() + reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, 60)
+    
+    async def _poll_until(self, deadline: float):
+        """Fall back to the polling path until `deadline` (loop time), while the subscription is down"""
+        loop = asyncio.get_running_loop()
+        while self.is_running and loop.time() < deadline:
+            try:
+                await self.catch_up()
+            except Exception as e:
+                logger.error(f"Error polling while the log subscription is down: {e}")
+            await asyncio.sleep(max(min(LISTENER_POLL_INTERVAL, deadline - loop.time()), 0))
+    
+    async def _process_pushed(self, logs: List[Dict]):
+        """
+        Record one block's pushed logs without moving the checkpoint: only the
+        polling path knows every log up to a block has been seen
+        """
+        try:
+            await self.process_block_range(logs, headers={} if self.confirmations else None)
+        except Exception as e:
+            logger.warning(f"Pushed logs in block {logs[0]['blockNumber']} left for polling: {e}")
+    
     def stop(self):
         """Stop the event listener"""
         self.is_running = False
         logger.info("Stopping COPE event listener...")
 
 
-# Alternative: Listen to DEX swap events directly
-# This would require knowing the DEX contract addresses (PancakeSwap, etc.)
+def _log_key(event: Dict):
+    return (event['transactionHash'], event.get('logIndex', 0))
+
+
 class DEXSwapEventListener:
     """
-    Alternative approach: Listen to DEX swap events directly
-    This can be more accurate for detecting swaps and calculating amounts
+    Decodes PancakeSwap V2 Swap events from the approved pairs
+    Each Swap is joined to the COPE Transfer it settled, which gives the exact
+    COPE and BNB amounts of a trade without per-transaction receipt lookups
     """
     
-    def __init__(self, db_manager: DatabaseManager, w3: Optional[Web3] = None):
+    # PancakeSwap V2 Swap(address indexed sender, uint amount0In, uint amount1In,
+    #                     uint amount0Out, uint amount1Out, address indexed to)
+    SWAP_EVENT_SIGNATURE = "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
+    # token0() selector, to learn which side of each pair is COPE
+    TOKEN0_SELECTOR = "0x0dfe1681"
+    
+    def __init__(self, db_manager: DatabaseManager, rpc: Optional[AsyncRPCClient] = None):
         self.db = db_manager
-        self.w3 = w3 or Web3(Web3.HTTPProvider(BNB_CHAIN_RPC_URL))
-        # PancakeSwap V2 Swap event signature
-        self.SWAP_EVENT_SIGNATURE = "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
+        self.rpc = rpc or AsyncRPCClient()
+        self.token_contract = TOKEN_CONTRACT.lower()
+        self.pools = [pool.lower() for pool in APPROVED_LIQUIDITY_POOLS]
+        # Whether COPE is token0 of each pair; resolved once, on the first Swap seen
+        self._cope_is_token0: Dict[str, bool] = {}
+    
+    async def resolve_pairs(self):
+        """Look up token0() of every approved pair not resolved yet"""
+        missing = [pool for pool in self.pools if pool not in self._cope_is_token0]
+        token0s = await asyncio.gather(
+            *(self.rpc.call({'to': pool, 'data': self.TOKEN0_SELECTOR}) for pool in missing)
+        )
+        for pool, token0 in zip(missing, token0s):
+            self._cope_is_token0[pool] = "0x" + token0[-40:].lower() == self.token_contract
     
-    async def process_swap_event(self, event: Dict):
+    def log_filter(self, start_block: int, end_block: int) -> Dict:
+        """eth_getLogs filter for the approved pairs' Swap events in a block range"""
+        return {
+            'fromBlock': start_block,
+            'toBlock': end_block,
+            'address': self.pools,
+            'topics': [self.SWAP_EVENT_SIGNATURE],
+        }
+    
+    def is_swap_log(self, event: Dict) -> bool:
+        return event['topics'][0] == self.SWAP_EVENT_SIGNATURE and event['address'].lower() in self.pools
+    
+    async def process_swap_event(self, event: Dict) -> Optional[Dict]:
         """
         Process PancakeSwap Swap event
         This gives us more accurate swap data including BNB amounts
         """
-        # Implementation would parse Swap event from PancakeSwap
-        # and extract: amount0In, amount1In, amount0Out, amount1Out
-        # Then determine which is COPE and which is BNB
-        pass
-
+        decoded = await self.decode_swap_events([event])
+        return decoded[0] if decoded else None
+    
+    async def decode_swap_events(self, events: List[Dict]) -> List[Dict]:
+        """
+        Decode Swap logs into COPE/BNB flows as seen by the pair (amounts in wei):
+        cope_in/bnb_in were paid into the pair, cope_out/bnb_out paid out
+        """
+        if not events:
+            return []
+        if len(self._cope_is_token0) < len(self.pools):
+            await self.resolve_pairs()
+        
+        decoded = []
+        for event in events:
+            pool = event['address'].lower()
+            # data is four 32-byte words: amount0In, amount1In, amount0Out, amount1Out
+            data = event['data'][2:]
+            amount0_in, amount1_in, amount0_out, amount1_out = (
+                int(data[i:i + 64], 16) for i in range(0, 256, 64)
+            )
+            if self._cope_is_token0[pool]:
+                cope_in, cope_out, bnb_in, bnb_out = amount0_in, amount0_out, amount1_in, amount1_out
+            else:
+                cope_in, cope_out, bnb_in, bnb_out = amount1_in, amount1_out, amount0_in, amount0_out
+            decoded.append({
+                'transaction_hash': event['transactionHash'],
+                'log_index': event.get('logIndex', 0),
+                'pool': pool,
+                'cope_in': cope_in,
+                'cope_out': cope_out,
+                'bnb_in': bnb_in,
+                'bnb_out': bnb_out,
+            })
+        return decoded
+    
+    def match_transfers(self, transfers: List[Dict], swaps: List[Dict]) -> Dict[Tuple[str, int], Dict]:
+        """
+        Join pool Transfers to decoded Swaps
+        A pair emits Swap after moving the tokens, so a Transfer belongs to the first
+        Swap from the same pair later in the same transaction
+        Returns: decoded Swap keyed by the Transfer's (transaction hash, log index)
+        """
+        by_pair: Dict[Tuple[str, str], List[Dict]] = {}
+        for swap in sorted(swaps, key=lambda swap: swap['log_index']):
+            by_pair.setdefault((swap['transaction_hash'], swap['pool']), []).append(swap)
+        
+        matched = {}
+        for transfer in transfers:
+            from_address = "0x" + transfer['topics'][1][-40:].lower()
+            to_address = "0x" + transfer['topics'][2][-40:].lower()
+            pool = from_address if from_address in self.pools else to_address
+            log_index = transfer.get('logIndex', 0)
+            for swap in by_pair.get((transfer['transactionHash'], pool), ()):
+                if swap['log_index'] > log_index:
+                    matched[(transfer['transactionHash'], log_index)] = swap
+                    break
+        return matched
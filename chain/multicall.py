@@ -0,0 +1,153 @@
+"""
+Batched on-chain reads through the Multicall3 contract
+Many contract reads (ERC20 and native balances, pair reserves, token getters)
+are packed into a few aggregate3 eth_calls instead of one RPC per read
+"""
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+
+from eth_abi import decode, encode
+from eth_abi.exceptions import DecodingError
+from web3 import Web3
+
+from config import MULTICALL3_ADDRESS, MULTICALL_BATCH_SIZE
+from chain.rpc import AsyncRPCClient
+
+
+logger = logging.getLogger(__name__)
+
+# aggregate3((address target, bool allowFailure, bytes callData)[]) returns ((bool success, bytes returnData)[])
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")
+
+# Zero-argument getters read by Multicall.token_state unless others are given
+ERC20_GETTERS = {
+    'name': ('name()', ('string',)),
+    'symbol': ('symbol()', ('string',)),
+    'decimals': ('decimals()', ('uint8',)),
+    'totalSupply': ('totalSupply()', ('uint256',)),
+}
+
+
+@lru_cache(maxsize=256)
+def _selector(signature: str) -> bytes:
+    return bytes(Web3.keccak(text=signature)[:4])
+
+
+def _argument_types(signature: str) -> Tuple[str, ...]:
+    """'balanceOf(address)' -> ('address',); nested tuple arguments are not supported"""
+    arguments = signature[signature.index('(') + 1:signature.rindex(')')]
+    return tuple(arguments.split(',')) if arguments else ()
+
+
+class ContractCall:
+    """One contract read: target, function signature, arguments and return types"""
+    
+    def __init__(self, target: str, signature: str, args: Sequence = (), returns: Sequence[str] = ('uint256',)):
+        self.target = target.lower()
+        self.signature = signature
+        self.args = tuple(args)
+        self.returns = tuple(returns)
+    
+    def encode(self) -> bytes:
+        return _selector(self.signature) + encode(_argument_types(self.signature), self.args)
+    
+    def decode(self, data: bytes) -> Any:
+        """The decoded return value; a tuple when the function returns several values"""
+        values = decode(self.returns, data)
+        return values[0] if len(values) == 1 else values
+
+
+class Multicall:
+    """Runs ContractCalls through Multicall3's aggregate3, MULTICALL_BATCH_SIZE calls per eth_call"""
+    
+    def __init__(self, rpc: Optional[AsyncRPCClient] = None, address: str = MULTICALL3_ADDRESS,
+                 batch_size: int = MULTICALL_BATCH_SIZE):
+        self.rpc = rpc or AsyncRPCClient()
+        self.address = address
+        self.batch_size = max(1, batch_size)
+    
+    async def aggregate(self, calls: Sequence[ContractCall], block: Any = 'latest') -> List[Any]:
+        """
+        Run every call, chunked so each eth_call stays within the node's gas cap
+        Returns: decoded results in call order; None for calls that reverted
+        or returned nothing decodable (e.g. a target with no code)
+        """
+        if not calls:
+            return []
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        if len(chunks) > 1 and block == 'latest':
+            # Pin the block so every chunk reads the same state
+            block = await self.rpc.block_number()
+        if isinstance(block, int):
+            block = hex(block)
+        
+        results = await asyncio.gather(*(self._aggregate_chunk(chunk, block) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+    
+    async def _aggregate_chunk(self, calls: Sequence[ContractCall], block: str) -> List[Any]:
+        data = AGGREGATE3_SELECTOR + encode(
+            ['(address,bool,bytes)[]'], [[(call.target, True, call.encode()) for call in calls]]
+        )
+        reply = await self.rpc.call({'to': self.address, 'data': '0x' + data.hex()}, block)
+        (returned,) = decode(['(bool,bytes)[]'], bytes.fromhex(reply[2:]))
+        
+        results = []
+        for call, (success, return_data) in zip(calls, returned):
+            if not success or not return_data:
+                results.append(None)
+                continue
+            try:
+                results.append(call.decode(return_data))
+            except DecodingError as e:
+                logger.debug(f"Undecodable {call.signature} result from {call.target}: {e}")
+                results.append(None)
+        return results
+    
+    async def balances(self, wallets: Iterable[str], tokens: Iterable[str] = (),
+                       block: Any = 'latest') -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        Native balance and each token's balanceOf for every wallet, in one aggregate
+        Returns: {wallet: {'native': wei, <token>: wei}} keyed by lowercased address
+        """
+        wallets = list(dict.fromkeys(wallet.lower() for wallet in wallets))
+        tokens = [token.lower() for token in tokens]
+        calls = []
+        for wallet in wallets:
+            # Multicall3's own getEthBalance reads native balances inside the same call
+            calls.append(ContractCall(self.address, 'getEthBalance(address)', (wallet,)))
+            calls.extend(ContractCall(token, 'balanceOf(address)', (wallet,)) for token in tokens)
+        results = iter(await self.aggregate(calls, block))
+        return {wallet: {key: next(results) for key in ['native'] + tokens} for wallet in wallets}
+    
+    async def token_balances(self, token: str, wallets: Iterable[str], block: Any = 'latest') -> Dict[str, Optional[int]]:
+        """balanceOf(wallet) on one token, keyed by lowercased wallet"""
+        token = token.lower()
+        balances = await self.balances(wallets, [token], block)
+        return {wallet: balance[token] for wallet, balance in balances.items()}
+    
+    async def native_balances(self, wallets: Iterable[str], block: Any = 'latest') -> Dict[str, Optional[int]]:
+        """BNB balance (wei) of each wallet, keyed by lowercased wallet"""
+        balances = await self.balances(wallets, (), block)
+        return {wallet: balance['native'] for wallet, balance in balances.items()}
+    
+    async def reserves(self, pairs: Iterable[str], block: Any = 'latest') -> Dict[str, Optional[Tuple[int, int, int]]]:
+        """getReserves() of PancakeSwap V2 pairs: (reserve0, reserve1, blockTimestampLast)"""
+        pairs = list(dict.fromkeys(pair.lower() for pair in pairs))
+        results = await self.aggregate(
+            [ContractCall(pair, 'getReserves()', returns=('uint112', 'uint112', 'uint32')) for pair in pairs], block
+        )
+        return dict(zip(pairs, results))
+    
+    async def token_state(self, token: str, getters: Optional[Dict[str, Tuple[str, Sequence[str]]]] = None,
+                          block: Any = 'latest') -> Dict[str, Any]:
+        """
+        Zero-argument getters of a token contract (ERC20 metadata by default)
+        `getters` maps a result key to (signature, return types), e.g. a tax getter
+        """
+        getters = getters if getters is not None else ERC20_GETTERS
+        results = await self.aggregate(
+            [ContractCall(token, signature, returns=returns) for signature, returns in getters.values()], block
+        )
+        return dict(zip(getters, results))
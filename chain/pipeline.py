@@ -0,0 +1,257 @@
+"""
+Staged ingestion pipeline for the COPE event listener
+Fetch, decode, enrich and persist run as separate tasks joined by bounded queues,
+so logs for block range N+1 are fetched while range N is still being written.
+When the writer falls behind the queues fill up and fetching pauses.
+"""
+from typing import Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from config import LISTENER_POLL_INTERVAL, LISTENER_PIPELINE_DEPTH
+from chain.ranges import is_range_error
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('fetch', 'decode', 'enrich', 'persist')
+
+# Queued in place of a range when the fetch stage finds the chain no longer
+# extends the ranges already in flight; the persist stage handles it in order
+_REORG = 'reorg'
+
+
+class _StageStats:
+    """Items, blocks and busy time of one stage"""
+    
+    def __init__(self):
+        self.ranges = 0
+        self.blocks = 0
+        self.busy_seconds = 0.0
+        self.dropped = 0
+    
+    def record(self, blocks: int, seconds: float):
+        self.ranges += 1
+        self.blocks += blocks
+        self.busy_seconds += seconds
+
+
+class IngestionPipeline:
+    """
+    Drives a COPEEventListener as fetch -> decode -> enrich -> persist stages
+    Ranges are persisted strictly in order by a single task, which is also the
+    only one that promotes confirmed swaps or rolls back after a reorg. A rollback
+    bumps `generation`; ranges fetched for the old chain are dropped and fetching
+    restarts after the rolled-back checkpoint.
+    """
+    
+    def __init__(self, listener, depth: int = LISTENER_PIPELINE_DEPTH):
+        self.listener = listener
+        self.depth = max(1, depth)
+        # Input queue of each stage after fetch
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.generation = 0
+        self._stats = {stage: _StageStats() for stage in STAGES}
+        self._started: Optional[float] = None
+        self._resynced: Optional[asyncio.Event] = None
+    
+    async def run(self):
+        """Run the stages until the listener stops; the first stage error cancels the rest and is raised"""
+        if self.listener.last_processed_block is None:
+            await self.listener.initialize()
+        
+        self.queues = {stage: asyncio.Queue(self.depth) for stage in STAGES[1:]}
+        self._resynced = asyncio.Event()
+        self._resynced.set()
+        if self._started is None:
+            self._started = time.monotonic()
+        
+        tasks = [
+            asyncio.create_task(stage(), name=f"pipeline-{name}")
+            for name, stage in zip(STAGES, (self._fetch, self._decode, self._enrich, self._persist))
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def stats(self) -> Dict:
+        """Queue depth and throughput of each stage"""
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        stats = {}
+        for stage in STAGES:
+            stage_stats = self._stats[stage]
+            queue = self.queues.get(stage)
+            stats[stage] = {
+                'queued': queue.qsize() if queue is not None else 0,
+                'ranges': stage_stats.ranges,
+                'blocks': stage_stats.blocks,
+                'dropped': stage_stats.dropped,
+                'blocks_per_second': round(stage_stats.blocks / elapsed, 2) if elapsed else 0.0,
+                # Share of wall time the stage spent working rather than waiting on its neighbours
+                'utilization': round(stage_stats.busy_seconds / elapsed, 3) if elapsed else 0.0,
+            }
+        return {'depth': self.depth, 'generation': self.generation, 'stages': stats}
+    
+    def _stale(self, item: Dict, stage: str) -> bool:
+        """True (and counted) if `item` was fetched before the latest rollback"""
+        if item['generation'] == self.generation:
+            return False
+        self._stats[stage].dropped += 1
+        return True
+    
+    async def _parent_mismatch(self, start_block: int, headers: Dict[int, Dict],
+                               tip: Optional[Tuple[int, str]]) -> bool:
+        """True if `start_block` does not extend the block the previous range ended on"""
+        if tip is not None and tip[0] == start_block - 1:
+            parents = [tip[1]]
+        else:
+            # The previous range is persisted (or was committed final without hashes)
+            known = await self.listener.db.get_block_hashes(
+                self.listener.CHECKPOINT_NAME, up_to_block=start_block - 1
+            )
+            parents = [block_hash for number, block_hash in known if number == start_block - 1]
+        return bool(parents) and headers[start_block]['parentHash'] not in parents
+    
+    async def _fetch(self):
+        listener = self.listener
+        output = self.queues['decode']
+        generation = self.generation
+        start_block = listener.last_processed_block + 1
+        # (number, hash) of the last block of the previous staged range
+        tip: Optional[Tuple[int, str]] = None
+        
+        while listener.is_running:
+            await self._resynced.wait()
+            if generation != self.generation:
+                generation = self.generation
+                start_block = listener.last_processed_block + 1
+                tip = None
+            
+            current_block = await listener.rpc.block_number()
+            if start_block > current_block:
+                await asyncio.sleep(LISTENER_POLL_INTERVAL)
+                continue
+            
+            started = time.monotonic()
+            end_block = min(start_block - 1 + listener.ranges.window, current_block)
+            
+            headers = None
+            if listener.confirmations and end_block > current_block - listener.confirmations:
+                headers = await listener.block_times.get_headers({start_block, end_block})
+                if await self._parent_mismatch(start_block, headers, tip):
+                    logger.warning(f"Block {start_block} does not extend block {start_block - 1} as fetched")
+                    # Stop fetching until the persist stage has rolled back
+                    self._resynced.clear()
+                    await output.put(_REORG)
+                    continue
+            
+            try:
+                events = await listener.fetch_swap_logs(start_block, end_block)
+            except Exception as e:
+                if is_range_error(e) and listener.ranges.shrink():
+                    logger.warning(
+                        f"Blocks {start_block}-{end_block} rejected ({e}); "
+                        f"retrying with a {listener.ranges.window}-block window"
+                    )
+                    continue
+                raise
+            fetch_seconds = time.monotonic() - started
+            self._stats['fetch'].record(end_block - start_block + 1, fetch_seconds)
+            
+            # Blocks here while the later stages are full
+            await output.put({
+                'generation': generation,
+                'start_block': start_block,
+                'end_block': end_block,
+                'current_block': current_block,
+                'events': events,
+                'headers': headers,
+                'started': started,
+                'fetch_seconds': fetch_seconds,
+            })
+            tip = (end_block, headers[end_block]['hash']) if headers is not None else None
+            start_block = end_block + 1
+        
+        await output.put(None)
+    
+    async def _decode(self):
+        listener = self.listener
+        source, output = self.queues['decode'], self.queues['enrich']
+        while True:
+            item = await source.get()
+            if item is None or item == _REORG:
+                await output.put(item)
+                if item is None:
+                    return
+                continue
+            if self._stale(item, 'decode'):
+                continue
+            
+            started = time.monotonic()
+            item['events'] = listener.unseen(item['events'])
+            item['decoded'] = await listener.classify_block_range(item['events'])
+            self._stats['decode'].record(item['end_block'] - item['start_block'] + 1, time.monotonic() - started)
+            await output.put(item)
+    
+    async def _enrich(self):
+        listener = self.listener
+        source, output = self.queues['enrich'], self.queues['persist']
+        while True:
+            item = await source.get()
+            if item is None or item == _REORG:
+                await output.put(item)
+                if item is None:
+                    return
+                continue
+            if self._stale(item, 'enrich'):
+                continue
+            
+            started = time.monotonic()
+            item['swaps'] = await listener.enrich_block_range(item.pop('decoded'))
+            self._stats['enrich'].record(item['end_block'] - item['start_block'] + 1, time.monotonic() - started)
+            await output.put(item)
+    
+    async def _persist(self):
+        listener = self.listener
+        source = self.queues['persist']
+        while True:
+            item = await source.get()
+            if item is None:
+                return
+            if item == _REORG:
+                await listener.handle_reorg()
+                self._resync()
+                continue
+            if self._stale(item, 'persist'):
+                continue
+            if item['start_block'] != listener.last_processed_block + 1:
+                # A rollback moves the checkpoint back, so ranges fetched after it no longer line up
+                self._stats['persist'].dropped += 1
+                continue
+            
+            started = time.monotonic()
+            if item['headers'] is not None:
+                await listener.stage_block_range(item['events'], item['swaps'], item['end_block'], item['headers'])
+            else:
+                await listener.commit_block_range(item['events'], item['swaps'], item['end_block'])
+            
+            blocks = item['end_block'] - item['start_block'] + 1
+            listener.ranges.record(blocks, len(item['events']), item['fetch_seconds'], time.monotonic() - item['started'])
+            
+            if listener.confirmations:
+                reorgs = listener.reorgs
+                await listener.promote_confirmed(item['current_block'])
+                if listener.reorgs != reorgs:
+                    self._resync()
+            self._stats['persist'].record(blocks, time.monotonic() - started)
+    
+    def _resync(self):
+        """Invalidate every range in flight and let the fetch stage restart after the checkpoint"""
+        self.generation += 1
+        self._resynced.set()
@@ -0,0 +1,98 @@
+"""
+Adaptive block-range sizing for log fetching
+"""
+import asyncio
+import logging
+from typing import Dict
+
+from config import (
+    LISTENER_BATCH_BLOCKS, LISTENER_MIN_RANGE, LISTENER_MAX_RANGE,
+    LISTENER_RANGE_FAST_SECONDS, LISTENER_RANGE_TARGET_LOGS
+)
+from chain.rpc import RPCError
+
+
+logger = logging.getLogger(__name__)
+
+# Phrases of the errors public BSC nodes return for oversized eth_getLogs ranges;
+# whole phrases, so unrelated errors that merely mention a range don't shrink the window
+_RANGE_ERROR_HINTS = (
+    'block range', 'range too large', 'range is too large', 'query returned more than',
+    'too many results', 'too many blocks', 'limit exceeded', 'response size exceeded',
+    'timeout', 'timed out'
+)
+
+# Weight of the newest sample in the blocks/sec moving average
+_RATE_SMOOTHING = 0.3
+
+# Successful ranges before the window may grow back to a size the node rejected
+_CEILING_RETRY_AFTER = 20
+
+
+def is_range_error(error: Exception) -> bool:
+    """True if the node rejected or timed out on a range that a smaller window might satisfy"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, RPCError):
+        message = str(error).lower()
+        return error.code == -32005 or any(hint in message for hint in _RANGE_ERROR_HINTS)
+    return False
+
+
+class BlockRangeController:
+    """Sizes eth_getLogs windows from how the node handled the previous ones"""
+    
+    def __init__(self, initial: int = LISTENER_BATCH_BLOCKS, minimum: int = LISTENER_MIN_RANGE,
+                 maximum: int = LISTENER_MAX_RANGE, fast_seconds: float = LISTENER_RANGE_FAST_SECONDS,
+                 target_logs: int = LISTENER_RANGE_TARGET_LOGS):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.window = min(max(initial, self.minimum), self.maximum)
+        self.fast_seconds = fast_seconds
+        self.target_logs = target_logs
+        # Smallest window the node has rejected; growth stops below it for a while
+        self.ceiling = None
+        self._since_shrink = 0
+        self.blocks_per_second = 0.0
+        self.blocks_processed = 0
+        self.grows = 0
+        self.shrinks = 0
+    
+    def record(self, blocks: int, logs: int, fetch_seconds: float, total_seconds: float):
+        """Account for a successful range and grow the window if it was fast and sparse"""
+        self.blocks_processed += blocks
+        if total_seconds > 0:
+            rate = blocks / total_seconds
+            self.blocks_per_second = rate if not self.blocks_per_second else (
+                _RATE_SMOOTHING * rate + (1 - _RATE_SMOOTHING) * self.blocks_per_second
+            )
+        self._since_shrink += 1
+        if self.ceiling is not None and self._since_shrink >= _CEILING_RETRY_AFTER:
+            self.ceiling = None
+        
+        # Only a full window says anything about whether a bigger one would work
+        grown = min(self.window * 2, self.maximum)
+        if (blocks >= self.window and fetch_seconds < self.fast_seconds and logs < self.target_logs
+                and grown > self.window and (self.ceiling is None or grown < self.ceiling)):
+            self.window = grown
+            self.grows += 1
+    
+    def shrink(self) -> bool:
+        """Halve the window after a range error; False if it is already at the minimum"""
+        if self.window <= self.minimum:
+            return False
+        self.ceiling = self.window if self.ceiling is None else min(self.ceiling, self.window)
+        self._since_shrink = 0
+        self.window = max(self.window // 2, self.minimum)
+        self.shrinks += 1
+        return True
+    
+    def stats(self) -> Dict:
+        return {
+            'window': self.window,
+            'blocks_per_second': round(self.blocks_per_second, 2),
+            'blocks_processed': self.blocks_processed,
+            'grows': self.grows,
+            'shrinks': self.shrinks,
+            'ceiling': self.ceiling,
+        }
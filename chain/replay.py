@@ -0,0 +1,224 @@
+"""
+Offline recording and replay of the chain data the event listener reads
+ChainRecorder captures the COPE Transfer and pair Swap logs of a block range,
+their block headers and the pairs' token0() into a gzip JSON fixture;
+ReplayRPCClient serves such a fixture in place of a node, with optional
+injected latency and errors, so ingestion can be tested and benchmarked offline
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+import asyncio
+import gzip
+import json
+import logging
+import random
+import time
+
+from config import TOKEN_CONTRACT, APPROVED_LIQUIDITY_POOLS, BACKFILL_CHUNK_BLOCKS
+from chain.blocks import BlockTimestampCache
+from chain.decoder import address_topic
+from chain.event_listener import COPEEventListener, DEXSwapEventListener
+from chain.ranges import is_range_error
+from chain.rpc import AsyncRPCClient
+
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_VERSION = 1
+
+# Header fields kept in fixtures; the listener reads nothing else
+_HEADER_FIELDS = ('number', 'hash', 'parentHash', 'timestamp')
+
+
+def load_fixture(path: str) -> Dict:
+    """A fixture written by save_fixture (gzip when the path ends in .gz)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        fixture = json.load(f)
+    if fixture.get('version') != FIXTURE_VERSION:
+        raise ValueError(f"{path}: unsupported fixture version {fixture.get('version')}")
+    return fixture
+
+
+def save_fixture(path: str, fixture: Dict):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt') as f:
+        json.dump(fixture, f)
+
+
+def call_key(transaction: Dict) -> str:
+    """Key of an eth_call in a fixture's 'calls'"""
+    return f"{transaction['to'].lower()}:{transaction['data'].lower()}"
+
+
+class InjectedTimeout(asyncio.TimeoutError):
+    """A timeout ReplayRPCClient raised on purpose (error_rate), not a real failure"""
+
+
+class ChainRecorder:
+    """Records what the event listener reads for a block range from a live node"""
+    
+    def __init__(self, rpc: AsyncRPCClient, token: str = TOKEN_CONTRACT,
+                 pools: Iterable[str] = APPROVED_LIQUIDITY_POOLS, chunk_size: int = BACKFILL_CHUNK_BLOCKS):
+        self.rpc = rpc
+        self.token = token.lower()
+        self.pools = [pool.lower() for pool in pools]
+        self.chunk_size = max(1, chunk_size)
+    
+    def _filters(self, start_block: int, end_block: int) -> List[Dict]:
+        """The listener's eth_getLogs filters (see COPEEventListener.fetch_swap_logs)"""
+        base = {'fromBlock': hex(start_block), 'toBlock': hex(end_block)}
+        pool_topics = [address_topic(pool) for pool in self.pools]
+        transfer = COPEEventListener.TRANSFER_EVENT_SIGNATURE
+        return [
+            {**base, 'address': self.token, 'topics': [transfer, pool_topics]},
+            {**base, 'address': self.token, 'topics': [transfer, None, pool_topics]},
+            {**base, 'address': self.pools, 'topics': [DEXSwapEventListener.SWAP_EVENT_SIGNATURE]},
+        ]
+    
+    async def _get_logs(self, start_block: int, end_block: int) -> List[Dict]:
+        """Raw logs of the range, halving it while the node rejects it as too large"""
+        try:
+            results = await asyncio.gather(
+                *(self.rpc.request('eth_getLogs', [log_filter]) for log_filter in self._filters(start_block, end_block))
+            )
+        except Exception as e:
+            if not is_range_error(e) or start_block == end_block:
+                raise
+            middle = (start_block + end_block) // 2
+            return await self._get_logs(start_block, middle) + await self._get_logs(middle + 1, end_block)
+        return [log for logs in results for log in logs]
+    
+    async def record(self, from_block: int, to_block: int) -> Dict:
+        """Fixture for blocks from_block..to_block inclusive"""
+        logs = {}
+        for start in range(from_block, to_block + 1, self.chunk_size):
+            end = min(start + self.chunk_size - 1, to_block)
+            for log in await self._get_logs(start, end):
+                # A pool-to-pool transfer matches both Transfer filters
+                logs[(log['transactionHash'], log['logIndex'])] = log
+            logger.info(f"Recorded blocks {start}-{end}: {len(logs)} logs so far")
+        
+        blocks = {int(log['blockNumber'], 16) for log in logs.values()} | {from_block, to_block}
+        headers = await BlockTimestampCache(self.rpc).get_headers(blocks)
+        
+        calls = {}
+        for pool in self.pools:
+            transaction = {'to': pool, 'data': DEXSwapEventListener.TOKEN0_SELECTOR}
+            calls[call_key(transaction)] = await self.rpc.call(transaction)
+        
+        return {
+            'version': FIXTURE_VERSION,
+            'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'token': self.token,
+            'pools': self.pools,
+            'from_block': from_block,
+            'to_block': to_block,
+            'logs': sorted(logs.values(), key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16))),
+            'blocks': {
+                str(number): {field: header[field] for field in _HEADER_FIELDS}
+                for number, header in headers.items()
+            },
+            'calls': calls,
+        }
+
+
+class ReplayRPCClient(AsyncRPCClient):
+    """
+    Serves a fixture as if it were a node whose head is the fixture's last block
+    Only the transport is replaced, so batching, the concurrency limit and endpoint
+    health behave as with a real node. Each request waits `latency` seconds plus up
+    to `jitter`, and `error_rate` of requests time out with InjectedTimeout.
+    """
+    
+    def __init__(self, fixture: Dict, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 1, **kwargs):
+        super().__init__(f"replay://{fixture['from_block']}-{fixture['to_block']}", **kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.head = fixture['to_block']
+        self.requests = 0
+        self.injected_errors = 0
+        self._rng = random.Random(seed)
+        self.serve(fixture)
+    
+    def serve(self, fixture: Dict):
+        """
+        Serve another fixture from now on, e.g. a fork of the current chain to
+        replay a reorg; the head stays where it is
+        """
+        self._logs = sorted(fixture['logs'], key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+        self._log_blocks = [int(log['blockNumber'], 16) for log in self._logs]
+        self._blocks = {int(number): header for number, header in fixture['blocks'].items()}
+        self._calls = fixture.get('calls', {})
+    
+    def _get_session(self):
+        # No HTTP session; only the in-flight limit applies
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return None
+    
+    async def _send(self, endpoint, payload: Any) -> Any:
+        self._get_session()
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                if self.latency or self.jitter:
+                    await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+                self.requests += 1
+                if self.error_rate and self._rng.random() < self.error_rate:
+                    self.injected_errors += 1
+                    raise InjectedTimeout("injected replay timeout")
+            except asyncio.TimeoutError:
+                endpoint.record(False, time.monotonic() - started, self.cooldown)
+                raise
+            endpoint.record(True, time.monotonic() - started, self.cooldown)
+        if isinstance(payload, list):
+            return [self._reply(call) for call in payload]
+        return self._reply(payload)
+    
+    def _reply(self, call: Dict) -> Dict:
+        method, params = call['method'], call.get('params', [])
+        reply = {'jsonrpc': '2.0', 'id': call.get('id')}
+        if method == 'eth_blockNumber':
+            reply['result'] = hex(self.head)
+        elif method == 'eth_getBlockByNumber':
+            number = self.head if params[0] == 'latest' else int(params[0], 16)
+            # Blocks the recording didn't need are unavailable, as on a pruned node
+            reply['result'] = self._blocks.get(number) if number <= self.head else None
+        elif method == 'eth_getLogs':
+            reply['result'] = self._match(params[0])
+        elif method == 'eth_call' and call_key(params[0]) in self._calls:
+            reply['result'] = self._calls[call_key(params[0])]
+        elif method == 'eth_call':
+            reply['error'] = {'code': -32000, 'message': 'execution reverted'}
+        else:
+            reply['error'] = {'code': -32601, 'message': f"{method} not recorded"}
+        return reply
+    
+    def _match(self, log_filter: Dict) -> List[Dict]:
+        """Recorded logs matching an eth_getLogs filter"""
+        start = bisect_left(self._log_blocks, int(log_filter.get('fromBlock', '0x0'), 16))
+        to_block = log_filter.get('toBlock', 'latest')
+        end = bisect_right(self._log_blocks, self.head if to_block == 'latest' else int(to_block, 16))
+        
+        addresses = log_filter.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {address.lower() for address in addresses} if addresses else None
+        topics = [
+            None if topic is None else {option.lower() for option in ([topic] if isinstance(topic, str) else topic)}
+            for topic in log_filter.get('topics') or []
+        ]
+        
+        matched = []
+        for log in self._logs[start:end]:
+            if addresses is not None and log['address'].lower() not in addresses:
+                continue
+            if len(log['topics']) < len(topics):
+                continue
+            if all(options is None or log['topics'][i].lower() in options for i, options in enumerate(topics)):
+                matched.append(log)
+        return matched
@@ -0,0 +1,288 @@
+"""
+Asynchronous JSON-RPC client for BNB Chain
+Requests share one aiohttp session across all endpoints, so chain calls never block the bot's event loop
+"""
+import aiohttp
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from config import (
+    RPC_ENDPOINTS, RPC_MAX_CONCURRENCY, RPC_TIMEOUT, RPC_FAILOVER_ATTEMPTS,
+    RPC_HEDGE_DELAY, RPC_ENDPOINT_COOLDOWN
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Log fields returned as hex quantities that callers want as ints
+_LOG_QUANTITIES = ('blockNumber', 'logIndex', 'transactionIndex')
+
+# Calls that are safe to send to two nodes at once
+_READ_ONLY_METHODS = frozenset({
+    'eth_blockNumber', 'eth_chainId', 'eth_getBlockByNumber', 'eth_getBlockByHash',
+    'eth_getBalance', 'eth_getLogs', 'eth_call', 'eth_getTransactionReceipt',
+})
+_HEALTH_ALPHA = 0.2  # Weight of the newest sample in the moving averages
+_FAILURES_BEFORE_COOLDOWN = 3
+_KEEPALIVE_SECONDS = 60
+
+
+class RPCError(Exception):
+    """Error object returned by the node for a JSON-RPC call"""
+    
+    def __init__(self, method: str, error: Dict):
+        self.method = method
+        self.code = error.get('code')
+        self.data = error.get('data')
+        super().__init__(f"{method} failed ({self.code}): {error.get('message')}")
+
+
+class BatchNotSupported(Exception):
+    """The endpoint does not accept JSON-RPC batch requests"""
+
+
+def normalize_log(log: Dict) -> Dict:
+    """Convert a raw log's hex quantities to ints; topics, data and hashes stay hex strings"""
+    normalized = dict(log)
+    for field in _LOG_QUANTITIES:
+        if isinstance(normalized.get(field), str):
+            normalized[field] = int(normalized[field], 16)
+    return normalized
+
+
+class _Endpoint:
+    """Latency and error history for one RPC node"""
+    
+    def __init__(self, url: str):
+        self.url = url
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.latency: Optional[float] = None  # Moving average of successful calls (seconds)
+        self.error_rate = 0.0  # Moving average of failures (0-1)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+    
+    def record(self, ok: bool, elapsed: float, cooldown: float):
+        self.requests += 1
+        self.error_rate += _HEALTH_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.consecutive_failures = 0
+            self.latency = elapsed if self.latency is None else self.latency + _HEALTH_ALPHA * (elapsed - self.latency)
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= _FAILURES_BEFORE_COOLDOWN:
+            self.down_until = time.monotonic() + cooldown
+    
+    def score(self, timeout: float) -> float:
+        """Expected cost of a call in seconds; a failure costs up to a full timeout"""
+        return (self.latency or 0.0) + self.error_rate * timeout
+    
+    def stats(self, timeout: float) -> Dict:
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 3),
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'score': round(self.score(timeout), 3),
+            'healthy': self.down_until <= time.monotonic(),
+            'hedges_won': self.hedges_won,
+        }
+
+
+class AsyncRPCClient:
+    """
+    JSON-RPC 2.0 over HTTP with bounded concurrent in-flight requests
+    Spreads calls over several endpoints: each call goes to the node with the best
+    recent latency and error rate, fails over on transport errors, and read-only
+    calls can be hedged to a second node when the first is slow
+    """
+    
+    def __init__(self, endpoints: Union[str, Sequence[str], None] = None,
+                 max_concurrency: int = RPC_MAX_CONCURRENCY, timeout: float = RPC_TIMEOUT,
+                 failover_attempts: int = RPC_FAILOVER_ATTEMPTS, hedge_delay: float = RPC_HEDGE_DELAY,
+                 cooldown: float = RPC_ENDPOINT_COOLDOWN):
+        if endpoints is None:
+            endpoints = RPC_ENDPOINTS
+        elif isinstance(endpoints, str):
+            endpoints = [endpoints]
+        # Unset URLs (e.g. an empty BNB_CHAIN_RPC_URL) are dropped
+        self.endpoints = [_Endpoint(url) for url in dict.fromkeys(endpoints) if url]
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.failover_attempts = max(1, failover_attempts)
+        self.hedge_delay = hedge_delay
+        self.cooldown = cooldown
+        self.hedges = 0
+        self._ids = itertools.count(1)
+        # Created on first use so they bind to the running event loop
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def url(self) -> str:
+        """Endpoint the next call would go to"""
+        return self._ranked()[0].url
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # One keep-alive pool for every endpoint
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency * len(self.endpoints),
+                    limit_per_host=self.max_concurrency,
+                    keepalive_timeout=_KEEPALIVE_SECONDS
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+    
+    def _ranked(self) -> List[_Endpoint]:
+        """Endpoints best-first; nodes cooling down after failures go last"""
+        now = time.monotonic()
+        order = {endpoint.url: index for index, endpoint in enumerate(self.endpoints)}
+        return sorted(
+            self.endpoints,
+            key=lambda e: (e.down_until > now, e.score(self.timeout), order[e.url])
+        )
+    
+    async def _send(self, endpoint: _Endpoint, payload: Any) -> Any:
+        session = self._get_session()
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                async with session.post(endpoint.url, json=payload) as response:
+                    response.raise_for_status()
+                    reply = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                endpoint.record(False, time.monotonic() - started, self.cooldown)
+                logger.warning(f"RPC endpoint {endpoint.url} failed: {e!r}")
+                raise
+            # A cancelled call (e.g. a hedge that lost the race) records nothing:
+            # its partial latency says nothing about the endpoint
+            endpoint.record(True, time.monotonic() - started, self.cooldown)
+            return reply
+    
+    async def _post(self, payload: Any) -> Any:
+        """
+        Send a payload to the best endpoint, moving to the next on failure
+        Read-only payloads are also sent to the next endpoint if no reply arrives
+        within hedge_delay; the first good reply wins and the other call is cancelled
+        """
+        candidates = self._ranked()[:self.failover_attempts]
+        if not candidates:
+            raise ConnectionError("No RPC endpoints configured")
+        methods = [call['method'] for call in payload] if isinstance(payload, list) else [payload['method']]
+        hedge_delay = self.hedge_delay if self.hedge_delay > 0 and _READ_ONLY_METHODS.issuperset(methods) else None
+        
+        tasks: Dict[asyncio.Task, _Endpoint] = {}
+        pending = set()
+        hedged = set()
+        last_error: Optional[BaseException] = None
+        try:
+            while candidates or pending:
+                if candidates and not pending:
+                    endpoint = candidates.pop(0)
+                    task = asyncio.create_task(self._send(endpoint, payload))
+                    tasks[task] = endpoint
+                    pending.add(task)
+                done, pending = await asyncio.wait(
+                    pending, timeout=hedge_delay if candidates else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Slow reply: hedge on the next endpoint and take whichever answers first
+                    endpoint = candidates.pop(0)
+                    task = asyncio.create_task(self._send(endpoint, payload))
+                    tasks[task] = endpoint
+                    pending.add(task)
+                    hedged.add(task)
+                    self.hedges += 1
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        if task in hedged:
+                            tasks[task].hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def stats(self) -> Dict:
+        """Per-endpoint health, for monitoring"""
+        return {
+            'hedges': self.hedges,
+            'endpoints': [endpoint.stats(self.timeout) for endpoint in self._ranked()],
+        }
+    
+    async def request(self, method: str, params: Sequence = ()) -> Any:
+        """Send one call and return its result"""
+        reply = await self._post({'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': list(params)})
+        if reply.get('error'):
+            raise RPCError(method, reply['error'])
+        return reply.get('result')
+    
+    async def batch(self, calls: Sequence[Tuple[str, Sequence]]) -> List[Any]:
+        """
+        Send several calls in one HTTP request
+        Returns: results in the order of `calls`; raises RPCError if any call failed
+        """
+        if not calls:
+            return []
+        ids = [next(self._ids) for _ in calls]
+        replies = await self._post([
+            {'jsonrpc': '2.0', 'id': call_id, 'method': method, 'params': list(params)}
+            for call_id, (method, params) in zip(ids, calls)
+        ])
+        if not isinstance(replies, list):
+            raise BatchNotSupported(str(replies.get('error') if isinstance(replies, dict) else replies))
+        
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for call_id, (method, _) in zip(ids, calls):
+            reply = by_id.get(call_id)
+            if reply is None:
+                raise RPCError(method, {'message': 'missing from batch response'})
+            if reply.get('error'):
+                raise RPCError(method, reply['error'])
+            results.append(reply.get('result'))
+        return results
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            logger.info(f"RPC endpoint stats: {self.stats()}")
+            await self._session.close()
+        self._session = None
+    
+    # eth_* helpers
+    async def block_number(self) -> int:
+        return int(await self.request('eth_blockNumber'), 16)
+    
+    async def get_block(self, block_number: int, full_transactions: bool = False) -> Optional[Dict]:
+        return await self.request('eth_getBlockByNumber', [hex(block_number), full_transactions])
+    
+    async def get_balance(self, address: str, block: str = 'latest') -> int:
+        return int(await self.request('eth_getBalance', [address, block]), 16)
+    
+    async def get_logs(self, filter_params: Dict) -> List[Dict]:
+        """Stateless eth_getLogs; nothing is installed on the node"""
+        return [normalize_log(log) for log in await self.request('eth_getLogs', [_hex_block_range(filter_params)])]
+    
+    async def call(self, transaction: Dict, block: str = 'latest') -> str:
+        return await self.request('eth_call', [transaction, block])
+
+
+def _hex_block_range(filter_params: Dict) -> Dict:
+    """Encode int fromBlock/toBlock as the hex quantities the node expects"""
+    params = dict(filter_params)
+    for field in ('fromBlock', 'toBlock'):
+        if isinstance(params.get(field), int):
+            params[field] = hex(params[field])
+    return params
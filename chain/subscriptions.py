@@ -0,0 +1,86 @@
+"""
+WebSocket log subscriptions for BNB Chain
+Wraps eth_subscribe("logs", ...) so new logs are pushed instead of polled
+"""
+import aiohttp
+import json
+import logging
+from typing import Dict, Optional
+
+from config import BNB_CHAIN_RPC_WS_URL, RPC_TIMEOUT
+from chain.rpc import RPCError, normalize_log
+
+
+logger = logging.getLogger(__name__)
+
+
+class LogSubscription:
+    """
+    One eth_subscribe("logs") subscription over a WebSocket connection
+    Use as an async context manager and call next() for each pushed log
+    """
+    
+    def __init__(self, filter_params: Dict, url: str = BNB_CHAIN_RPC_WS_URL, timeout: float = RPC_TIMEOUT):
+        self.url = url
+        self.filter_params = filter_params
+        self.timeout = timeout
+        self.subscription_id: Optional[str] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+    
+    async def __aenter__(self) -> "LogSubscription":
+        self._session = aiohttp.ClientSession()
+        try:
+            self._ws = await self._session.ws_connect(self.url, heartbeat=30, timeout=self.timeout)
+            await self._ws.send_json({
+                'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe',
+                'params': ['logs', self.filter_params]
+            })
+            while self.subscription_id is None:
+                message = await self._receive(self.timeout)
+                if message.get('id') != 1:
+                    continue
+                if message.get('error'):
+                    raise RPCError('eth_subscribe', message['error'])
+                self.subscription_id = message['result']
+        except BaseException:
+            await self._close()
+            raise
+        logger.info(f"Subscribed to logs at {self.url} ({self.subscription_id})")
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        if self._ws is not None and not self._ws.closed and self.subscription_id is not None:
+            try:
+                await self._ws.send_json({
+                    'jsonrpc': '2.0', 'id': 2, 'method': 'eth_unsubscribe',
+                    'params': [self.subscription_id]
+                })
+            except Exception:
+                pass  # Connection is going away regardless
+        await self._close()
+    
+    async def _close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._session is not None:
+            await self._session.close()
+        self._ws = None
+        self._session = None
+    
+    async def _receive(self, timeout: Optional[float] = None) -> Dict:
+        message = await self._ws.receive(timeout=timeout)
+        if message.type == aiohttp.WSMsgType.TEXT:
+            return json.loads(message.data)
+        if message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                            aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+            raise ConnectionError(f"Log subscription connection closed ({message.type.name})")
+        return {}
+    
+    async def next(self) -> Dict:
+        """Wait for the next pushed log (hex quantities converted like AsyncRPCClient logs)"""
+        while True:
+            message = await self._receive()
+            params = message.get('params') or {}
+            if message.get('method') == 'eth_subscription' and params.get('subscription') == self.subscription_id:
+                return normalize_log(params['result'])
@@ -3,15 +3,20 @@ Token utility functions for fetching market data and balances
 """
 import aiohttp
 import logging
-from typing import Dict, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 from web3 import Web3
-from config import TOKEN_CONTRACT, BNB_CHAIN_RPC_URL
+from config import TOKEN_CONTRACT, APPROVED_LIQUIDITY_POOLS, TOKEN_TAX_GETTERS
+from chain.rpc import AsyncRPCClient
+from chain.multicall import Multicall, ERC20_GETTERS
+from utils.amounts import from_wei
 
 logger = logging.getLogger(__name__)
 
 class TokenUtils:
-    def __init__(self, w3: Optional[Web3] = None):
-        self.w3 = w3 or Web3(Web3.HTTPProvider(BNB_CHAIN_RPC_URL))
+    def __init__(self, rpc: Optional[AsyncRPCClient] = None, multicall: Optional[Multicall] = None):
+        self.rpc = rpc or AsyncRPCClient()
+        # On-chain reads are batched through Multicall3
+        self.multicall = multicall or Multicall(self.rpc)
         self.token_contract = TOKEN_CONTRACT
 
     async def get_token_data(self, token_address: str) -> Dict:
@@ -57,19 +62,38 @@ class TokenUtils:
         Fetch BNB and COPE balances for a wallet
         """
         try:
-            # BNB Balance
-            bnb_balance_wei = self.w3.eth.get_balance(Web3.to_checksum_address(wallet_address))
-            bnb_balance = self.w3.from_wei(bnb_balance_wei, 'ether')
-
-            # COPE Balance (simplified ERC20 call)
-            # In a real scenario, you'd load the ABI and call balanceOf
-            # For now, we'll return a placeholder or mock it if needed
-            cope_balance = 0.0 # Placeholder
-            
+            balances = await self.get_balances_wei([wallet_address])
+            balance = balances[wallet_address.lower()]
             return {
-                "bnb": float(bnb_balance),
-                "cope": float(cope_balance)
+                "bnb": float(Web3.from_wei(balance["bnb"], 'ether')),
+                "cope": from_wei(balance["cope"])
             }
         except Exception as e:
             logger.error(f"Error fetching wallet balances: {e}")
             return {"bnb": 0.0, "cope": 0.0}
+
+    async def get_balances_wei(self, wallet_addresses: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """
+        BNB and COPE balances (wei) of many wallets, batched into a few eth_calls
+        Returns: {wallet: {"bnb": wei, "cope": wei}} keyed by lowercased wallet
+        """
+        token = self.token_contract.lower()
+        balances = await self.multicall.balances(wallet_addresses, [token])
+        return {
+            wallet: {"bnb": balance['native'] or 0, "cope": balance[token] or 0}
+            for wallet, balance in balances.items()
+        }
+
+    async def get_pool_reserves(self) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        """getReserves() of every approved liquidity pool, keyed by lowercased pair address"""
+        return await self.multicall.reserves(APPROVED_LIQUIDITY_POOLS)
+
+    async def get_token_state(self) -> Dict[str, Any]:
+        """
+        COPE ERC20 metadata plus the tax getters named in TOKEN_TAX_GETTERS
+        Getters the contract doesn't have come back as None
+        """
+        getters = dict(ERC20_GETTERS)
+        for signature in TOKEN_TAX_GETTERS:
+            getters[signature.split('(')[0]] = (signature, ('uint256',))
+        return await self.multicall.token_state(self.token_contract, getters)
@@ -10,17 +10,96 @@ load_dotenv()
 TOKEN_NAME = "COPE"
 TOKEN_SYMBOL = "COPE"
 TOKEN_CONTRACT = "0x14EB783EE20eD7970Ad5e008044002d2c71D9148"
+TOKEN_DECIMALS = 18
 CHAIN = "BNB Chain"
 
 # BNB Chain RPC Configuration
 BNB_CHAIN_RPC_URL = os.getenv("BNB_CHAIN_RPC_URL", "https://bsc-dataseed1.binance.org/")
 BNB_CHAIN_RPC_WS_URL = os.getenv("BNB_CHAIN_RPC_WS_URL", "wss://bsc-ws-node.nariox.org:443")
+RPC_MAX_CONCURRENCY = int(os.getenv("RPC_MAX_CONCURRENCY", "8"))  # In-flight JSON-RPC requests
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "15"))  # Seconds per request
+# Extra endpoints (comma-separated); requests go to the healthiest node and fail over to the next
+BNB_CHAIN_RPC_FALLBACK_URLS = [
+    url.strip() for url in os.getenv(
+        "BNB_CHAIN_RPC_FALLBACK_URLS", "https://bsc-dataseed2.binance.org/,https://bsc-dataseed3.binance.org/"
+    ).split(",") if url.strip()
+]
+RPC_ENDPOINTS = [BNB_CHAIN_RPC_URL] + [url for url in BNB_CHAIN_RPC_FALLBACK_URLS if url != BNB_CHAIN_RPC_URL]
+RPC_FAILOVER_ATTEMPTS = int(os.getenv("RPC_FAILOVER_ATTEMPTS", "2"))  # Endpoints tried per request
+RPC_ENDPOINT_COOLDOWN = float(os.getenv("RPC_ENDPOINT_COOLDOWN", "30"))  # Seconds a failing endpoint is skipped
+RPC_HEDGE_DELAY = float(os.getenv("RPC_HEDGE_DELAY", "0"))  # Seconds before a slow read is also sent to the next node (0 = off)
+# Multicall3 batches contract reads (balances, reserves, token getters) into few eth_calls
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")  # Same on BSC and most EVM chains
+MULTICALL_BATCH_SIZE = int(os.getenv("MULTICALL_BATCH_SIZE", "500"))  # Calls per eth_call, keeps each under node gas caps
+# Zero-argument uint256 getters of the COPE contract read as token state, e.g. "buyTax(),sellTax()"
+TOKEN_TAX_GETTERS = [name.strip() for name in os.getenv("TOKEN_TAX_GETTERS", "").split(",") if name.strip()]
+
+# Event Listener Configuration
+# "poll" fetches ranges every LISTENER_POLL_INTERVAL; "websocket" also subscribes to
+# new logs over BNB_CHAIN_RPC_WS_URL and uses polling only to fill gaps and checkpoint
+LISTENER_MODE = os.getenv("LISTENER_MODE", "poll")
+LISTENER_WS_RECONNECT_DELAY = float(os.getenv("LISTENER_WS_RECONNECT_DELAY", "5"))  # Seconds, doubles up to 60
+LISTENER_DEDUPE_SIZE = int(os.getenv("LISTENER_DEDUPE_SIZE", "10000"))  # Recently processed logs remembered
+LISTENER_START_LOOKBACK = int(os.getenv("LISTENER_START_LOOKBACK", "1000"))  # Blocks scanned on first start
+LISTENER_POLL_INTERVAL = float(os.getenv("LISTENER_POLL_INTERVAL", "12"))  # Seconds between polls when caught up
+# Catch-up: when the saved checkpoint is more than LISTENER_CATCHUP_THRESHOLD blocks behind,
+# "backfill" replays the gap batch after batch without pausing,
+# "skip" jumps to the last LISTENER_START_LOOKBACK blocks and logs the skipped range
+LISTENER_CATCHUP_THRESHOLD = int(os.getenv("LISTENER_CATCHUP_THRESHOLD", "5000"))
+LISTENER_CATCHUP_MODE = os.getenv("LISTENER_CATCHUP_MODE", "backfill")
+# Adaptive log-fetch window: doubles while fetches are fast and sparse,
+# halves when the node rejects a range as too large or times out
+LISTENER_BATCH_BLOCKS = int(os.getenv("LISTENER_BATCH_BLOCKS", "100"))  # Starting window
+LISTENER_MIN_RANGE = int(os.getenv("LISTENER_MIN_RANGE", "1"))  # Blocks
+LISTENER_MAX_RANGE = int(os.getenv("LISTENER_MAX_RANGE", "5000"))  # Blocks
+LISTENER_RANGE_FAST_SECONDS = float(os.getenv("LISTENER_RANGE_FAST_SECONDS", "1.0"))  # Fetches quicker than this grow
+LISTENER_RANGE_TARGET_LOGS = int(os.getenv("LISTENER_RANGE_TARGET_LOGS", "2000"))  # Fetches under this many logs grow
+# Swaps are recorded provisionally at the head and promoted (locking referrer mappings)
+# once this many blocks deep; block hashes are checked so reorged swaps are rolled back.
+# 0 records swaps as final immediately
+LISTENER_CONFIRMATIONS = int(os.getenv("LISTENER_CONFIRMATIONS", "15"))
+# Poll mode runs fetch -> decode -> enrich -> persist as concurrent stages; each stage
+# buffers at most this many block ranges, so fetching pauses when the writer falls behind.
+# 0 polls and records one range at a time
+LISTENER_PIPELINE_DEPTH = int(os.getenv("LISTENER_PIPELINE_DEPTH", "2"))
+# Historical backfill (python -m chain.backfill)
+BACKFILL_START_BLOCK = int(os.getenv("BACKFILL_START_BLOCK", "0"))  # Pool creation block; used when no backfill checkpoint exists
+BACKFILL_CHUNK_BLOCKS = int(os.getenv("BACKFILL_CHUNK_BLOCKS", "2000"))  # Blocks per fetched chunk
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))  # Chunks fetched and decoded concurrently
+BACKFILL_RETRIES = int(os.getenv("BACKFILL_RETRIES", "3"))  # Attempts per chunk on transient errors
+BACKFILL_PROGRESS_INTERVAL = float(os.getenv("BACKFILL_PROGRESS_INTERVAL", "10"))  # Seconds between progress logs
+# Block timestamps: cached per block, misses fetched in JSON-RPC batches
+BLOCK_CACHE_SIZE = int(os.getenv("BLOCK_CACHE_SIZE", "10000"))  # Blocks
+BLOCK_FETCH_BATCH_SIZE = int(os.getenv("BLOCK_FETCH_BATCH_SIZE", "100"))  # Headers per batch request
+# "exact" fetches every block's header; "interpolate" fetches only each range's first and
+# last block and estimates the rest (BSC blocks are ~3s apart, so estimates are off by seconds)
+BLOCK_TIMESTAMP_MODE = os.getenv("BLOCK_TIMESTAMP_MODE", "exact")
 
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 
 # Database Configuration
 DATABASE_PATH = os.getenv("DATABASE_PATH", "database/cope_bot.db")
+DATABASE_READ_POOL_SIZE = int(os.getenv("DATABASE_READ_POOL_SIZE", "4"))  # Reader connections kept open
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", "5000"))
+# Write-behind mode: swap ingestion is queued and committed in groups
+DATABASE_WRITE_BEHIND = os.getenv("DATABASE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+# Queued write calls (not rows: one batch insert counts once) per group commit;
+# DATABASE_GROUP_COMMIT_ROWS is the old name, still read as a fallback
+DATABASE_GROUP_COMMIT_WRITES = int(
+    os.getenv("DATABASE_GROUP_COMMIT_WRITES", os.getenv("DATABASE_GROUP_COMMIT_ROWS", "500"))
+)
+DATABASE_GROUP_COMMIT_INTERVAL = float(os.getenv("DATABASE_GROUP_COMMIT_INTERVAL", "0.05"))  # Seconds
+# Identity cache: telegram_id <-> wallet, referral code -> wallet, wallet -> referrer
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "50000"))  # Entries per lookup
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "600"))  # Seconds
+# Traders with no referrer mapping, so their swaps are dropped without a query; entries are
+# invalidated by create_referral_mapping, the TTL only covers mappings written by another process
+REFERRER_NEGATIVE_CACHE_SIZE = int(os.getenv("REFERRER_NEGATIVE_CACHE_SIZE", "200000"))  # Wallets
+REFERRER_NEGATIVE_CACHE_TTL = float(os.getenv("REFERRER_NEGATIVE_CACHE_TTL", "3600"))  # Seconds
+# Swap partitioning: settled weeks are sealed out of the hot swap_events table
+SWAP_SEAL_ON_SETTLE = os.getenv("SWAP_SEAL_ON_SETTLE", "true").lower() in ("1", "true", "yes")
+SWAP_ARCHIVE_PATH = os.getenv("SWAP_ARCHIVE_PATH", "")  # Separate SQLite file for sealed weeks, empty = main file
 
 # Web App Configuration
 WEBAPP_URL = os.getenv("WEBAPP_URL", "https://ajelucky123.github.io/cope-bot-webapp/index.html")
@@ -30,6 +109,12 @@ REFERRAL_REWARD_PERCENTAGE = 0.5  # 50% to referrer
 COMMUNITY_POOL_PERCENTAGE = 0.5   # 50% to community pool
 MIN_WITHDRAWAL_THRESHOLD = 100000  # 100,000 COPE minimum
 COMMUNITY_POOL_UNLOCK_MCAP = 1000000  # 1,000,000 market cap
+# Settlement waits until the listener has confirmed a block past the end of the week
+SETTLE_CONFIRMATION_POLL_INTERVAL = int(os.getenv("SETTLE_CONFIRMATION_POLL_INTERVAL", "60"))  # Seconds
+
+# Leaderboard Configuration
+LEADERBOARD_SIZE = 10  # Entries shown by /leaderboard
+LEADERBOARD_RECONCILE_INTERVAL = int(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "3600"))  # Seconds, 0 = off
 
 # Weekly Distribution
 WEEKLY_DISTRIBUTION_DAY = 0  # Monday (0 = Monday, 6 = Sunday)
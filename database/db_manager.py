@@ -3,35 +3,444 @@ Database manager for COPE Telegram Referral Bot
 Handles all database operations with wallet-referrer mapping logic
 """
 import aiosqlite
+import asyncio
 import os
 import hashlib
-from typing import Optional, Dict, List, Tuple
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple, AsyncIterator, Awaitable, Callable, Any, Iterable
 from datetime import datetime, timedelta
-from config import DATABASE_PATH
+from config import (
+    DATABASE_PATH, DATABASE_READ_POOL_SIZE, DATABASE_BUSY_TIMEOUT_MS,
+    DATABASE_WRITE_BEHIND, DATABASE_GROUP_COMMIT_WRITES, DATABASE_GROUP_COMMIT_INTERVAL,
+    IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL, SWAP_ARCHIVE_PATH,
+    REFERRER_NEGATIVE_CACHE_SIZE, REFERRER_NEGATIVE_CACHE_TTL
+)
+from database.cache import TTLCache, MISSING
+from utils.amounts import to_wei, apply_percentage
+from utils.periods import week_start
+from config import REFERRAL_REWARD_PERCENTAGE, COMMUNITY_POOL_PERCENTAGE, MIN_WITHDRAWAL_THRESHOLD
+
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA user_version of the current schema
+# 1: token amounts stored as exact integer wei (decimal TEXT)
+# 2: listener_state.block_timestamp
+SCHEMA_VERSION = 2
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+# Max bound parameters per IN (...) list; well under SQLite's variable limit
+SQL_IN_CHUNK_SIZE = 500
+
+
+def _chunks(items: List, size: int):
+    """Yield successive slices of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _placeholders(count: int) -> str:
+    """Comma-separated '?' placeholders for an IN (...) list"""
+    return ", ".join("?" * count)
+
+
+def _schema_statements() -> List[str]:
+    """Split schema.sql into individual statements"""
+    with open(SCHEMA_PATH, 'r') as f:
+        lines = f.readlines()
+    statements, current = [], ""
+    for line in lines:
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+
+# Wei amounts are decimal TEXT; these SQL functions add them as exact Python ints
+def _wei_add(a, b) -> str:
+    return str(int(a or 0) + int(b or 0))
+
+
+class _WeiSum:
+    """SQL aggregate wei_sum(x): exact sum of wei text values, NULL for no rows"""
+    
+    def __init__(self):
+        self.total = None
+    
+    def step(self, value):
+        if value is not None:
+            self.total = (self.total or 0) + int(value)
+    
+    def finalize(self):
+        return None if self.total is None else str(self.total)
+
+
+def _connector(db_path: str) -> Callable[[], sqlite3.Connection]:
+    """sqlite3 connection factory that registers the wei functions"""
+    def connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(db_path)
+        conn.create_function("wei_add", 2, _wei_add, deterministic=True)
+        conn.create_aggregate("wei_sum", 1, _WeiSum)
+        return conn
+    return connect
 
 
 class DatabaseManager:
     """Manages all database operations for the referral bot"""
     
-    def __init__(self, db_path: str = DATABASE_PATH):
+    def __init__(self, db_path: str = DATABASE_PATH, read_pool_size: int = DATABASE_READ_POOL_SIZE,
+                 write_behind: bool = DATABASE_WRITE_BEHIND):
         self.db_path = db_path
+        self.read_pool_size = max(1, read_pool_size)
+        self.write_behind = write_behind
+        self.group_commit_writes = max(1, DATABASE_GROUP_COMMIT_WRITES)
+        self.group_commit_interval = DATABASE_GROUP_COMMIT_INTERVAL
         # Ensure database directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        
+        # Long-lived connection pool (opened in init_db, closed in close)
+        # One writer connection guarded by a lock, N reader connections in a queue
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Write-behind mode: queued writes drained by a single writer task
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        
+        # Read-through identity caches (invalidated by connect_wallet / create_referral_mapping)
+        self._wallet_by_telegram_id = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+        self._telegram_id_by_wallet = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+        self._wallet_by_referral_code = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+        self._referrer_by_wallet = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+        # Wallets with no referrer mapping, kept apart so the many unreferred traders
+        # seen on-chain don't evict mapped wallets from _referrer_by_wallet
+        self._unmapped_wallets = TTLCache(REFERRER_NEGATIVE_CACHE_SIZE, REFERRER_NEGATIVE_CACHE_TTL)
+        # Bumped by create_referral_mapping; a lookup that raced a new mapping caches no negatives
+        self._mapping_version = 0
+        
+        # Sealed swap weeks; bumping the version makes each connection rebuild swap_events_all
+        self._sealed_weeks = set()
+        self._partition_version = 0
+        self._view_versions: Dict[int, int] = {}
     
     async def init_db(self):
-        """Initialize database with schema"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Initialize database with schema and open the connection pool"""
+        if self._writer is None:
+            await self._open_pool()
+        
+        async with self._write() as db:
+            async with db.execute("PRAGMA user_version") as cursor:
+                version = (await cursor.fetchone())[0]
+            if version < 1 and await self._has_legacy_amounts(db):
+                await self._migrate_amounts_to_wei(db)
+            
             # Read and execute schema
-            schema_path = os.path.join(os.path.dirname(__file__), "schema.sql")
-            with open(schema_path, 'r') as f:
+            with open(SCHEMA_PATH, 'r') as f:
                 schema = f.read()
             await db.executescript(schema)
+            if version < 2:
+                await self._add_listener_block_timestamp(db)
+            await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             await db.commit()
+            
+            # Databases created before referrer_aggregates existed need a backfill
+            async with db.execute("SELECT EXISTS (SELECT 1 FROM referrer_aggregates)") as cursor:
+                has_aggregates = (await cursor.fetchone())[0]
+            async with db.execute("SELECT EXISTS (SELECT 1 FROM wallet_referrer_mapping)") as cursor:
+                has_mappings = (await cursor.fetchone())[0]
+            async with db.execute("SELECT period_start FROM swap_partitions") as cursor:
+                self._sealed_weeks = {datetime.fromisoformat(row[0]) for row in await cursor.fetchall()}
+        self._partition_version += 1
+        
+        if has_mappings and not has_aggregates:
+            logger.info("Backfilling referrer_aggregates from existing mappings and swaps")
+            await self.rebuild_referrer_aggregates()
+    
+    async def close(self):
+        """Flush queued writes and close all pooled connections"""
+        if self._writer_task is not None:
+            self._write_queue.put_nowait(None)  # Sentinel: drain and exit
+            await self._writer_task
+            self._writer_task = None
+            self._write_queue = None
+        
+        logger.info(f"Identity cache stats: {self.cache_stats()}")
+        
+        connections = self._readers + ([self._writer] if self._writer else [])
+        self._writer = None
+        self._readers = []
+        self._idle_readers = None
+        self._write_lock = None
+        self._loop = None
+        self._view_versions = {}
+        for conn in connections:
+            await conn.close()
+        logger.info("Database connection pool closed")
+    
+    # Schema Migrations
+    async def _has_legacy_amounts(self, db: aiosqlite.Connection) -> bool:
+        """True if swap_events still stores amounts as DECIMAL (REAL) columns"""
+        async with db.execute("PRAGMA table_info(swap_events)") as cursor:
+            columns = {row[1]: row[2] for row in await cursor.fetchall()}
+        return bool(columns) and columns.get('cope_tax_amount', '').upper() != 'TEXT'
+    
+    async def _add_listener_block_timestamp(self, db: aiosqlite.Connection):
+        """Add listener_state.block_timestamp to databases created before it existed"""
+        async with db.execute("PRAGMA table_info(listener_state)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if 'block_timestamp' not in columns:
+            await db.execute("ALTER TABLE listener_state ADD COLUMN block_timestamp TIMESTAMP")
+    
+    async def _migrate_amounts_to_wei(self, db: aiosqlite.Connection):
+        """
+        Convert swap_events and referral_rewards amounts from REAL token units to
+        exact wei text in place (SQLite cannot change a column's type, so the
+        tables are rebuilt within one transaction). referrer_aggregates is
+        dropped and rebuilt from the converted rows.
+        """
+        logger.info("Migrating token amounts to integer wei storage")
+        await db.create_function(
+            "legacy_to_wei", 1, lambda value: None if value is None else str(to_wei(value))
+        )
+        
+        await db.execute("BEGIN")
+        for table in ('swap_events', 'referral_rewards'):
+            # Indexes move with a renamed table; drop them so the schema recreates them
+            async with db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)
+            ) as cursor:
+                indexes = [row[0] for row in await cursor.fetchall()]
+            for index in indexes:
+                await db.execute(f"DROP INDEX {index}")
+            await db.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        await db.execute("DROP TABLE IF EXISTS referrer_aggregates")
+        
+        for statement in _schema_statements():
+            await db.execute(statement)
+        
+        await db.execute(
+            """INSERT INTO swap_events 
+               (id, transaction_hash, trader_wallet, swap_type, cope_amount, bnb_amount,
+                cope_tax_amount, block_number, block_timestamp, created_at)
+               SELECT id, transaction_hash, trader_wallet, swap_type, legacy_to_wei(cope_amount),
+                      legacy_to_wei(bnb_amount), legacy_to_wei(cope_tax_amount),
+                      block_number, block_timestamp, created_at
+               FROM swap_events_legacy"""
+        )
+        await db.execute(
+            """INSERT INTO referral_rewards 
+               (id, referrer_wallet, reward_period_start, reward_period_end, total_tax_generated,
+                referral_reward, community_pool_contribution, is_settled, merkle_root, settled_at)
+               SELECT id, referrer_wallet, reward_period_start, reward_period_end,
+                      legacy_to_wei(total_tax_generated), legacy_to_wei(referral_reward),
+                      legacy_to_wei(community_pool_contribution), is_settled, merkle_root, settled_at
+               FROM referral_rewards_legacy"""
+        )
+        await db.execute("DROP TABLE swap_events_legacy")
+        await db.execute("DROP TABLE referral_rewards_legacy")
+        await db.execute("PRAGMA user_version = 1")
+        await db.commit()
+        logger.info("Token amount migration complete")
+    
+    # Connection Pool
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a connection with the pragmas and SQL functions every connection should share"""
+        db = aiosqlite.Connection(_connector(self.db_path), iter_chunk_size=64)
+        # Pooled connections live for the whole process; don't let their
+        # worker threads keep it alive if close() is never reached
+        db.daemon = True
+        await db
+        await db.execute(f"PRAGMA busy_timeout = {int(DATABASE_BUSY_TIMEOUT_MS)}")
+        return db
+    
+    async def _open_pool(self):
+        """Open the writer connection and the reader pool"""
+        self._loop = asyncio.get_running_loop()
+        self._write_lock = asyncio.Lock()
+        self._writer = await self._connect()
+        # WAL lets readers keep reading while the writer commits
+        await self._writer.execute("PRAGMA journal_mode = WAL")
+        await self._writer.execute("PRAGMA synchronous = NORMAL")
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await self._connect()
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+        logger.info(f"Opened database pool: 1 writer, {self.read_pool_size} readers")
+        
+        if self.write_behind:
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+            logger.info(
+                f"Write-behind enabled: group commit every {self.group_commit_writes} writes "
+                f"or {self.group_commit_interval}s"
+            )
+    
+    def _pool_available(self) -> bool:
+        """
+        The pool is bound to the event loop that opened it.
+        Callers on another loop (e.g. the weekly scheduler thread) or before
+        init_db() fall back to a short-lived connection.
+        """
+        if self._writer is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+    
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection from the pool"""
+        if not self._pool_available():
+            db = await self._connect()
+            try:
+                await self._ensure_swap_view(db)
+                yield db
+            finally:
+                self._view_versions.pop(id(db), None)
+                await db.close()
+            return
+        
+        db = await self._idle_readers.get()
+        try:
+            await self._ensure_swap_view(db)
+            yield db
+        finally:
+            self._idle_readers.put_nowait(db)
+    
+    @asynccontextmanager
+    async def _write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Hold the single writer connection for one transaction.
+        Anything left uncommitted when the block exits is rolled back so the
+        next writer starts from a clean connection.
+        """
+        if not self._pool_available():
+            db = await self._connect()
+            try:
+                await self._ensure_swap_view(db)
+                yield db
+            finally:
+                self._view_versions.pop(id(db), None)
+                await db.close()
+            return
+        
+        async with self._write_lock:
+            try:
+                await self._ensure_swap_view(self._writer)
+                yield self._writer
+            finally:
+                if self._writer is not None and self._writer.in_transaction:
+                    await self._writer.rollback()
+    
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Hit/miss counters for the identity caches"""
+        return {
+            'wallet_by_telegram_id': self._wallet_by_telegram_id.stats(),
+            'telegram_id_by_wallet': self._telegram_id_by_wallet.stats(),
+            'wallet_by_referral_code': self._wallet_by_referral_code.stats(),
+            'referrer_by_wallet': self._referrer_by_wallet.stats(),
+            'unmapped_wallets': self._unmapped_wallets.stats(),
+        }
+    
+    # Write-Behind Queue
+    async def submit_write(self, op: Callable[[aiosqlite.Connection], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Submit a write operation and return a future for its result.
+        The future resolves once the transaction containing the write is committed.
+        `op` receives the writer connection and must not commit itself.
+        Without write-behind the write is committed before this returns.
+        """
+        if self._write_queue is not None and self._pool_available():
+            future = asyncio.get_running_loop().create_future()
+            self._write_queue.put_nowait((op, future))
+            return future
+        
+        future = asyncio.get_running_loop().create_future()
+        try:
+            async with self._write() as db:
+                result = await op(db)
+                await db.commit()
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    async def _writer_loop(self):
+        """Drain the write queue, committing in groups bounded by size and time"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._write_queue.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = loop.time() + self.group_commit_interval
+            
+            while len(group) < self.group_commit_writes:
+                # Take whatever is already queued, then wait out the time budget
+                if self._write_queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._write_queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._write_queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            
+            await self._commit_group(group)
+    
+    async def _commit_group(self, group: List[Tuple[Callable, asyncio.Future]]):
+        """Apply a group of queued writes in one transaction, isolating each in a savepoint"""
+        results = []
+        async with self._write_lock:
+            db = self._writer
+            try:
+                await self._ensure_swap_view(db)
+                await db.execute("BEGIN")
+                for op, _ in group:
+                    await db.execute("SAVEPOINT queued_write")
+                    try:
+                        results.append((True, await op(db)))
+                        await db.execute("RELEASE queued_write")
+                    except Exception as e:
+                        await db.execute("ROLLBACK TO queued_write")
+                        await db.execute("RELEASE queued_write")
+                        results.append((False, e))
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Group commit of {len(group)} writes failed: {e}")
+                if db.in_transaction:
+                    await db.rollback()
+                results = [(False, e)] * len(group)
+        
+        for (_, future), (ok, value) in zip(group, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
     
     # User and Wallet Operations
     async def create_user(self, telegram_id: int, username: Optional[str] = None) -> bool:
         """Create or update a Telegram user"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO users (telegram_id, username, updated_at) VALUES (?, ?, ?)",
                 (telegram_id, username, datetime.utcnow())
@@ -45,7 +454,7 @@ class DatabaseManager:
         Connect a wallet to a Telegram user
         Returns True if successful, False if wallet already connected to another user
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Check if wallet is already connected to another user
             async with db.execute(
                 "SELECT telegram_id FROM wallets WHERE wallet_address = ?",
@@ -63,32 +472,49 @@ class DatabaseManager:
                 (telegram_id, wallet_address.lower(), signature, message, datetime.utcnow())
             )
             await db.commit()
-            return True
+        
+        self._wallet_by_telegram_id.invalidate(telegram_id)
+        self._telegram_id_by_wallet.invalidate(wallet_address.lower())
+        return True
     
     async def get_wallet_by_telegram_id(self, telegram_id: int) -> Optional[str]:
         """Get wallet address for a Telegram user"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cached = self._wallet_by_telegram_id.get(telegram_id)
+        if cached is not MISSING:
+            return cached
+        
+        async with self._read() as db:
             async with db.execute(
                 "SELECT wallet_address FROM wallets WHERE telegram_id = ?",
                 (telegram_id,)
             ) as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else None
+        
+        wallet = result[0] if result else None
+        self._wallet_by_telegram_id.set(telegram_id, wallet)
+        return wallet
     
     async def get_telegram_id_by_wallet(self, wallet_address: str) -> Optional[int]:
         """Get Telegram ID for a wallet address"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cached = self._telegram_id_by_wallet.get(wallet_address.lower())
+        if cached is not MISSING:
+            return cached
+        
+        async with self._read() as db:
             async with db.execute(
                 "SELECT telegram_id FROM wallets WHERE wallet_address = ?",
                 (wallet_address.lower(),)
             ) as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else None
+        
+        telegram_id = result[0] if result else None
+        self._telegram_id_by_wallet.set(wallet_address.lower(), telegram_id)
+        return telegram_id
     
     # Referral Code Operations
     async def get_or_create_referral_code(self, wallet_address: str) -> str:
         """Get existing referral code for wallet or create a new one"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Check if code exists
             async with db.execute(
                 "SELECT referral_code FROM referral_codes WHERE referrer_wallet = ?",
@@ -120,17 +546,26 @@ class DatabaseManager:
                 (referral_code, wallet_address.lower())
             )
             await db.commit()
-            return referral_code
+        
+        self._wallet_by_referral_code.invalidate(referral_code)
+        return referral_code
     
     async def get_wallet_by_referral_code(self, referral_code: str) -> Optional[str]:
         """Get referrer wallet address for a referral code"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cached = self._wallet_by_referral_code.get(referral_code)
+        if cached is not MISSING:
+            return cached
+        
+        async with self._read() as db:
             async with db.execute(
                 "SELECT referrer_wallet FROM referral_codes WHERE referral_code = ?",
                 (referral_code,)
             ) as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else None
+        
+        wallet = result[0] if result else None
+        self._wallet_by_referral_code.set(referral_code, wallet)
+        return wallet
     
     # Wallet-Referrer Mapping Operations (Core Logic)
     async def create_referral_mapping(self, referred_wallet: str, referrer_wallet: str) -> bool:
@@ -142,7 +577,7 @@ class DatabaseManager:
         if referred_wallet.lower() == referrer_wallet.lower():
             return False
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Check if wallet is already mapped
             async with db.execute(
                 "SELECT id FROM wallet_referrer_mapping WHERE referred_wallet = ?",
@@ -158,193 +593,803 @@ class DatabaseManager:
                    VALUES (?, ?, ?, 0)""",
                 (referred_wallet.lower(), referrer_wallet.lower(), datetime.utcnow())
             )
+            await db.execute(
+                """INSERT INTO referrer_aggregates (referrer_wallet, referred_count)
+                   VALUES (?, 1)
+                   ON CONFLICT(referrer_wallet) DO UPDATE SET
+                       referred_count = referred_count + 1,
+                       updated_at = CURRENT_TIMESTAMP""",
+                (referrer_wallet.lower(),)
+            )
             await db.commit()
-            return True
+        
+        self._referrer_by_wallet.invalidate(referred_wallet.lower())
+        self._unmapped_wallets.invalidate(referred_wallet.lower())
+        self._mapping_version += 1
+        return True
     
     async def get_referrer_for_wallet(self, wallet_address: str) -> Optional[str]:
         """
         Get the referrer wallet for a given referred wallet
         Returns None if wallet is not mapped
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        referrers = await self.get_referrers_for_wallets([wallet_address])
+        return referrers[wallet_address.lower()]
+    
+    async def get_referrers_for_wallets(self, wallet_addresses: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Resolve the referrers of many wallets at once (for a block range's traders)
+        Cache misses are looked up with one IN (...) query per chunk of wallets
+        Returns: referrer (or None if not mapped) keyed by lowercased wallet
+        """
+        referrers: Dict[str, Optional[str]] = {}
+        missing = []
+        for wallet in {wallet.lower() for wallet in wallet_addresses}:
+            cached = self._referrer_by_wallet.get(wallet)
+            if cached is not MISSING:
+                referrers[wallet] = cached
+            elif self._unmapped_wallets.get(wallet) is not MISSING:
+                referrers[wallet] = None
+            else:
+                missing.append(wallet)
+        if not missing:
+            return referrers
+        
+        version = self._mapping_version
+        found = {}
+        async with self._read() as db:
+            for chunk in _chunks(missing, SQL_IN_CHUNK_SIZE):
+                async with db.execute(
+                    f"""SELECT referred_wallet, referrer_wallet FROM wallet_referrer_mapping
+                        WHERE referred_wallet IN ({_placeholders(len(chunk))})""",
+                    chunk
+                ) as cursor:
+                    found.update(await cursor.fetchall())
+        
+        for wallet in missing:
+            referrer = found.get(wallet)
+            if referrer is None:
+                if version == self._mapping_version:
+                    self._unmapped_wallets.set(wallet, True)
+            else:
+                self._referrer_by_wallet.set(wallet, referrer)
+            referrers[wallet] = referrer
+        return referrers
+    
+    # Swap Event Operations
+    async def record_swap_event(self, transaction_hash: str, trader_wallet: str,
+                               swap_type: str, cope_amount: int, bnb_amount: int,
+                               cope_tax_amount: int, block_number: int, 
+                               block_timestamp: datetime) -> bool:
+        """Record a COPE swap event (buy or sell) and wait until it is committed"""
+        future = await self.queue_swap_event(
+            transaction_hash, trader_wallet, swap_type, cope_amount,
+            bnb_amount, cope_tax_amount, block_number, block_timestamp
+        )
+        return await future
+    
+    async def queue_swap_event(self, transaction_hash: str, trader_wallet: str,
+                              swap_type: str, cope_amount: int, bnb_amount: int,
+                              cope_tax_amount: int, block_number: int, 
+                              block_timestamp: datetime) -> asyncio.Future:
+        """
+        Queue a COPE swap event for recording (amounts in wei)
+        Returns a future resolving to True if inserted, False if already recorded
+        """
+        swap = {
+            'transaction_hash': transaction_hash,
+            'trader_wallet': trader_wallet,
+            'swap_type': swap_type,
+            'cope_amount': cope_amount,
+            'bnb_amount': bnb_amount,
+            'cope_tax_amount': cope_tax_amount,
+            'block_number': block_number,
+            'block_timestamp': block_timestamp,
+        }
+        
+        async def insert_one(db: aiosqlite.Connection) -> bool:
+            return len(await self._insert_swap_events(db, [swap])) == 1
+        
+        return await self.submit_write(insert_one)
+    
+    async def record_swap_events(self, batch: List[Dict],
+                                 checkpoint: Optional[Tuple[str, int]] = None) -> List[Dict]:
+        """
+        Record a batch of decoded swaps (e.g. one block range) in a single transaction
+        Each swap is a dict with the same keys as record_swap_event's arguments
+        (amounts as integer wei),
+        plus an optional 'log_index' used to order swaps within a block.
+        `checkpoint` is (listener, last_block): the listener's saved position is
+        advanced in the same transaction, so a crash never loses or skips a range.
+        Returns: the swaps that were newly inserted (duplicates are ignored), each
+        with its row 'id' and with 'first_trade' set when it locked the trader's
+        referrer mapping
+        """
+        if not batch and checkpoint is None:
+            return []
+        
+        async def insert(db: aiosqlite.Connection) -> List[Dict]:
+            inserted = await self._insert_swap_events(db, batch) if batch else []
+            if checkpoint is not None:
+                await self._save_listener_checkpoint(db, *checkpoint)
+            return inserted
+        
+        return await (await self.submit_write(insert))
+    
+    async def _insert_swap_events(self, db: aiosqlite.Connection, batch: List[Dict]) -> List[Dict]:
+        """
+        Insert swaps with INSERT OR IGNORE and lock every newly trading mapping
+        with one set-based UPDATE per chunk of wallets (caller commits)
+        """
+        swaps = sorted(batch, key=lambda s: (s['block_number'], s.get('log_index', 0)))
+        late_hashes = {
+            s['transaction_hash'] for s in swaps if week_start(s['block_timestamp']) in self._sealed_weeks
+        }
+        if late_hashes:
+            # Sealed rows have left swap_events, so INSERT OR IGNORE can't see them as duplicates
+            sealed = set()
+            for chunk in _chunks(sorted(late_hashes), SQL_IN_CHUNK_SIZE):
+                async with db.execute(
+                    f"""SELECT transaction_hash FROM swap_events_all
+                        WHERE sealed = 1 AND transaction_hash IN ({_placeholders(len(chunk))})""",
+                    chunk
+                ) as cursor:
+                    sealed.update(row[0] for row in await cursor.fetchall())
+            swaps = [s for s in swaps if s['transaction_hash'] not in sealed]
+        
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM swap_events") as cursor:
+            last_id = (await cursor.fetchone())[0]
+        
+        await db.executemany(
+            """INSERT OR IGNORE INTO swap_events 
+               (transaction_hash, trader_wallet, swap_type, cope_amount, 
+                bnb_amount, cope_tax_amount, block_number, block_timestamp)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(s['transaction_hash'], s['trader_wallet'].lower(), s['swap_type'],
+              str(int(s['cope_amount'])), str(int(s['bnb_amount'])), str(int(s['cope_tax_amount'])),
+              s['block_number'], s['block_timestamp'])
+             for s in swaps]
+        )
+        
+        # Rows past the previous max id are the ones this batch actually inserted
+        async with db.execute(
+            "SELECT transaction_hash, id FROM swap_events WHERE id > ?", (last_id,)
+        ) as cursor:
+            new_ids = dict(await cursor.fetchall())
+        
+        inserted = []
+        for swap in swaps:
+            if swap['transaction_hash'] in new_ids:
+                # First occurrence wins
+                inserted.append({**swap, 'id': new_ids.pop(swap['transaction_hash']), 'first_trade': False})
+        
+        # Fold the new rows into the per-referrer running totals
+        await db.execute(
+            """INSERT INTO referrer_aggregates 
+               (referrer_wallet, total_tax, total_volume, last_updated_block)
+               SELECT wrm.referrer_wallet, wei_sum(se.cope_tax_amount), 
+                      wei_sum(se.cope_amount), MAX(se.block_number)
+               FROM swap_events se
+               JOIN wallet_referrer_mapping wrm ON se.trader_wallet = wrm.referred_wallet
+               WHERE se.id > ?
+               GROUP BY wrm.referrer_wallet
+               ON CONFLICT(referrer_wallet) DO UPDATE SET
+                   total_tax = wei_add(total_tax, excluded.total_tax),
+                   total_volume = wei_add(total_volume, excluded.total_volume),
+                   last_updated_block = MAX(last_updated_block, excluded.last_updated_block),
+                   updated_at = CURRENT_TIMESTAMP""",
+            (last_id,)
+        )
+        
+        # Lock mapping on first trade, picking the earliest recorded trade per wallet
+        wallets = sorted({s['trader_wallet'].lower() for s in inserted})
+        first_traders = set()
+        for chunk in _chunks(wallets, SQL_IN_CHUNK_SIZE):
+            # Wallets about to lock are trading for the first time
             async with db.execute(
-                "SELECT referrer_wallet FROM wallet_referrer_mapping WHERE referred_wallet = ?",
-                (wallet_address.lower(),)
+                f"""SELECT referred_wallet, referrer_wallet FROM wallet_referrer_mapping
+                    WHERE is_locked = 0 AND referred_wallet IN ({_placeholders(len(chunk))})""",
+                chunk
+            ) as cursor:
+                unlocked = await cursor.fetchall()
+            if not unlocked:
+                continue
+            
+            first_traders.update(row[0] for row in unlocked)
+            new_traders: Dict[str, int] = {}
+            for _, referrer in unlocked:
+                new_traders[referrer] = new_traders.get(referrer, 0) + 1
+            await db.executemany(
+                """INSERT INTO referrer_aggregates (referrer_wallet, traded_count)
+                   VALUES (?, ?)
+                   ON CONFLICT(referrer_wallet) DO UPDATE SET
+                       traded_count = traded_count + excluded.traded_count""",
+                list(new_traders.items())
+            )
+            await db.execute(
+                f"""UPDATE wallet_referrer_mapping 
+                    SET is_locked = 1,
+                        (first_trade_hash, first_trade_at) = (
+                            SELECT se.transaction_hash, se.block_timestamp
+                            FROM swap_events se
+                            WHERE se.trader_wallet = wallet_referrer_mapping.referred_wallet
+                            ORDER BY se.block_number, se.id
+                            LIMIT 1
+                        )
+                    WHERE is_locked = 0 AND referred_wallet IN ({_placeholders(len(chunk))})""",
+                chunk
+            )
+        
+        # Flag each first trader's earliest swap in this batch
+        for swap in inserted:
+            wallet = swap['trader_wallet'].lower()
+            if wallet in first_traders:
+                swap['first_trade'] = True
+                first_traders.discard(wallet)
+        
+        late = sum(1 for swap in inserted if swap['transaction_hash'] in late_hashes)
+        if late:
+            logger.warning(
+                f"Recorded {late} swaps in already sealed settlement weeks; they count toward "
+                f"lifetime totals but not those weeks' rewards"
+            )
+        return inserted
+    
+    # Listener Checkpoints
+    async def _save_listener_checkpoint(self, db: aiosqlite.Connection, listener: str, block: int,
+                                        block_timestamp: Optional[datetime] = None):
+        """Advance a listener's saved position (caller commits)"""
+        await db.execute(
+            """INSERT INTO listener_state (listener, last_processed_block, block_timestamp, updated_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(listener) DO UPDATE SET
+                   last_processed_block = excluded.last_processed_block,
+                   block_timestamp = excluded.block_timestamp,
+                   updated_at = excluded.updated_at""",
+            (listener, block, block_timestamp, datetime.utcnow())
+        )
+    
+    async def save_listener_checkpoint(self, listener: str, block: int,
+                                       block_timestamp: Optional[datetime] = None):
+        """Set a listener_state row outside a swap batch"""
+        async def save(db: aiosqlite.Connection):
+            await self._save_listener_checkpoint(db, listener, block, block_timestamp)
+        
+        await (await self.submit_write(save))
+    
+    async def get_listener_checkpoint(self, listener: str) -> Optional[int]:
+        """Last block the listener fully processed, or None if it has never run"""
+        async with self._read() as db:
+            async with db.execute(
+                "SELECT last_processed_block FROM listener_state WHERE listener = ?", (listener,)
             ) as cursor:
                 result = await cursor.fetchone()
-                return result[0] if result else None
+        return result[0] if result else None
     
-    async def lock_mapping_on_first_trade(self, referred_wallet: str, 
-                                         transaction_hash: str, trade_timestamp: datetime):
+    async def get_listener_checkpoint_time(self, listener: str) -> Optional[datetime]:
+        """Timestamp of a listener's saved block, or None if it wasn't recorded"""
+        async with self._read() as db:
+            async with db.execute(
+                "SELECT block_timestamp FROM listener_state WHERE listener = ?", (listener,)
+            ) as cursor:
+                result = await cursor.fetchone()
+        return datetime.fromisoformat(result[0]) if result and result[0] else None
+    
+    # Provisional Swaps (reorg handling)
+    async def record_pending_swaps(self, listener: str, swaps: List[Dict],
+                                   blocks: List[Tuple[int, str, Optional[str]]],
+                                   last_block: Optional[int] = None) -> int:
+        """
+        Record swaps from unconfirmed blocks without touching swap_events or mappings
+        Each swap carries its 'block_hash'; `blocks` are (number, hash, parent_hash)
+        of processed blocks to remember for reorg detection. The listener checkpoint
+        advances to `last_block` in the same transaction.
+        Returns: number of swaps newly staged
         """
-        Lock the referrer mapping when first trade occurs
-        This prevents retroactive changes to referrer assignment
+        async def insert(db: aiosqlite.Connection) -> int:
+            before = db.total_changes
+            await db.executemany(
+                """INSERT OR IGNORE INTO pending_swaps
+                   (transaction_hash, trader_wallet, referrer_wallet, swap_type, cope_amount,
+                    bnb_amount, cope_tax_amount, block_number, block_hash, block_timestamp, log_index)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(s['transaction_hash'], s['trader_wallet'].lower(), s.get('referrer_wallet'), s['swap_type'],
+                  str(int(s['cope_amount'])), str(int(s['bnb_amount'])), str(int(s['cope_tax_amount'])),
+                  s['block_number'], s['block_hash'], s['block_timestamp'], s.get('log_index', 0))
+                 for s in swaps]
+            )
+            staged = db.total_changes - before
+            await db.executemany(
+                """INSERT OR REPLACE INTO listener_blocks (listener, block_number, block_hash, parent_hash)
+                   VALUES (?, ?, ?, ?)""",
+                [(listener, number, block_hash, parent_hash) for number, block_hash, parent_hash in blocks]
+            )
+            if last_block is not None:
+                await self._save_listener_checkpoint(db, listener, last_block)
+            return staged
+        
+        return await (await self.submit_write(insert))
+    
+    async def get_block_hashes(self, listener: str, up_to_block: Optional[int] = None) -> List[Tuple[int, str]]:
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        Every (block number, hash) the listener has built on and not yet confirmed:
+        remembered blocks plus the blocks of pending swaps, lowest first
+        """
+        limit = up_to_block if up_to_block is not None else 2 ** 63 - 1
+        async with self._read() as db:
+            async with db.execute(
+                """SELECT block_number, block_hash FROM listener_blocks
+                   WHERE listener = ? AND block_number <= ?
+                   UNION
+                   SELECT block_number, block_hash FROM pending_swaps WHERE block_number <= ?
+                   ORDER BY block_number""",
+                (listener, limit, limit)
+            ) as cursor:
+                return [(row[0], row[1]) for row in await cursor.fetchall()]
+    
+    async def get_pending_swap_blocks(self, up_to_block: int) -> List[Tuple[int, str]]:
+        """Distinct (block number, hash) of pending swaps at or below a block"""
+        async with self._read() as db:
+            async with db.execute(
+                """SELECT DISTINCT block_number, block_hash FROM pending_swaps
+                   WHERE block_number <= ? ORDER BY block_number""",
+                (up_to_block,)
+            ) as cursor:
+                return [(row[0], row[1]) for row in await cursor.fetchall()]
+    
+    async def promote_pending_swaps(self, listener: str, confirmed_block: int,
+                                    checkpoint: Optional[Tuple[str, int, datetime]] = None) -> List[Dict]:
+        """
+        Move pending swaps at or below confirmed_block into swap_events, locking
+        first-trade mappings and updating aggregates exactly as a direct insert would,
+        and forget remembered blocks below the newest confirmed one
+        `checkpoint` is (name, block, block_timestamp), saved in the same transaction
+        Returns: the swaps newly recorded (see record_swap_events)
+        """
+        async def promote(db: aiosqlite.Connection) -> List[Dict]:
+            async with db.execute(
+                """SELECT transaction_hash, trader_wallet, referrer_wallet, swap_type, cope_amount,
+                          bnb_amount, cope_tax_amount, block_number, block_timestamp, log_index
+                   FROM pending_swaps WHERE block_number <= ?""",
+                (confirmed_block,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            swaps = [{
+                'transaction_hash': row[0],
+                'trader_wallet': row[1],
+                'referrer_wallet': row[2],
+                'swap_type': row[3],
+                'cope_amount': int(row[4]),
+                'bnb_amount': int(row[5]),
+                'cope_tax_amount': int(row[6]),
+                'block_number': row[7],
+                'block_timestamp': datetime.fromisoformat(row[8]),
+                'log_index': row[9],
+            } for row in rows]
+            
+            inserted = await self._insert_swap_events(db, swaps) if swaps else []
+            await db.execute("DELETE FROM pending_swaps WHERE block_number <= ?", (confirmed_block,))
             await db.execute(
-                """UPDATE wallet_referrer_mapping 
-                   SET is_locked = 1, first_trade_hash = ?, first_trade_at = ?
-                   WHERE referred_wallet = ? AND is_locked = 0""",
-                (transaction_hash, trade_timestamp, referred_wallet.lower())
+                """DELETE FROM listener_blocks WHERE listener = ? AND block_number < (
+                       SELECT MAX(block_number) FROM listener_blocks
+                       WHERE listener = ? AND block_number <= ?
+                   )""",
+                (listener, listener, confirmed_block)
             )
-            await db.commit()
+            if checkpoint is not None:
+                await self._save_listener_checkpoint(db, *checkpoint)
+            return inserted
+        
+        return await (await self.submit_write(promote))
     
-    async def is_mapping_locked(self, wallet_address: str) -> bool:
-        """Check if a wallet's referrer mapping is locked"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def rollback_listener(self, listener: str, fork_block: int) -> int:
+        """
+        Undo everything the listener staged above fork_block (the last block still
+        on the canonical chain) and move its checkpoint back there
+        Returns: number of pending swaps discarded
+        """
+        async def rollback(db: aiosqlite.Connection) -> int:
+            cursor = await db.execute("DELETE FROM pending_swaps WHERE block_number > ?", (fork_block,))
+            discarded = cursor.rowcount
+            await cursor.close()
+            await db.execute(
+                "DELETE FROM listener_blocks WHERE listener = ? AND block_number > ?", (listener, fork_block)
+            )
+            await db.execute(
+                """UPDATE listener_state SET last_processed_block = ?, updated_at = ?
+                   WHERE listener = ? AND last_processed_block > ?""",
+                (fork_block, datetime.utcnow(), listener, fork_block)
+            )
+            return discarded
+        
+        return await (await self.submit_write(rollback))
+    
+    # Swap Partitions
+    async def _attach_archive(self, db: aiosqlite.Connection, archive_path: str) -> str:
+        """Attach an archive database file (once per connection) and return its schema name"""
+        archive_path = os.path.abspath(archive_path)
+        async with db.execute("PRAGMA database_list") as cursor:
+            attached = {row[2]: row[1] for row in await cursor.fetchall()}
+        if archive_path in attached:
+            return attached[archive_path]
+        
+        index = 0
+        while f"archive{index}" in attached.values():
+            index += 1
+        schema = f"archive{index}"
+        await db.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path,))
+        return schema
+    
+    async def _refresh_swap_view(self, db: aiosqlite.Connection):
+        """
+        (Re)create the TEMP view swap_events_all on this connection: the hot
+        swap_events table plus every sealed week, wherever it is stored
+        """
+        async with db.execute("PRAGMA main.table_info(swap_events)") as cursor:
+            columns = [row[1] for row in await cursor.fetchall()]
+        async with db.execute(
+            "SELECT table_name, archive_path FROM swap_partitions ORDER BY period_start"
+        ) as cursor:
+            partitions = await cursor.fetchall()
+        
+        # `sealed` tells settled rows apart from late swaps recorded after their week was sealed
+        selects = [f"SELECT {', '.join(columns)}, 0 AS sealed FROM main.swap_events"]
+        for table_name, archive_path in partitions:
+            schema = await self._attach_archive(db, archive_path) if archive_path else "main"
+            async with db.execute(f"PRAGMA {schema}.table_info({table_name})") as cursor:
+                sealed_columns = {row[1] for row in await cursor.fetchall()}
+            # Columns added to swap_events after a week was sealed read as NULL
+            select_list = ", ".join(
+                column if column in sealed_columns else f"NULL AS {column}" for column in columns
+            )
+            selects.append(f"SELECT {select_list}, 1 AS sealed FROM {schema}.{table_name}")
+        
+        await db.execute("DROP VIEW IF EXISTS temp.swap_events_all")
+        await db.execute(f"CREATE TEMP VIEW swap_events_all AS {' UNION ALL '.join(selects)}")
+    
+    async def _ensure_swap_view(self, db: aiosqlite.Connection):
+        """Refresh swap_events_all if partitions changed since this connection last built it"""
+        # Version 0 means init_db hasn't created the schema yet
+        if self._partition_version and self._view_versions.get(id(db)) != self._partition_version:
+            await self._refresh_swap_view(db)
+            self._view_versions[id(db)] = self._partition_version
+    
+    async def seal_swap_week(self, period_start: datetime,
+                             archive_path: Optional[str] = SWAP_ARCHIVE_PATH) -> Optional[str]:
+        """
+        Seal a settled week: move its swaps out of the hot swap_events table into
+        their own table, in archive_path if given (else the main database).
+        Sealed weeks stay queryable through swap_events_all.
+        Returns: the partition's table name, or None if the week hasn't ended yet
+        """
+        period_start = week_start(period_start)
+        period_end = period_start + timedelta(days=7)
+        if period_end > datetime.utcnow():
+            logger.warning(f"Not sealing swap week {period_start:%Y-%m-%d}: it hasn't ended yet")
+            return None
+        table_name = f"swap_events_{period_start:%Y%m%d}"
+        
+        async with self._write() as db:
             async with db.execute(
-                "SELECT is_locked FROM wallet_referrer_mapping WHERE referred_wallet = ?",
-                (wallet_address.lower(),)
+                "SELECT table_name FROM swap_partitions WHERE period_start = ?", (period_start,)
             ) as cursor:
-                result = await cursor.fetchone()
-                return result[0] == 1 if result else False
+                existing = await cursor.fetchone()
+            if existing:
+                return existing[0]
+            
+            # ATTACH isn't allowed inside a transaction
+            schema = await self._attach_archive(db, archive_path) if archive_path else "main"
+            await db.execute("BEGIN")
+            # The registry row is written last, so an unregistered table is left
+            # over from an interrupted seal and its rows are still in swap_events
+            await db.execute(f"DROP TABLE IF EXISTS {schema}.{table_name}")
+            await db.execute(
+                f"""CREATE TABLE {schema}.{table_name} AS
+                    SELECT * FROM main.swap_events
+                    WHERE block_timestamp >= ? AND block_timestamp < ?
+                    ORDER BY id""",
+                (period_start, period_end)
+            )
+            await db.execute(
+                f"CREATE INDEX {schema}.idx_{table_name}_trader ON {table_name}(trader_wallet)"
+            )
+            await db.execute(
+                f"CREATE INDEX {schema}.idx_{table_name}_timestamp ON {table_name}(block_timestamp)"
+            )
+            async with db.execute(f"SELECT COUNT(*) FROM {schema}.{table_name}") as cursor:
+                row_count = (await cursor.fetchone())[0]
+            await db.execute(
+                "DELETE FROM main.swap_events WHERE block_timestamp >= ? AND block_timestamp < ?",
+                (period_start, period_end)
+            )
+            await db.execute(
+                """INSERT INTO swap_partitions 
+                   (period_start, period_end, table_name, archive_path, row_count)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (period_start, period_end, table_name,
+                 os.path.abspath(archive_path) if archive_path else None, row_count)
+            )
+            await db.commit()
+        
+        self._sealed_weeks.add(period_start)
+        self._partition_version += 1
+        logger.info(
+            f"Sealed swap week {period_start:%Y-%m-%d} into {schema}.{table_name} ({row_count} swaps)"
+        )
+        return table_name
     
-    # Swap Event Operations
-    async def record_swap_event(self, transaction_hash: str, trader_wallet: str,
-                               swap_type: str, cope_amount: float, bnb_amount: float,
-                               cope_tax_amount: float, block_number: int, 
-                               block_timestamp: datetime) -> bool:
-        """Record a COPE swap event (buy or sell)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute(
-                    """INSERT INTO swap_events 
-                       (transaction_hash, trader_wallet, swap_type, cope_amount, 
-                        bnb_amount, cope_tax_amount, block_number, block_timestamp)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (transaction_hash, trader_wallet.lower(), swap_type, cope_amount,
-                     bnb_amount, cope_tax_amount, block_number, block_timestamp)
-                )
-                await db.commit()
-                
-                # Lock mapping on first trade if not already locked
-                if not await self.is_mapping_locked(trader_wallet):
-                    await self.lock_mapping_on_first_trade(
-                        trader_wallet, transaction_hash, block_timestamp
-                    )
-                
-                return True
-            except aiosqlite.IntegrityError:
-                return False  # Transaction already recorded
+    async def get_swap_partitions(self) -> List[Dict]:
+        """Sealed swap weeks, oldest first"""
+        async with self._read() as db:
+            async with db.execute(
+                """SELECT period_start, period_end, table_name, archive_path, row_count, sealed_at
+                   FROM swap_partitions ORDER BY period_start"""
+            ) as cursor:
+                rows = await cursor.fetchall()
+        fields = ('period_start', 'period_end', 'table_name', 'archive_path', 'row_count', 'sealed_at')
+        return [dict(zip(fields, row)) for row in rows]
     
     # Reward Operations
     async def get_referral_stats(self, referrer_wallet: str) -> Dict:
         """
         Get referral statistics for a referrer wallet
+        Reads the maintained referrer_aggregates row (single primary-key lookup)
+        Amounts are integer wei; convert with utils.amounts.from_wei for display
         Returns: {
             'referred_count': int,
-            'total_tax_generated': float,
-            'accrued_rewards': float,
+            'total_tax_generated': int,
+            'total_volume': int,
+            'accrued_rewards': int,
             'withdrawable': bool
         }
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            # Count referred wallets
+        async with self._read() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM wallet_referrer_mapping WHERE referrer_wallet = ?",
+                """SELECT referred_count, total_tax, total_volume
+                   FROM referrer_aggregates WHERE referrer_wallet = ?""",
                 (referrer_wallet.lower(),)
             ) as cursor:
-                referred_count = (await cursor.fetchone())[0]
-            
-            # Calculate total tax generated and accrued rewards
-            # Sum all tax and volume from swap events where trader is a referred wallet
+                result = await cursor.fetchone()
+        
+        referred_count, total_tax, total_volume = result or (0, '0', '0')
+        total_tax = int(total_tax)
+        
+        accrued_rewards = apply_percentage(total_tax, REFERRAL_REWARD_PERCENTAGE)  # 50% to referrer
+        withdrawable = accrued_rewards >= to_wei(MIN_WITHDRAWAL_THRESHOLD)  # 100,000 COPE threshold
+        
+        return {
+            'referred_count': referred_count,
+            'total_tax_generated': total_tax,
+            'total_volume': int(total_volume),
+            'accrued_rewards': accrued_rewards,
+            'withdrawable': withdrawable
+        }
+    
+    # Referrer Aggregate Maintenance
+    _RAW_AGGREGATES_SQL = """
+        SELECT wrm.referrer_wallet,
+               COUNT(*) AS referred_count,
+               SUM(CASE WHEN s.trader_wallet IS NOT NULL THEN 1 ELSE 0 END) AS traded_count,
+               COALESCE(wei_sum(s.total_tax), '0') AS total_tax,
+               COALESCE(wei_sum(s.total_volume), '0') AS total_volume,
+               COALESCE(MAX(s.last_block), 0) AS last_updated_block
+        FROM wallet_referrer_mapping wrm
+        LEFT JOIN (
+            SELECT trader_wallet, wei_sum(cope_tax_amount) AS total_tax,
+                   wei_sum(cope_amount) AS total_volume, MAX(block_number) AS last_block
+            FROM swap_events_all
+            GROUP BY trader_wallet
+        ) s ON s.trader_wallet = wrm.referred_wallet
+        GROUP BY wrm.referrer_wallet
+    """
+    
+    async def rebuild_referrer_aggregates(self) -> int:
+        """
+        Recompute referrer_aggregates from scratch from the raw tables
+        Returns: number of referrer rows written
+        """
+        async def rebuild(db: aiosqlite.Connection) -> int:
+            await db.execute("DELETE FROM referrer_aggregates")
+            await db.execute(
+                f"""INSERT INTO referrer_aggregates 
+                    (referrer_wallet, referred_count, traded_count, total_tax,
+                     total_volume, last_updated_block)
+                    {self._RAW_AGGREGATES_SQL}"""
+            )
+            async with db.execute("SELECT COUNT(*) FROM referrer_aggregates") as cursor:
+                return (await cursor.fetchone())[0]
+        
+        return await (await self.submit_write(rebuild))
+    
+    async def verify_referrer_aggregates(self) -> List[Dict]:
+        """
+        Compare referrer_aggregates against the raw mapping/swap join
+        Returns: one dict per referrer whose stored totals disagree (empty if consistent)
+        """
+        async with self._read() as db:
+            async with db.execute(self._RAW_AGGREGATES_SQL) as cursor:
+                raw = {row[0]: row[1:] for row in await cursor.fetchall()}
             async with db.execute(
-                """SELECT SUM(se.cope_tax_amount), SUM(se.cope_amount)
-                   FROM swap_events se
-                   JOIN wallet_referrer_mapping wrm ON se.trader_wallet = wrm.referred_wallet
-                   WHERE wrm.referrer_wallet = ?""",
-                (referrer_wallet.lower(),)
+                """SELECT referrer_wallet, referred_count, traded_count, total_tax,
+                          total_volume, last_updated_block
+                   FROM referrer_aggregates"""
             ) as cursor:
-                result = await cursor.fetchone()
-                total_tax = result[0] or 0.0
-                total_volume = result[1] or 0.0
-            
-            accrued_rewards = total_tax * 0.5  # 50% to referrer
-            withdrawable = accrued_rewards >= 100000  # 100,000 COPE threshold
-            
-            return {
-                'referred_count': referred_count,
-                'total_tax_generated': float(total_tax),
-                'total_volume': float(total_volume),
-                'accrued_rewards': float(accrued_rewards),
-                'withdrawable': withdrawable
-            }
+                stored = {row[0]: row[1:] for row in await cursor.fetchall()}
+        
+        fields = ('referred_count', 'traded_count', 'total_tax', 'total_volume', 'last_updated_block')
+        empty = (0, 0, 0, 0, 0)
+        mismatches = []
+        for wallet in sorted(set(raw) | set(stored)):
+            expected = raw.get(wallet, empty)
+            actual = stored.get(wallet, empty)
+            for field, exp, act in zip(fields, expected, actual):
+                if int(exp or 0) != int(act or 0):
+                    mismatches.append({
+                        'referrer_wallet': wallet,
+                        'field': field,
+                        'expected': exp,
+                        'actual': act
+                    })
+        return mismatches
     
-    async def get_leaderboard(self, limit: int = 10) -> List[Tuple[str, float, int]]:
+    async def get_leaderboard(self, limit: int = 10) -> List[Tuple[str, int, int]]:
         """
         Get leaderboard of top referrers by accrued rewards
-        Returns: List of (wallet_address, accrued_rewards, referred_count)
+        Returns: List of (wallet_address, accrued_rewards_wei, referred_count)
+        where referred_count counts referred wallets that have traded
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._read() as db:
             async with db.execute(
-                """SELECT 
-                       wrm.referrer_wallet,
-                       SUM(se.cope_tax_amount) * 0.5 as accrued_rewards,
-                       COUNT(DISTINCT wrm.referred_wallet) as referred_count
-                   FROM wallet_referrer_mapping wrm
-                   JOIN swap_events se ON se.trader_wallet = wrm.referred_wallet
-                   GROUP BY wrm.referrer_wallet
-                   ORDER BY accrued_rewards DESC
+                """SELECT referrer_wallet, total_tax, traded_count
+                   FROM referrer_aggregates
+                   WHERE traded_count > 0
+                   ORDER BY LENGTH(total_tax) DESC, total_tax DESC
                    LIMIT ?""",
                 (limit,)
             ) as cursor:
-                return await cursor.fetchall()
+                rows = await cursor.fetchall()
+        return [
+            (wallet, apply_percentage(int(total_tax), REFERRAL_REWARD_PERCENTAGE), count)
+            for wallet, total_tax, count in rows
+        ]
+    
+    async def _referrer_totals(self, db: aiosqlite.Connection) -> List[Tuple[str, int, int]]:
+        """get_referrer_totals on a borrowed connection"""
+        async with db.execute(
+            """SELECT referrer_wallet, total_tax, traded_count
+               FROM referrer_aggregates
+               WHERE traded_count > 0"""
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [(wallet, int(total_tax), count) for wallet, total_tax, count in rows]
+    
+    async def _trader_totals(self, db: aiosqlite.Connection, period_start: datetime,
+                             period_end: datetime) -> List[Tuple[str, str, int]]:
+        """get_trader_totals_for_period on a borrowed connection"""
+        async with db.execute(
+            """SELECT wrm.referrer_wallet, se.trader_wallet, wei_sum(se.cope_tax_amount)
+               FROM swap_events_all se
+               JOIN wallet_referrer_mapping wrm ON se.trader_wallet = wrm.referred_wallet
+               WHERE se.block_timestamp >= ? AND se.block_timestamp < ?
+               GROUP BY wrm.referrer_wallet, se.trader_wallet""",
+            (period_start, period_end)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [(referrer, trader, int(total_tax)) for referrer, trader, total_tax in rows]
+    
+    async def get_referrer_totals(self) -> List[Tuple[str, int, int]]:
+        """
+        Get all-time tax totals for every referrer with trading referrals
+        Returns: List of (referrer_wallet, total_tax_wei, traded_count)
+        """
+        async with self._read() as db:
+            return await self._referrer_totals(db)
+    
+    async def get_trader_totals_for_period(self, period_start: datetime,
+                                           period_end: datetime) -> List[Tuple[str, str, int]]:
+        """
+        Get per-trader tax totals for a period, with each trader's referrer
+        Returns: List of (referrer_wallet, trader_wallet, total_tax_wei)
+        """
+        async with self._read() as db:
+            return await self._trader_totals(db, period_start, period_end)
+    
+    async def get_leaderboard_snapshot(self, period_start: datetime, period_end: datetime
+                                       ) -> Tuple[List[Tuple[str, int, int]], List[Tuple[str, str, int]], int]:
+        """
+        Referrer totals and a period's trader totals read in one transaction,
+        with the id of the last swap they include
+        Returns: (get_referrer_totals rows, get_trader_totals_for_period rows, last_swap_id)
+        """
+        async with self._read() as db:
+            # One read transaction, so all three reads see the same commit
+            await db.execute("BEGIN")
+            try:
+                async with db.execute("SELECT COALESCE(MAX(id), 0) FROM swap_events") as cursor:
+                    last_id = (await cursor.fetchone())[0]
+                referrer_totals = await self._referrer_totals(db)
+                trader_totals = await self._trader_totals(db, period_start, period_end)
+            finally:
+                await db.rollback()
+        return referrer_totals, trader_totals, last_id
     
-    async def get_settled_rewards_total(self, referrer_wallet: str) -> float:
-        """Get total amount of settled (finalized) rewards for a wallet"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def get_settled_rewards_total(self, referrer_wallet: str) -> int:
+        """Get total amount of settled (finalized) rewards for a wallet, in wei"""
+        async with self._read() as db:
             async with db.execute(
-                "SELECT SUM(referral_reward) FROM referral_rewards WHERE referrer_wallet = ? AND is_settled = 1",
+                "SELECT wei_sum(referral_reward) FROM referral_rewards WHERE referrer_wallet = ? AND is_settled = 1",
                 (referrer_wallet.lower(),)
             ) as cursor:
                 result = await cursor.fetchone()
-                return float(result[0]) if result and result[0] else 0.0
+                return int(result[0]) if result and result[0] else 0
     
-    async def calculate_weekly_rewards(self, period_start: datetime, 
-                                      period_end: datetime) -> Dict[str, float]:
+    async def calculate_weekly_taxes(self, period_start: datetime,
+                                     period_end: datetime) -> Dict[str, int]:
         """
-        Calculate referral rewards for a weekly period using wallet-referrer mapping
-        Returns: Dict mapping referrer_wallet -> reward_amount
+        Total tax generated by each referrer's referred wallets in a period
+        Swaps recorded after their week was sealed are left out: that week is settled
+        Returns: Dict mapping referrer_wallet -> total_tax_wei (one grouped query)
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            # Get all swap events in period with their referrers
+        async with self._read() as db:
             async with db.execute(
                 """SELECT 
                        wrm.referrer_wallet,
-                       SUM(se.cope_tax_amount) * 0.5 as reward
-                   FROM swap_events se
+                       wei_sum(se.cope_tax_amount) as total_tax
+                   FROM swap_events_all se
                    JOIN wallet_referrer_mapping wrm ON se.trader_wallet = wrm.referred_wallet
                    WHERE se.block_timestamp >= ? AND se.block_timestamp < ?
+                     AND (se.sealed = 1 OR NOT EXISTS (
+                         SELECT 1 FROM swap_partitions sp
+                         WHERE se.block_timestamp >= sp.period_start AND se.block_timestamp < sp.period_end
+                     ))
                    GROUP BY wrm.referrer_wallet""",
                 (period_start, period_end)
             ) as cursor:
                 results = await cursor.fetchall()
-                return {row[0]: float(row[1]) for row in results}
+                return {row[0]: int(row[1]) for row in results}
+    
+    async def calculate_weekly_rewards(self, period_start: datetime, 
+                                      period_end: datetime,
+                                      taxes: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Calculate referral rewards for a weekly period using wallet-referrer mapping
+        `taxes` is the period's calculate_weekly_taxes result, if already fetched
+        Returns: Dict mapping referrer_wallet -> reward_amount_wei
+        """
+        if taxes is None:
+            taxes = await self.calculate_weekly_taxes(period_start, period_end)
+        return {
+            wallet: apply_percentage(tax, REFERRAL_REWARD_PERCENTAGE)  # 50% to referrer
+            for wallet, tax in taxes.items()
+        }
     
     async def save_weekly_rewards(self, period_start: datetime, period_end: datetime,
-                                  rewards: Dict[str, float], merkle_root: str):
-        """Save weekly reward settlement to database"""
-        async with aiosqlite.connect(self.db_path) as db:
-            for referrer_wallet, reward_amount in rewards.items():
-                # Calculate total tax for this referrer in period
-                async with db.execute(
-                    """SELECT SUM(cope_tax_amount) 
-                       FROM swap_events se
-                       JOIN wallet_referrer_mapping wrm ON se.trader_wallet = wrm.referred_wallet
-                       WHERE wrm.referrer_wallet = ? 
-                       AND se.block_timestamp >= ? AND se.block_timestamp < ?""",
-                    (referrer_wallet, period_start, period_end)
-                ) as cursor:
-                    total_tax = (await cursor.fetchone())[0] or 0.0
-                
-                await db.execute(
-                    """INSERT INTO referral_rewards 
-                       (referrer_wallet, reward_period_start, reward_period_end,
-                        total_tax_generated, referral_reward, community_pool_contribution,
-                        is_settled, merkle_root, settled_at)
-                       VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)""",
-                    (referrer_wallet, period_start, period_end, float(total_tax),
-                     reward_amount, float(total_tax) * 0.5, merkle_root, datetime.utcnow())
-                )
+                                  rewards: Dict[str, int], merkle_root: str,
+                                  taxes: Optional[Dict[str, int]] = None):
+        """
+        Save weekly reward settlement to database in a single transaction
+        `taxes` is the per-referrer period tax from calculate_weekly_taxes; when it
+        is not supplied it is computed with one grouped query. Amounts are wei.
+        """
+        if taxes is None:
+            taxes = await self.calculate_weekly_taxes(period_start, period_end)
+        
+        settled_at = datetime.utcnow()
+        rows = []
+        for referrer_wallet, reward_amount in rewards.items():
+            total_tax = taxes.get(referrer_wallet, 0)
+            rows.append((
+                referrer_wallet, period_start, period_end, str(total_tax), str(int(reward_amount)),
+                str(apply_percentage(total_tax, COMMUNITY_POOL_PERCENTAGE)), merkle_root, settled_at
+            ))
+        
+        async with self._write() as db:
+            await db.executemany(
+                """INSERT INTO referral_rewards 
+                   (referrer_wallet, reward_period_start, reward_period_end,
+                    total_tax_generated, referral_reward, community_pool_contribution,
+                    is_settled, merkle_root, settled_at)
+                   VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)""",
+                rows
+            )
             await db.commit()
-
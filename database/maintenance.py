@@ -0,0 +1,97 @@
+"""
+Database maintenance commands for COPE Telegram Referral Bot
+Usage: python -m database.maintenance <command>
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from config import DATABASE_PATH, SWAP_ARCHIVE_PATH
+from database.db_manager import DatabaseManager
+
+
+logger = logging.getLogger(__name__)
+
+
+def _report_mismatches(mismatches) -> int:
+    """Print aggregate mismatches and return the process exit code"""
+    for mismatch in mismatches:
+        print(
+            f"MISMATCH {mismatch['referrer_wallet']} {mismatch['field']}: "
+            f"expected {mismatch['expected']}, stored {mismatch['actual']}"
+        )
+    if mismatches:
+        return 1
+    print("referrer_aggregates matches raw mapping/swap join")
+    return 0
+
+
+async def rebuild_aggregates(db: DatabaseManager, args: argparse.Namespace) -> int:
+    """Recompute referrer_aggregates and check it against the raw join"""
+    rows = await db.rebuild_referrer_aggregates()
+    print(f"Rebuilt referrer_aggregates: {rows} referrers")
+    return _report_mismatches(await db.verify_referrer_aggregates())
+
+
+async def verify_aggregates(db: DatabaseManager, args: argparse.Namespace) -> int:
+    """Check referrer_aggregates against the raw join without rewriting it"""
+    return _report_mismatches(await db.verify_referrer_aggregates())
+
+
+async def seal_week(db: DatabaseManager, args: argparse.Namespace) -> int:
+    """Seal the settlement week containing --week out of the hot swap_events table"""
+    if not args.week:
+        print("seal-week needs --week YYYY-MM-DD")
+        return 2
+    table_name = await db.seal_swap_week(
+        datetime.strptime(args.week, "%Y-%m-%d"), archive_path=args.archive or None
+    )
+    if table_name is None:
+        print(f"Week of {args.week} has not ended yet")
+        return 1
+    print(f"Week of {args.week} sealed into {table_name}")
+    return 0
+
+
+async def list_partitions(db: DatabaseManager, args: argparse.Namespace) -> int:
+    """Print the sealed swap weeks"""
+    for partition in await db.get_swap_partitions():
+        location = partition['archive_path'] or 'main'
+        print(f"{partition['period_start']}  {partition['table_name']}  {partition['row_count']} swaps  ({location})")
+    return 0
+
+
+COMMANDS = {
+    'rebuild-aggregates': rebuild_aggregates,
+    'verify-aggregates': verify_aggregates,
+    'seal-week': seal_week,
+    'partitions': list_partitions,
+}
+
+
+async def run(args: argparse.Namespace) -> int:
+    db = DatabaseManager(args.database)
+    await db.init_db()
+    try:
+        return await COMMANDS[args.command](db, args)
+    finally:
+        await db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="COPE bot database maintenance")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--database", default=DATABASE_PATH, help="SQLite database path")
+    parser.add_argument("--week", help="seal-week: any date in the week to seal (YYYY-MM-DD)")
+    parser.add_argument("--archive", default=SWAP_ARCHIVE_PATH,
+                        help="seal-week: archive database file (default: keep in main database)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 -- COPE Telegram Referral Bot Database Schema
 -- BNB Chain Referral System with Wallet-Referrer Mapping
+-- Token amounts marked (wei) are exact integer wei stored as decimal TEXT:
+-- 18-decimal amounts overflow SQLite's 64-bit INTEGER above ~9.2 COPE.
+-- Aggregate them with the wei_sum()/wei_add() functions DatabaseManager registers.
 
 -- Users table: Telegram users
 CREATE TABLE IF NOT EXISTS users (
@@ -50,24 +53,88 @@ CREATE TABLE IF NOT EXISTS swap_events (
     transaction_hash VARCHAR(66) UNIQUE NOT NULL,
     trader_wallet VARCHAR(42) NOT NULL, -- Wallet that executed the trade
     swap_type VARCHAR(10) NOT NULL, -- 'buy' or 'sell'
-    cope_amount DECIMAL(36, 18), -- COPE tokens involved
-    bnb_amount DECIMAL(36, 18), -- BNB involved
-    cope_tax_amount DECIMAL(36, 18) NOT NULL, -- Tax amount in COPE
+    cope_amount TEXT, -- COPE tokens involved (wei)
+    bnb_amount TEXT, -- BNB involved (wei)
+    cope_tax_amount TEXT NOT NULL, -- Tax amount in COPE (wei)
     block_number BIGINT NOT NULL,
     block_timestamp TIMESTAMP NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (trader_wallet) REFERENCES wallets(wallet_address)
 );
 
+-- Listener state: Last block each chain listener has fully processed
+-- Written in the same transaction as the swaps from that block range
+CREATE TABLE IF NOT EXISTS listener_state (
+    listener VARCHAR(64) PRIMARY KEY, -- e.g. 'cope_transfers'
+    last_processed_block BIGINT NOT NULL,
+    block_timestamp TIMESTAMP, -- Timestamp of last_processed_block, where the listener records it
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Pending swaps: Provisional swaps from blocks less than LISTENER_CONFIRMATIONS deep
+-- Promoted into swap_events (locking first-trade mappings) once confirmed;
+-- deleted and re-ingested if their block is reorged out
+CREATE TABLE IF NOT EXISTS pending_swaps (
+    transaction_hash VARCHAR(66) PRIMARY KEY,
+    trader_wallet VARCHAR(42) NOT NULL,
+    referrer_wallet VARCHAR(42),
+    swap_type VARCHAR(10) NOT NULL, -- 'buy' or 'sell'
+    cope_amount TEXT, -- COPE tokens involved (wei)
+    bnb_amount TEXT, -- BNB involved (wei)
+    cope_tax_amount TEXT NOT NULL, -- Tax amount in COPE (wei)
+    block_number BIGINT NOT NULL,
+    block_hash VARCHAR(66) NOT NULL,
+    block_timestamp TIMESTAMP NOT NULL,
+    log_index INTEGER NOT NULL DEFAULT 0
+);
+
+-- Listener blocks: Hashes of recently processed unconfirmed blocks, for reorg detection
+-- Pruned once confirmed, keeping the newest confirmed block as the anchor
+CREATE TABLE IF NOT EXISTS listener_blocks (
+    listener VARCHAR(64) NOT NULL,
+    block_number BIGINT NOT NULL,
+    block_hash VARCHAR(66) NOT NULL,
+    parent_hash VARCHAR(66),
+    PRIMARY KEY (listener, block_number)
+);
+
+-- Swap partitions: Registry of sealed settlement weeks
+-- Once a week is settled its swaps move out of swap_events into their own
+-- table (optionally in an attached archive file); the per-connection TEMP view
+-- swap_events_all unions swap_events with every sealed week. Swaps that arrive
+-- after their week was sealed stay in swap_events and are left out of that
+-- week's settlement
+CREATE TABLE IF NOT EXISTS swap_partitions (
+    period_start TIMESTAMP PRIMARY KEY, -- Monday 00:00 UTC
+    period_end TIMESTAMP NOT NULL, -- Following Monday 00:00 UTC (exclusive)
+    table_name VARCHAR(64) NOT NULL, -- e.g. swap_events_20250106
+    archive_path TEXT, -- Archive database file, NULL = main database
+    row_count INTEGER NOT NULL DEFAULT 0,
+    sealed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Referrer aggregates: Running per-referrer totals
+-- Maintained in the same transaction as swap inserts and mapping creation
+-- so /stats, /claim and /withdraw are a single primary-key read
+CREATE TABLE IF NOT EXISTS referrer_aggregates (
+    referrer_wallet VARCHAR(42) PRIMARY KEY,
+    referred_count INTEGER NOT NULL DEFAULT 0, -- Wallets mapped to this referrer
+    traded_count INTEGER NOT NULL DEFAULT 0, -- Mapped wallets that have traded
+    total_tax TEXT NOT NULL DEFAULT '0', -- Tax from all referred wallets' swaps (wei)
+    total_volume TEXT NOT NULL DEFAULT '0', -- COPE volume from referred wallets' swaps (wei)
+    last_updated_block BIGINT NOT NULL DEFAULT 0, -- Highest swap block included
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Rewards table: Accrued referral rewards per referrer
 CREATE TABLE IF NOT EXISTS referral_rewards (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     referrer_wallet VARCHAR(42) NOT NULL,
     reward_period_start TIMESTAMP NOT NULL, -- Start of weekly period
-    reward_period_end TIMESTAMP NOT NULL, -- End of weekly period
-    total_tax_generated DECIMAL(36, 18) DEFAULT 0, -- Total tax from all referred wallets
-    referral_reward DECIMAL(36, 18) DEFAULT 0, -- 50% of tax (referrer's share)
-    community_pool_contribution DECIMAL(36, 18) DEFAULT 0, -- 50% of tax (community pool)
+    reward_period_end TIMESTAMP NOT NULL, -- Following Monday 00:00 UTC (exclusive)
+    total_tax_generated TEXT DEFAULT '0', -- Total tax from all referred wallets (wei)
+    referral_reward TEXT DEFAULT '0', -- 50% of tax, referrer's share (wei)
+    community_pool_contribution TEXT DEFAULT '0', -- 50% of tax, community pool (wei)
     is_settled BOOLEAN DEFAULT 0, -- Whether rewards have been distributed
     merkle_root VARCHAR(66), -- Merkle root for this period (if settled)
     settled_at TIMESTAMP,
@@ -123,6 +190,9 @@ CREATE INDEX IF NOT EXISTS idx_mapping_referred ON wallet_referrer_mapping(refer
 CREATE INDEX IF NOT EXISTS idx_mapping_referrer ON wallet_referrer_mapping(referrer_wallet);
 CREATE INDEX IF NOT EXISTS idx_swap_events_trader ON swap_events(trader_wallet);
 CREATE INDEX IF NOT EXISTS idx_swap_events_timestamp ON swap_events(block_timestamp);
+CREATE INDEX IF NOT EXISTS idx_pending_swaps_block ON pending_swaps(block_number);
+-- Orders wei text numerically: longer means larger, equal lengths compare lexically
+CREATE INDEX IF NOT EXISTS idx_aggregates_tax_rank ON referrer_aggregates(LENGTH(total_tax), total_tax);
 CREATE INDEX IF NOT EXISTS idx_rewards_referrer ON referral_rewards(referrer_wallet);
 CREATE INDEX IF NOT EXISTS idx_rewards_period ON referral_rewards(reward_period_start, reward_period_end);
 CREATE INDEX IF NOT EXISTS idx_claim_history_wallet ON claim_history(wallet_address);
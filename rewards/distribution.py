@@ -5,11 +5,16 @@ Handles Merkle tree generation and reward settlement
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
 from merklelib import MerkleTree
+import asyncio
 import hashlib
 import logging
 
 from database.db_manager import DatabaseManager
-from config import MIN_WITHDRAWAL_THRESHOLD
+from chain.event_listener import COPEEventListener
+from config import (
+    MIN_WITHDRAWAL_THRESHOLD, SWAP_SEAL_ON_SETTLE, SETTLE_CONFIRMATION_POLL_INTERVAL, LISTENER_CONFIRMATIONS
+)
+from utils.amounts import from_wei, to_wei
 
 
 logger = logging.getLogger(__name__)
@@ -18,36 +23,78 @@ logger = logging.getLogger(__name__)
 class RewardDistributor:
     """Handles weekly reward distribution using wallet-referrer mapping"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager,
+                 confirmation_poll_interval: float = SETTLE_CONFIRMATION_POLL_INTERVAL,
+                 confirmations: int = LISTENER_CONFIRMATIONS):
         self.db = db_manager
+        self.confirmation_poll_interval = confirmation_poll_interval
+        # The listener's setting: without confirmations no swap is ever pending
+        self.confirmations = confirmations
     
     def calculate_weekly_period(self, date: datetime) -> Tuple[datetime, datetime]:
         """
-        Calculate weekly period (Monday 00:00 UTC to Sunday 23:59:59 UTC)
-        Returns: (period_start, period_end)
+        Calculate weekly period (Monday 00:00 UTC to the following Monday 00:00 UTC)
+        Returns: (period_start, period_end), period_end exclusive
         """
         # Get Monday of the week
         days_since_monday = date.weekday()
         monday = date - timedelta(days=days_since_monday)
         period_start = monday.replace(hour=0, minute=0, second=0, microsecond=0)
         
-        # Get Sunday 23:59:59 of the week
-        period_end = period_start + timedelta(days=7) - timedelta(seconds=1)
+        # Swaps up to the last second of Sunday belong to this week
+        period_end = period_start + timedelta(days=7)
         
         return period_start, period_end
     
-    async def generate_merkle_tree(self, rewards: Dict[str, float]) -> Tuple[MerkleTree, Dict[str, str]]:
+    def calculate_completed_period(self, date: datetime) -> Tuple[datetime, datetime]:
         """
-        Generate Merkle tree for reward distribution
+        The last weekly period that ended before `date`
+        (at the Monday 00:00 UTC trigger this is the week that just finished)
+        """
+        return self.calculate_weekly_period(date - timedelta(days=7))
+    
+    async def settle_completed_week(self, now: Optional[datetime] = None) -> Optional[str]:
+        """
+        Scheduled weekly run: settle (and seal) the week that just ended, once
+        none of its swaps can still be pending confirmation
+        Returns: Merkle root hash, or None if nothing was eligible
+        """
+        period_start, period_end = self.calculate_completed_period(now or datetime.utcnow())
+        if self.confirmations:
+            await self.wait_for_confirmed(period_end)
+        return await self.settle_weekly_rewards(period_start, period_end)
+    
+    async def wait_for_confirmed(self, period_end: datetime):
+        """
+        Wait until the listener's confirmed checkpoint is a block at or past period_end
+        Swaps still pending at settlement would be promoted as late swaps and never paid
+        """
+        waiting = False
+        while True:
+            confirmed_at = await self.db.get_listener_checkpoint_time(COPEEventListener.CONFIRMED_NAME)
+            if confirmed_at is not None and confirmed_at >= period_end:
+                return
+            if not waiting:
+                logger.info(
+                    f"Waiting to settle the week ending {period_end}: "
+                    f"swaps confirmed up to {confirmed_at or 'no block yet'}"
+                )
+                waiting = True
+            await asyncio.sleep(self.confirmation_poll_interval)
+    
+    async def generate_merkle_tree(self, rewards: Dict[str, int]) -> Tuple[MerkleTree, Dict[str, str]]:
+        """
+        Generate Merkle tree for reward distribution (reward amounts in wei)
         Returns: (merkle_tree, leaf_data_dict)
         
         Only includes wallets with rewards >= MIN_WITHDRAWAL_THRESHOLD
         """
         # Filter rewards by threshold
+        threshold = to_wei(MIN_WITHDRAWAL_THRESHOLD)
         eligible_rewards = {
             wallet: amount 
             for wallet, amount in rewards.items() 
-            if amount >= MIN_WITHDRAWAL_THRESHOLD
+            if amount >= threshold
         }
         
         if not eligible_rewards:
@@ -60,7 +107,7 @@ class RewardDistributor:
         
         for wallet, amount in eligible_rewards.items():
             # Create leaf: hash(wallet_address + amount)
-            leaf_string = f"{wallet.lower()}{int(amount * 1e18)}"  # Amount in smallest unit
+            leaf_string = f"{wallet.lower()}{amount}"  # Amount in smallest unit (wei)
             leaf_hash = hashlib.sha256(leaf_string.encode()).hexdigest()
             leaves.append(leaf_hash)
             leaf_data[leaf_hash] = {
@@ -85,10 +132,13 @@ class RewardDistributor:
         logger.info(f"Settling weekly rewards for period {period_start} to {period_end}")
         
         # Calculate rewards using wallet-referrer mapping
-        rewards = await self.db.calculate_weekly_rewards(period_start, period_end)
+        # The per-referrer tax is kept so persistence doesn't query it again
+        taxes = await self.db.calculate_weekly_taxes(period_start, period_end)
+        rewards = await self.db.calculate_weekly_rewards(period_start, period_end, taxes=taxes)
         
         if not rewards:
             logger.info("No rewards to settle for this period")
+            await self.seal_period(period_start)
             return None
         
         # Generate Merkle tree
@@ -96,27 +146,43 @@ class RewardDistributor:
         
         if merkle_tree is None:
             logger.warning("No eligible rewards above threshold")
+            await self.seal_period(period_start)
             return None
         
         # Get Merkle root
         merkle_root = merkle_tree.merkle_root
         
         # Save to database
-        await self.db.save_weekly_rewards(period_start, period_end, rewards, merkle_root)
+        await self.db.save_weekly_rewards(period_start, period_end, rewards, merkle_root, taxes=taxes)
         
         logger.info(f"Weekly rewards settled. Merkle root: {merkle_root}")
         logger.info(f"Total eligible wallets: {len(leaf_data)}")
-        logger.info(f"Total reward amount: {sum(r for r in rewards.values() if r >= MIN_WITHDRAWAL_THRESHOLD):,.2f} COPE")
+        eligible_total = sum(r for r in rewards.values() if r >= to_wei(MIN_WITHDRAWAL_THRESHOLD))
+        logger.info(f"Total reward amount: {from_wei(eligible_total):,.2f} COPE")
         
+        await self.seal_period(period_start)
         return merkle_root
     
+    async def seal_period(self, period_start: datetime):
+        """
+        Move a finalised week's swaps out of the hot table
+        (the database refuses weeks that haven't ended yet)
+        """
+        if not SWAP_SEAL_ON_SETTLE:
+            return
+        try:
+            await self.db.seal_swap_week(period_start)
+        except Exception as e:
+            # Settlement already succeeded; sealing can be retried from the maintenance CLI
+            logger.error(f"Failed to seal swap week {period_start}: {e}")
+    
     async def get_claim_proof(self, wallet_address: str, period_start: datetime, 
                              period_end: datetime) -> Optional[Dict]:
         """
         Get Merkle proof for a wallet's claim
         Returns: {
             'wallet': str,
-            'amount': float,
+            'amount': int,  # wei
             'proof': List[str],
             'merkle_root': str
         }
@@ -128,7 +194,7 @@ class RewardDistributor:
             return None
         
         amount = rewards[wallet_address.lower()]
-        if amount < MIN_WITHDRAWAL_THRESHOLD:
+        if amount < to_wei(MIN_WITHDRAWAL_THRESHOLD):
             return None
         
         # Generate Merkle tree
@@ -0,0 +1,173 @@
+"""
+In-memory referrer leaderboards
+Seeded from the database at startup and updated from the swap ingestion stream
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import logging
+
+from database.db_manager import DatabaseManager
+from utils.amounts import apply_percentage
+from utils.periods import week_start
+from config import REFERRAL_REWARD_PERCENTAGE, LEADERBOARD_RECONCILE_INTERVAL
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Board:
+    """Tax totals (wei) per referrer with a cached top-K ranking"""
+
+    def __init__(self):
+        self.total_tax: Dict[str, int] = {}
+        self.referred_count: Dict[str, int] = {}
+        self._ranking: Optional[List[Tuple[str, int, int]]] = None
+
+    def add(self, referrer: str, tax: int, new_referrals: int = 0):
+        self.total_tax[referrer] = self.total_tax.get(referrer, 0) + tax
+        if new_referrals:
+            self.referred_count[referrer] = self.referred_count.get(referrer, 0) + new_referrals
+        self._ranking = None
+
+    def top(self, limit: int) -> List[Tuple[str, int, int]]:
+        """Top referrers as (wallet, accrued_rewards_wei, referred_count); re-ranked only after updates"""
+        if self._ranking is None or len(self._ranking) < min(limit, len(self.total_tax)):
+            best = heapq.nlargest(limit, self.total_tax.items(), key=lambda item: item[1])
+            self._ranking = [
+                (wallet, apply_percentage(tax, REFERRAL_REWARD_PERCENTAGE), self.referred_count.get(wallet, 0))
+                for wallet, tax in best
+            ]
+        return self._ranking[:limit]
+
+
+class LeaderboardEngine:
+    """Serves all-time and current-week leaderboards from memory"""
+
+    def __init__(self, db_manager: DatabaseManager,
+                 reconcile_interval: int = LEADERBOARD_RECONCILE_INTERVAL):
+        self.db = db_manager
+        self.reconcile_interval = reconcile_interval
+        self.all_time = _Board()
+        self.weekly = _Board()
+        self.week_start: Optional[datetime] = None
+        # Traders already counted on the weekly board (referred_count is distinct wallets)
+        self._weekly_traders: Set[str] = set()
+        # Swaps applied while reconcile() is loading, replayed onto the fresh boards
+        self._applied_during_load: Optional[List[Dict]] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    async def _load(self, now: datetime) -> Tuple[_Board, _Board, datetime, Set[str], int]:
+        """Build fresh boards from the database, with the id of the last swap they include"""
+        start = week_start(now)
+        referrer_totals, trader_totals, last_swap_id = \
+            await self.db.get_leaderboard_snapshot(start, start + timedelta(days=7))
+
+        all_time = _Board()
+        for referrer, total_tax, traded_count in referrer_totals:
+            all_time.add(referrer, total_tax, traded_count)
+
+        weekly = _Board()
+        traders = set()
+        for referrer, trader, total_tax in trader_totals:
+            weekly.add(referrer, total_tax, 1)
+            traders.add(trader)
+        return all_time, weekly, start, traders, last_swap_id
+
+    async def seed(self, now: Optional[datetime] = None):
+        """Load both boards from the database"""
+        self.all_time, self.weekly, self.week_start, self._weekly_traders, _ = \
+            await self._load(now or datetime.utcnow())
+        logger.info(
+            f"Leaderboard seeded: {len(self.all_time.total_tax)} referrers all-time, "
+            f"{len(self.weekly.total_tax)} this week"
+        )
+
+    def _roll_week(self, start: datetime):
+        self.week_start = start
+        self.weekly = _Board()
+        self._weekly_traders = set()
+
+    def apply_swaps(self, swaps: Iterable[Dict]):
+        """
+        Fold newly recorded swaps into the boards
+        Expects swaps as returned by DatabaseManager.record_swap_events, with 'referrer_wallet'
+        """
+        if self._applied_during_load is not None:
+            swaps = list(swaps)
+            self._applied_during_load.extend(swaps)
+        for swap in swaps:
+            referrer = swap.get('referrer_wallet')
+            if not referrer:
+                continue
+            referrer = referrer.lower()
+            trader = swap['trader_wallet'].lower()
+            tax = int(swap['cope_tax_amount'])
+
+            self.all_time.add(referrer, tax, 1 if swap.get('first_trade') else 0)
+
+            swap_week = week_start(swap['block_timestamp'])
+            if self.week_start is None or swap_week > self.week_start:
+                self._roll_week(swap_week)
+            if swap_week == self.week_start:
+                is_new_trader = trader not in self._weekly_traders
+                self._weekly_traders.add(trader)
+                self.weekly.add(referrer, tax, 1 if is_new_trader else 0)
+
+    def get_leaderboard(self, limit: int = 10, weekly: bool = False) -> List[Tuple[str, int, int]]:
+        """
+        Get top referrers by accrued rewards
+        Returns: List of (wallet_address, accrued_rewards_wei, referred_count)
+        """
+        if weekly:
+            if self.week_start is None or week_start(datetime.utcnow()) > self.week_start:
+                return []  # No swaps recorded yet this week
+            return self.weekly.top(limit)
+        return self.all_time.top(limit)
+
+    async def reconcile(self, limit: int = 10) -> int:
+        """
+        Reload the boards from SQL and replace the in-memory state
+        Swaps applied during the load that the snapshot doesn't include yet
+        are replayed onto the fresh boards before they are swapped in.
+        Returns: number of top-`limit` entries that had drifted
+        """
+        self._applied_during_load = []
+        try:
+            all_time, weekly, start, traders, last_swap_id = await self._load(datetime.utcnow())
+        finally:
+            applied, self._applied_during_load = self._applied_during_load, None
+
+        live_all_time, live_weekly = self.all_time, self.weekly
+        self.all_time, self.weekly, self.week_start, self._weekly_traders = all_time, weekly, start, traders
+        self.apply_swaps(swap for swap in applied if swap['id'] > last_swap_id)
+
+        drift = 0
+        for current, fresh in ((live_all_time, self.all_time), (live_weekly, self.weekly)):
+            for ours, theirs in zip(current.top(limit), fresh.top(limit)):
+                if ours != theirs:
+                    drift += 1
+        if drift:
+            logger.warning(f"Leaderboard drift corrected: {drift} entries differed from SQL")
+        return drift
+
+    async def run_reconciliation(self):
+        """Periodically reconcile against SQL (disabled when interval is 0)"""
+        while self.reconcile_interval > 0:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Leaderboard reconciliation failed: {e}")
+
+    def start_reconciliation(self):
+        """Start the periodic reconciliation task in the running loop"""
+        if self.reconcile_interval > 0 and self._reconcile_task is None:
+            self._reconcile_task = asyncio.create_task(self.run_reconciliation())
+
+    def stop(self):
+        """Stop periodic reconciliation"""
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
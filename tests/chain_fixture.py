@@ -0,0 +1,88 @@
+"""
+Small replay fixtures for listener tests: one buy per block, so every block
+has a header and each swap is easy to pick out
+"""
+from typing import Dict, List
+
+from config import APPROVED_LIQUIDITY_POOLS, TOKEN_CONTRACT
+from benchmarks.ingest_benchmark import synthetic_fixture
+from chain.decoder import address_topic
+from chain.event_listener import COPEEventListener
+
+
+POOL = APPROVED_LIQUIDITY_POOLS[0].lower()
+FIRST_BLOCK = 40_000_000
+
+
+def trader(n: int) -> str:
+    return "0x%040x" % (0x1000 + n)
+
+
+class BuyGenerator:
+    """Stands in for FixtureGenerator: block i has one pool Transfer to trader i % traders"""
+    
+    def __init__(self, blocks: int, traders: int = 3, first_block: int = FIRST_BLOCK, fork: int = 0):
+        self.blocks = blocks
+        self.traders = traders
+        self.first_block = first_block
+        # Distinguishes the transaction hashes of a competing chain
+        self.fork = fork
+        self.pools = [POOL]
+    
+    def params(self) -> Dict:
+        return {'blocks': self.blocks, 'traders': self.traders, 'fork': self.fork}
+    
+    def logs(self) -> List[Dict]:
+        logs = []
+        for i in range(self.blocks):
+            block = self.first_block + i
+            logs.append({
+                'address': TOKEN_CONTRACT.lower(),
+                'topics': [
+                    COPEEventListener.TRANSFER_EVENT_SIGNATURE,
+                    address_topic(POOL), address_topic(trader(i % self.traders)),
+                ],
+                'data': "0x%064x" % (10 ** 21 + i),
+                'blockNumber': hex(block),
+                'blockHash': block_hash(block, self.fork),
+                'transactionHash': transaction_hash(block, self.fork),
+                'transactionIndex': hex(0),
+                'logIndex': hex(0),
+                'removed': False,
+            })
+        return logs
+
+
+def block_hash(number: int, fork: int = 0) -> str:
+    return "0x%064x" % (number + (fork << 128))
+
+
+def transaction_hash(number: int, fork: int = 0) -> str:
+    return "0x%064x" % (number + (fork << 128) + (1 << 192))
+
+
+def chain_fixture(blocks: int, traders: int = 3, first_block: int = FIRST_BLOCK) -> Dict:
+    """A replay fixture of `blocks` consecutive blocks"""
+    return synthetic_fixture(BuyGenerator(blocks, traders, first_block))
+
+
+def fork_fixture(fixture: Dict, fork_block: int, fork: int = 1) -> Dict:
+    """
+    The same chain with every block after fork_block replaced: new hashes,
+    and a buy in a different transaction in each replaced block
+    """
+    blocks = fixture['to_block'] - fork_block
+    replaced = synthetic_fixture(BuyGenerator(blocks, first_block=fork_block + 1, fork=fork))
+    for header in replaced['blocks'].values():
+        number = int(header['number'], 16)
+        header['hash'] = block_hash(number, fork)
+        header['parentHash'] = block_hash(number - 1, fork if number - 1 > fork_block else 0)
+        header['timestamp'] = fixture['blocks'][str(number)]['timestamp']
+    return {
+        **fixture,
+        'logs': [log for log in fixture['logs'] if int(log['blockNumber'], 16) <= fork_block] + replaced['logs'],
+        'blocks': {
+            **{number: header for number, header in fixture['blocks'].items() if int(number) <= fork_block},
+            **replaced['blocks'],
+        },
+    }
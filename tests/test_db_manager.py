@@ -0,0 +1,160 @@
+"""
+Swap recording, first-trade locking and derived state in DatabaseManager
+"""
+from datetime import datetime, timedelta
+import asyncio
+
+from database.db_manager import DatabaseManager
+
+
+REFERRER = '0x' + 'f' * 40
+TRADER = '0x' + '1' * 40
+START = datetime(2026, 1, 6)
+
+
+def _swap(n: int, trader: str = TRADER, block_number: int = None) -> dict:
+    """Swap n, in block n unless another block is given"""
+    block_number = n if block_number is None else block_number
+    return {
+        'transaction_hash': f"0x{n:064x}",
+        'trader_wallet': trader,
+        'swap_type': 'buy',
+        'cope_amount': 100 * 10 ** 18 + n,
+        'bnb_amount': 10 ** 16,
+        'cope_tax_amount': 6 * 10 ** 18 + n,
+        'block_number': block_number,
+        'block_timestamp': START + timedelta(seconds=3 * block_number),
+        'log_index': 0,
+    }
+
+
+async def _open(tmp_path) -> DatabaseManager:
+    db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+    await db.init_db()
+    return db
+
+
+async def _mapping(db: DatabaseManager, wallet: str) -> tuple:
+    async with db._read() as conn:
+        async with conn.execute(
+            """SELECT is_locked, first_trade_hash, first_trade_at
+               FROM wallet_referrer_mapping WHERE referred_wallet = ?""",
+            (wallet,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+
+def test_batch_locks_each_mapping_on_its_earliest_swap(tmp_path):
+    other = '0x' + '2' * 40
+    
+    async def scenario():
+        db = await _open(tmp_path)
+        try:
+            await db.create_referral_mapping(TRADER, REFERRER)
+            await db.create_referral_mapping(other, REFERRER)
+            # Out of chain order on purpose, several swaps per wallet
+            inserted = await db.record_swap_events([
+                _swap(12), _swap(10), _swap(15), _swap(11, other), _swap(14, other),
+            ])
+            return inserted, await _mapping(db, TRADER), await _mapping(db, other)
+        finally:
+            await db.close()
+    
+    inserted, trader, other_mapping = asyncio.run(scenario())
+    
+    first = [s['transaction_hash'] for s in inserted if s['first_trade']]
+    assert sorted(first) == sorted([_swap(10)['transaction_hash'], _swap(11)['transaction_hash']])
+    assert trader[:2] == (1, _swap(10)['transaction_hash'])
+    assert datetime.fromisoformat(trader[2]) == _swap(10)['block_timestamp']
+    assert other_mapping[:2] == (1, _swap(11)['transaction_hash'])
+
+
+def test_locked_mapping_is_never_overwritten(tmp_path):
+    async def scenario():
+        db = await _open(tmp_path)
+        try:
+            await db.create_referral_mapping(TRADER, REFERRER)
+            await db.record_swap_events([_swap(20)])
+            locked = await _mapping(db, TRADER)
+            # An earlier trade found later (e.g. by a backfill) doesn't re-pick the first trade
+            inserted = await db.record_swap_events([_swap(5), _swap(25)])
+            return locked, inserted, await _mapping(db, TRADER)
+        finally:
+            await db.close()
+    
+    locked, inserted, after = asyncio.run(scenario())
+    
+    assert locked[:2] == (1, _swap(20)['transaction_hash'])
+    assert len(inserted) == 2 and not any(s['first_trade'] for s in inserted)
+    assert after == locked
+
+
+def _pending(swap: dict, fork: str = 'a') -> dict:
+    return {**swap, 'block_hash': f"0x{fork * 8}{swap['block_number']:056x}"}
+
+
+def test_aggregates_match_a_full_recompute_after_rollback_and_late_swaps(tmp_path):
+    referrers = ['0x' + 'e' * 40, REFERRER]
+    traders = ['0x' + f"{i:040x}" for i in range(1, 7)]
+    listener = 'cope_transfers'
+    
+    async def scenario():
+        db = await _open(tmp_path)
+        try:
+            for i, trader in enumerate(traders):
+                await db.create_referral_mapping(trader, referrers[i % 2])
+            
+            # Blocks 10-15 staged, 10-12 confirmed, then 13-15 reorged out
+            staged = [_pending(_swap(n, traders[n % 6])) for n in range(10, 16)]
+            blocks = [(s['block_number'], s['block_hash'], None) for s in staged]
+            await db.record_pending_swaps(listener, staged, blocks, last_block=15)
+            await db.promote_pending_swaps(listener, 12)
+            discarded = await db.rollback_listener(listener, 12)
+            
+            # The replacement chain carries other trades in the same blocks
+            replacement = [_pending(_swap(n + 100, traders[(n + 1) % 6], n), 'b') for n in range(13, 16)]
+            await db.record_pending_swaps(
+                listener, replacement, [(s['block_number'], s['block_hash'], None) for s in replacement], 15
+            )
+            await db.promote_pending_swaps(listener, 15)
+            
+            # A late swap lands in a week that is already sealed
+            await db.seal_swap_week(START)
+            await db.record_swap_events([_swap(16, traders[0])])
+            
+            mismatches = await db.verify_referrer_aggregates()
+            async with db._read() as conn:
+                async with conn.execute("SELECT COUNT(*) FROM swap_events_all") as cursor:
+                    recorded = (await cursor.fetchone())[0]
+        finally:
+            await db.close()
+        return discarded, recorded, mismatches
+    
+    discarded, recorded, mismatches = asyncio.run(scenario())
+    
+    assert discarded == 3
+    assert recorded == 3 + 3 + 1
+    assert mismatches == []
+
+
+def test_mapping_a_wallet_replaces_its_cached_miss(tmp_path):
+    other = '0x' + '2' * 40
+    
+    async def scenario():
+        db = await _open(tmp_path)
+        try:
+            # Both misses are cached as unmapped
+            before = await db.get_referrers_for_wallets([TRADER, other])
+            cached = db._unmapped_wallets.get(TRADER) is True
+            await db.create_referral_mapping(TRADER, REFERRER)
+            single = await db.get_referrer_for_wallet(TRADER)
+            return before, cached, single, await db.get_referrers_for_wallets([TRADER, other])
+        finally:
+            await db.close()
+    
+    before, cached, single, batch = asyncio.run(scenario())
+    
+    assert before == {TRADER: None, other: None}
+    assert cached
+    assert single == REFERRER
+    assert batch == {TRADER: REFERRER, other: None}
@@ -0,0 +1,104 @@
+"""
+Weekly settlement as run by the Monday scheduler
+"""
+from datetime import datetime, timedelta
+import asyncio
+
+from database.db_manager import DatabaseManager
+from chain.event_listener import COPEEventListener
+from rewards.distribution import RewardDistributor
+from utils.periods import week_start
+
+
+TRADER = '0x' + '1' * 40
+REFERRER = '0x' + '2' * 40
+
+
+def _swap(transaction_hash: str, block_number: int, block_timestamp: datetime) -> dict:
+    return {
+        'transaction_hash': transaction_hash,
+        'trader_wallet': TRADER,
+        'swap_type': 'buy',
+        'cope_amount': 10 ** 20,
+        'bnb_amount': 10 ** 16,
+        'cope_tax_amount': 10 ** 18,
+        'block_number': block_number,
+        'block_timestamp': block_timestamp,
+    }
+
+
+async def _confirm(db: DatabaseManager, block_number: int, block_timestamp: datetime):
+    """Move the listener's confirmed checkpoint as promote_confirmed would"""
+    await db.save_listener_checkpoint(COPEEventListener.CONFIRMED_NAME, block_number, block_timestamp)
+
+
+def test_scheduled_run_settles_and_seals_the_week_that_just_ended(tmp_path):
+    # The scheduler fires shortly after Monday 00:00 UTC
+    trigger = week_start(datetime.utcnow()) + timedelta(seconds=30)
+    ended_week = trigger - timedelta(days=7, seconds=30)
+    
+    async def scenario():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        try:
+            await db.create_referral_mapping(TRADER, REFERRER)
+            await db.record_swap_events([
+                _swap('0x' + 'a' * 64, 1, ended_week + timedelta(days=2)),
+                _swap('0x' + 'b' * 64, 2, trigger),
+            ])
+            await _confirm(db, 2, trigger)
+            
+            await RewardDistributor(db).settle_completed_week(trigger)
+            
+            partitions = await db.get_swap_partitions()
+            async with db._read() as conn:
+                async with conn.execute("SELECT transaction_hash FROM swap_events") as cursor:
+                    hot = [row[0] for row in await cursor.fetchall()]
+        finally:
+            await db.close()
+        return partitions, hot
+    
+    partitions, hot = asyncio.run(scenario())
+    
+    assert [p['table_name'] for p in partitions] == [f"swap_events_{ended_week:%Y%m%d}"]
+    # The week that is just starting stays in the hot table
+    assert hot == ['0x' + 'b' * 64]
+
+
+def test_settlement_waits_for_confirmations_past_the_week_end(tmp_path):
+    trigger = week_start(datetime.utcnow()) + timedelta(seconds=30)
+    boundary = week_start(trigger)
+    
+    async def scenario():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        try:
+            await db.create_referral_mapping(TRADER, REFERRER)
+            await db.record_swap_events([_swap('0x' + 'a' * 64, 1, boundary - timedelta(days=3))])
+            # The last blocks of Sunday are still waiting for confirmations
+            await _confirm(db, 1, boundary - timedelta(seconds=6))
+            
+            distributor = RewardDistributor(db, confirmation_poll_interval=0.01)
+            settlement = asyncio.create_task(distributor.settle_completed_week(trigger))
+            await asyncio.sleep(0.1)
+            waited = not settlement.done()
+            
+            # Promoted once confirmed: the last second of Sunday still belongs to the week
+            await db.record_swap_events([_swap('0x' + 'b' * 64, 2, boundary - timedelta(seconds=1))])
+            await _confirm(db, 3, boundary + timedelta(seconds=2))
+            await asyncio.wait_for(settlement, timeout=5)
+            
+            taxes = await db.calculate_weekly_taxes(*distributor.calculate_completed_period(trigger))
+            async with db._read() as conn:
+                async with conn.execute("SELECT COUNT(*) FROM swap_events") as cursor:
+                    hot = (await cursor.fetchone())[0]
+        finally:
+            await db.close()
+        return waited, taxes, hot
+    
+    waited, taxes, hot = asyncio.run(scenario())
+    
+    assert waited
+    assert taxes == {REFERRER: 2 * 10 ** 18}
+    # Both swaps were sealed with the week they were paid for
+    assert hot == 0
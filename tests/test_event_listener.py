@@ -0,0 +1,52 @@
+"""
+Swap records built from COPE Transfers matched to PancakeSwap Swap logs
+"""
+from datetime import datetime
+
+from chain.event_listener import COPEEventListener
+from database.db_manager import DatabaseManager
+
+
+TRADER = '0x' + '1' * 40
+REFERRER = '0x' + '2' * 40
+EVENT = {
+    'transactionHash': '0x' + 'a' * 64,
+    'blockNumber': 100,
+    'logIndex': 3,
+    'blockHash': '0x' + 'b' * 64,
+}
+
+
+def _listener(tmp_path) -> COPEEventListener:
+    return COPEEventListener(DatabaseManager(str(tmp_path / "cope_bot.db")))
+
+
+def _buy(cope_out: int) -> dict:
+    return {'cope_in': 0, 'cope_out': cope_out, 'bnb_in': 10 ** 16, 'bnb_out': 0}
+
+
+def test_matched_buy_uses_the_observed_tax(tmp_path):
+    swap = _listener(tmp_path)._swap_record(
+        EVENT, 'buy', TRADER, 94 * 10 ** 18, datetime(2026, 1, 6), _buy(100 * 10 ** 18), REFERRER
+    )
+    
+    assert swap['cope_amount'] == 100 * 10 ** 18
+    assert swap['cope_tax_amount'] == 6 * 10 ** 18
+
+
+def test_matched_buy_that_received_everything_paid_no_tax(tmp_path):
+    amount = 100 * 10 ** 18
+    swap = _listener(tmp_path)._swap_record(
+        EVENT, 'buy', TRADER, amount, datetime(2026, 1, 6), _buy(amount), REFERRER
+    )
+    
+    # Not the placeholder rate: the pair's payout reached the buyer untaxed
+    assert swap is None
+
+
+def test_unmatched_buy_falls_back_to_the_placeholder_rate(tmp_path):
+    listener = _listener(tmp_path)
+    amount = 100 * 10 ** 18
+    swap = listener._swap_record(EVENT, 'buy', TRADER, amount, datetime(2026, 1, 6), None, REFERRER)
+    
+    assert swap['cope_tax_amount'] == listener.calculate_tax(amount, 'buy')
@@ -0,0 +1,69 @@
+"""
+In-memory leaderboards kept in step with the swap stream and SQL
+"""
+from datetime import datetime, timedelta
+import asyncio
+
+from database.db_manager import DatabaseManager
+from rewards.leaderboard import LeaderboardEngine
+
+
+REFERRER = '0x' + 'f' * 40
+TRADERS = ['0x' + c * 40 for c in '123']
+
+
+def _swap(n: int, trader: str) -> dict:
+    # Timestamped now, so the swap counts on this week's board too
+    return {
+        'transaction_hash': f"0x{n:064x}",
+        'trader_wallet': trader,
+        'referrer_wallet': REFERRER,
+        'swap_type': 'buy',
+        'cope_amount': 100 * 10 ** 18,
+        'bnb_amount': 10 ** 16,
+        'cope_tax_amount': n * 10 ** 18,
+        'block_number': n,
+        'block_timestamp': datetime.utcnow(),
+        'log_index': 0,
+    }
+
+
+def test_reconcile_keeps_swaps_applied_while_it_loads(tmp_path):
+
+    async def scenario():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        try:
+            for trader in TRADERS:
+                await db.create_referral_mapping(trader, REFERRER)
+            engine = LeaderboardEngine(db, reconcile_interval=0)
+            await engine.seed()
+            engine.apply_swaps(await db.record_swap_events([_swap(1, TRADERS[0])]))
+            
+            snapshot = db.get_leaderboard_snapshot
+            
+            async def interleaved(*args):
+                # Recorded before the snapshot is read: already in SQL, must not count twice
+                engine.apply_swaps(await db.record_swap_events([_swap(2, TRADERS[1])]))
+                result = await snapshot(*args)
+                # Recorded after it: missing from SQL, must be replayed
+                engine.apply_swaps(await db.record_swap_events([_swap(3, TRADERS[2])]))
+                return result
+            
+            db.get_leaderboard_snapshot = interleaved
+            await engine.reconcile()
+            db.get_leaderboard_snapshot = snapshot
+            
+            live = (engine.get_leaderboard(), engine.get_leaderboard(weekly=True))
+            fresh = LeaderboardEngine(db, reconcile_interval=0)
+            await fresh.seed()
+            return live, (fresh.get_leaderboard(), fresh.get_leaderboard(weekly=True))
+        finally:
+            await db.close()
+    
+    (all_time, weekly), expected = asyncio.run(scenario())
+    
+    assert (all_time, weekly) == expected
+    # 50% of 1 + 2 + 3 COPE tax, from three traders
+    assert all_time == [(REFERRER, 3 * 10 ** 18, 3)]
+    assert weekly == all_time
@@ -0,0 +1,181 @@
+"""
+Reorgs that land while the staged pipeline has ranges in flight
+"""
+from typing import Dict, List, Tuple
+import asyncio
+
+import chain.pipeline as pipeline
+from chain.event_listener import COPEEventListener
+from chain.pipeline import STAGES, IngestionPipeline
+from chain.ranges import BlockRangeController
+from chain.replay import ReplayRPCClient
+from database.db_manager import DatabaseManager
+from tests.chain_fixture import FIRST_BLOCK, chain_fixture, fork_fixture, trader, transaction_hash
+
+
+REFERRER = '0x' + 'f' * 40
+CONFIRMATIONS = 5
+# Last block both chains share
+FORK_BLOCK = FIRST_BLOCK + 7
+
+
+async def _rows(db: DatabaseManager, table: str) -> List[Tuple[str, int]]:
+    async with db._read() as conn:
+        async with conn.execute(
+            f"SELECT transaction_hash, block_number FROM {table} ORDER BY block_number"
+        ) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+
+def _expected(offsets, fork: int = 0) -> List[Tuple[str, int]]:
+    return [(transaction_hash(FIRST_BLOCK + n, fork), FIRST_BLOCK + n) for n in offsets]
+
+
+async def _until(condition, timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _run(tmp_path, monkeypatch, scenario, blocks: int) -> Dict:
+    """
+    Run scenario(listener, pipeline, rpc, fixture, gate) against a replay node
+    whose head starts at the fixture's eleventh block, one block per range and
+    one range per queue; the block range in `gate['block']` is not persisted
+    until `gate['open']` is set. Returns the scenario's result, the pipeline's
+    stats, the listener's reorgs and the swap tables.
+    """
+    monkeypatch.setattr(pipeline, 'LISTENER_POLL_INTERVAL', 0.01)
+    fixture = chain_fixture(blocks)
+    
+    async def main():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        rpc = ReplayRPCClient(fixture)
+        rpc.head = FIRST_BLOCK + 10
+        listener = COPEEventListener(db, rpc=rpc, confirmations=CONFIRMATIONS)
+        listener.ranges = BlockRangeController(initial=1, minimum=1, maximum=1)
+        listener.last_processed_block = FIRST_BLOCK
+        ingestion = IngestionPipeline(listener, depth=1)
+        gate = {'block': None, 'open': asyncio.Event()}
+        
+        def gated(write):
+            async def persist(events, swaps, end_block, *args):
+                if end_block == gate['block']:
+                    await gate['open'].wait()
+                return await write(events, swaps, end_block, *args)
+            return persist
+        
+        listener.commit_block_range = gated(listener.commit_block_range)
+        listener.stage_block_range = gated(listener.stage_block_range)
+        try:
+            for n in range(3):
+                await db.create_referral_mapping(trader(n), REFERRER)
+            listener.is_running = True
+            task = asyncio.create_task(ingestion.run())
+            try:
+                result = await scenario(listener, ingestion, rpc, fixture, gate)
+            finally:
+                listener.stop()
+                await asyncio.wait_for(task, 5)
+            return {
+                'result': result,
+                'stats': ingestion.stats(),
+                'reorgs': listener.reorgs,
+                'recorded': await _rows(db, "swap_events"),
+                'pending': await _rows(db, "pending_swaps"),
+            }
+        finally:
+            await rpc.close()
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+def _caught_up(listener: COPEEventListener, block: int):
+    return lambda: listener.last_processed_block == block
+
+
+def _stalled(ingestion: IngestionPipeline, ranges: int):
+    """True once `ranges` have been fetched and every queue is full"""
+    return lambda: (
+        ingestion.stats()['stages']['fetch']['ranges'] == ranges
+        and all(queue.full() for queue in ingestion.queues.values())
+    )
+
+
+def _dropped(stats: Dict) -> Dict[str, int]:
+    return {stage: stats['stages'][stage]['dropped'] for stage in STAGES}
+
+
+def test_reorg_found_while_promoting_discards_the_ranges_in_flight(tmp_path, monkeypatch):
+
+    async def scenario(listener, ingestion, rpc, fixture, gate):
+        # Blocks 6-10 are staged, waiting for confirmations
+        await _until(_caught_up(listener, FIRST_BLOCK + 10))
+        
+        # The chain replaces blocks 8-10 and moves well past them before the next
+        # poll: block 11 comes back confirmed, so nothing checks its parent
+        gate['block'] = FIRST_BLOCK + 11
+        rpc.serve(fork_fixture(fixture, FORK_BLOCK))
+        rpc.head = FIRST_BLOCK + 20
+        # Block 11 is held at the persist stage while blocks 12-17 fill the pipeline
+        await _until(_stalled(ingestion, 17))
+        gate['open'].set()
+        
+        # Promoting after block 11 finds staged blocks 8-10 were replaced
+        await _until(lambda: ingestion.generation == 1)
+        await _until(_caught_up(listener, FIRST_BLOCK + 20))
+        return listener.confirmed_block
+    
+    run = _run(tmp_path, monkeypatch, scenario, blocks=21)
+    stats = run['stats']
+    
+    assert run['reorgs'] == 1
+    assert stats['generation'] == 1
+    # Blocks 12-17 were fetched from before the rollback: each is dropped once,
+    # by whichever stage it had reached
+    assert _dropped(stats) == {'fetch': 0, 'decode': 2, 'enrich': 2, 'persist': 2}
+    fetched = stats['stages']['fetch']['ranges']
+    # 1-10, 11-17, then 8-20 again after rolling back to block 7
+    assert fetched == 10 + 7 + 13
+    assert stats['stages']['persist']['ranges'] + sum(_dropped(stats).values()) == fetched
+    
+    assert run['result'] == FIRST_BLOCK + 20 - CONFIRMATIONS
+    # The replaced blocks' swaps never became final; the fork's are recorded once
+    assert run['recorded'] == _expected(range(1, 8)) + _expected(range(8, 16), fork=1)
+    assert run['pending'] == _expected(range(16, 21), fork=1)
+
+
+def test_fork_seen_by_the_fetch_stage_rolls_back_behind_the_ranges_ahead_of_it(tmp_path, monkeypatch):
+
+    async def scenario(listener, ingestion, rpc, fixture, gate):
+        # Block 9 is held at the persist stage, block 10 queued behind it
+        gate['block'] = FIRST_BLOCK + 9
+        await _until(lambda: ingestion.stats()['stages']['fetch']['ranges'] == 10)
+        
+        # The next block's parent is not the block 10 just fetched
+        rpc.serve(fork_fixture(fixture, FORK_BLOCK))
+        rpc.head = FIRST_BLOCK + 11
+        # Fetching waits for the persist stage to reach the marker and roll back
+        await _until(lambda: not ingestion._resynced.is_set())
+        gate['open'].set()
+        
+        await _until(lambda: ingestion.generation == 1)
+        await _until(_caught_up(listener, FIRST_BLOCK + 11))
+    
+    run = _run(tmp_path, monkeypatch, scenario, blocks=12)
+    stats = run['stats']
+    
+    assert run['reorgs'] == 1
+    assert stats['generation'] == 1
+    # Fetching stopped at the fork, so nothing was in flight behind the marker;
+    # blocks 9 and 10 ahead of it were staged, then rolled back
+    assert _dropped(stats) == {stage: 0 for stage in STAGES}
+    assert stats['stages']['fetch']['ranges'] == 10 + 4
+    assert stats['stages']['persist']['ranges'] == stats['stages']['fetch']['ranges']
+    
+    # The new head confirms block 6
+    assert run['recorded'] == _expected(range(1, 7))
+    assert run['pending'] == _expected([7]) + _expected(range(8, 12), fork=1)
@@ -0,0 +1,37 @@
+"""
+Which node errors count as an oversized eth_getLogs range
+"""
+import asyncio
+
+import pytest
+
+from chain.ranges import is_range_error
+from chain.rpc import RPCError
+
+
+@pytest.mark.parametrize("message", [
+    "exceed maximum block range: 5000",
+    "block range is too wide",
+    "query returned more than 10000 results",
+    "limit exceeded",
+    "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range",
+    "range too large, max is 1000",
+    "query timeout exceeded",
+])
+def test_oversized_range_errors_shrink_the_window(message):
+    assert is_range_error(RPCError('eth_getLogs', {'code': -32000, 'message': message}))
+
+
+@pytest.mark.parametrize("message", [
+    "value out of range",
+    "invalid argument 0: hex number > 64 bits out of range",
+    "execution reverted: amount is more than balance",
+    "too many arguments, want at most 1",
+])
+def test_unrelated_errors_do_not(message):
+    assert not is_range_error(RPCError('eth_getLogs', {'code': -32602, 'message': message}))
+
+
+def test_timeouts_and_the_limit_code_always_count():
+    assert is_range_error(asyncio.TimeoutError())
+    assert is_range_error(RPCError('eth_getLogs', {'code': -32005, 'message': 'rate limited'}))
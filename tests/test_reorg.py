@@ -0,0 +1,78 @@
+"""
+Reorg handling: the replay node switches to a fork of the chain the listener staged
+"""
+from typing import List, Tuple
+import asyncio
+
+from chain.event_listener import COPEEventListener
+from chain.replay import ReplayRPCClient
+from database.db_manager import DatabaseManager
+from tests.chain_fixture import FIRST_BLOCK, chain_fixture, fork_fixture, trader, transaction_hash
+
+
+REFERRER = '0x' + 'f' * 40
+CONFIRMATIONS = 5
+# Last block both chains share
+FORK_BLOCK = FIRST_BLOCK + 6
+
+
+async def _rows(db: DatabaseManager, table: str) -> List[Tuple[str, int]]:
+    async with db._read() as conn:
+        async with conn.execute(
+            f"SELECT transaction_hash, block_number FROM {table} ORDER BY block_number"
+        ) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+
+def _expected(offsets, fork: int = 0) -> List[Tuple[str, int]]:
+    return [(transaction_hash(FIRST_BLOCK + n, fork), FIRST_BLOCK + n) for n in offsets]
+
+
+def test_fork_rolls_back_to_the_common_ancestor(tmp_path):
+    fixture = chain_fixture(11)
+    forked = fork_fixture(fixture, FORK_BLOCK)
+    
+    async def scenario():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        rpc = ReplayRPCClient(fixture)
+        try:
+            for n in range(3):
+                await db.create_referral_mapping(trader(n), REFERRER)
+            listener = COPEEventListener(db, rpc=rpc, confirmations=CONFIRMATIONS)
+            # The fixture's first block is the listener's starting point
+            listener.last_processed_block = FIRST_BLOCK
+            rpc.head = FIRST_BLOCK + 9
+            while not await listener.poll_once():
+                pass
+            staged = await _rows(db, "pending_swaps")
+            
+            # Blocks after FORK_BLOCK are replaced, and the new chain is one block longer
+            rpc.serve(forked)
+            rpc.head = FIRST_BLOCK + 10
+            await listener.poll_once()
+            after_reorg = (
+                await _rows(db, "pending_swaps"), await _rows(db, "swap_events"),
+                await db.get_listener_checkpoint(COPEEventListener.CHECKPOINT_NAME),
+                listener.last_processed_block, listener.reorgs,
+            )
+            
+            while not await listener.poll_once():
+                pass
+            return staged, after_reorg, await _rows(db, "pending_swaps")
+        finally:
+            await rpc.close()
+            await db.close()
+    
+    staged, (pending, recorded, checkpoint, last_processed, reorgs), restaged = asyncio.run(scenario())
+    
+    assert staged == _expected(range(1, 10))
+    assert reorgs == 1
+    # Blocks up to head - CONFIRMATIONS were promoted before the reorg was noticed
+    assert recorded == _expected(range(1, 6))
+    # Swaps staged on the abandoned blocks are gone, the ancestor's is kept
+    assert pending == _expected([6])
+    assert checkpoint == FORK_BLOCK
+    assert last_processed == FORK_BLOCK
+    # Re-ingesting from the ancestor stages the fork's swaps
+    assert restaged == _expected([6]) + _expected(range(7, 11), fork=1)
@@ -0,0 +1,22 @@
+"""
+AsyncRPCClient endpoint selection
+"""
+import asyncio
+
+import pytest
+
+from chain.rpc import AsyncRPCClient
+
+
+@pytest.mark.parametrize("endpoints", [[], [""]])
+def test_no_endpoints_is_a_connection_error(endpoints):
+    
+    async def scenario():
+        rpc = AsyncRPCClient(endpoints)
+        try:
+            await rpc.block_number()
+        finally:
+            await rpc.close()
+    
+    with pytest.raises(ConnectionError, match="No RPC endpoints"):
+        asyncio.run(scenario())
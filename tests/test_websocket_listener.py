@@ -0,0 +1,239 @@
+"""
+Push mode of COPEEventListener against a local WebSocket stand-in for the node
+The stand-in answers eth_subscribe and pushes whatever the test queues; polling
+goes to a ReplayRPCClient serving the same chain
+"""
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+
+from aiohttp import WSMsgType, web
+from aiohttp.test_utils import TestServer
+
+import chain.event_listener as event_listener
+from chain.event_listener import COPEEventListener, DEXSwapEventListener
+from chain.replay import ReplayRPCClient
+from database.db_manager import DatabaseManager
+from tests.chain_fixture import FIRST_BLOCK, chain_fixture, trader, transaction_hash
+
+
+REFERRER = '0x' + 'f' * 40
+
+
+class LogNode:
+    """WebSocket endpoint that confirms eth_subscribe, then pushes queued logs"""
+    
+    def __init__(self):
+        self.subscriptions: List[Dict] = []
+        # Each item is a raw log to push, or None to drop the connection
+        self.pushes: asyncio.Queue = asyncio.Queue()
+        self.refuse = False
+        self.server: Optional[TestServer] = None
+    
+    async def handler(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        message = await ws.receive_json()
+        if self.refuse:
+            await ws.send_json({'jsonrpc': '2.0', 'id': message['id'],
+                                'error': {'code': -32601, 'message': 'subscriptions disabled'}})
+            await ws.close()
+            return ws
+        self.subscriptions.append(message['params'][1])
+        subscription = hex(len(self.subscriptions))
+        await ws.send_json({'jsonrpc': '2.0', 'id': message['id'], 'result': subscription})
+        
+        async def push():
+            while True:
+                log = await self.pushes.get()
+                if log is None:
+                    await ws.close()
+                    return
+                await ws.send_json({
+                    'jsonrpc': '2.0', 'method': 'eth_subscription',
+                    'params': {'subscription': subscription, 'result': log},
+                })
+        
+        pusher = asyncio.create_task(push())
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            pusher.cancel()
+        return ws
+    
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get('/', self.handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return str(self.server.make_url('/')).replace('http', 'ws', 1)
+    
+    async def close(self):
+        await self.server.close()
+
+
+def _block_logs(fixture: Dict, number: int) -> List[Dict]:
+    return [log for log in fixture['logs'] if int(log['blockNumber'], 16) == number]
+
+
+async def _until(condition: Callable[[], Awaitable[bool]], timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def _swap_hashes(db: DatabaseManager) -> List[str]:
+    async with db._read() as conn:
+        async with conn.execute("SELECT transaction_hash FROM swap_events ORDER BY block_number") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+
+def _hashes(*offsets: int) -> List[str]:
+    return [transaction_hash(FIRST_BLOCK + n) for n in offsets]
+
+
+def _run(tmp_path, monkeypatch, scenario, refuse: bool = False, poll_interval: float = 0.05):
+    """
+    Run scenario(node, listener, rpc, fixture, db) with the listener in push
+    mode, recording every range it polls and every log it decodes; the replay
+    node's head starts at the fixture's third block
+    """
+    monkeypatch.setattr(event_listener, 'LISTENER_POLL_INTERVAL', poll_interval)
+    monkeypatch.setattr(event_listener, 'LISTENER_WS_RECONNECT_DELAY', 0.05)
+    monkeypatch.setattr(event_listener, '_PUSH_FLUSH_DELAY', 0.01)
+    fixture = chain_fixture(10)
+    
+    async def main():
+        db = DatabaseManager(str(tmp_path / "cope_bot.db"))
+        await db.init_db()
+        node = LogNode()
+        node.refuse = refuse
+        url = await node.start()
+        rpc = ReplayRPCClient(fixture)
+        rpc.head = FIRST_BLOCK + 2
+        listener = COPEEventListener(db, rpc=rpc, confirmations=0)
+        listener.last_processed_block = FIRST_BLOCK - 1
+        listener.polled, listener.decoded = [], []
+        fetch_swap_logs, decode_block_range = listener.fetch_swap_logs, listener.decode_block_range
+        
+        async def fetch(start_block, end_block):
+            listener.polled.append((start_block, end_block))
+            return await fetch_swap_logs(start_block, end_block)
+        
+        async def decode(events):
+            listener.decoded.extend((event['transactionHash'], event['logIndex']) for event in events)
+            return await decode_block_range(events)
+        
+        listener.fetch_swap_logs, listener.decode_block_range = fetch, decode
+        try:
+            for n in range(3):
+                await db.create_referral_mapping(trader(n), REFERRER)
+            listener.is_running = True
+            task = asyncio.create_task(listener.listen_via_websocket(url))
+            try:
+                return await scenario(node, listener, rpc, fixture, db)
+            finally:
+                listener.stop()
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        finally:
+            await node.close()
+            await rpc.close()
+            await db.close()
+    
+    return asyncio.run(main())
+
+
+def _caught_up(listener: COPEEventListener, block: int) -> Callable[[], Awaitable[bool]]:
+    async def condition():
+        return listener.last_processed_block == block
+    return condition
+
+
+def _recorded(db: DatabaseManager, hashes: List[str]) -> Callable[[], Awaitable[bool]]:
+    async def condition():
+        return set(hashes) <= set(await _swap_hashes(db))
+    return condition
+
+
+def test_pushed_logs_are_recorded_before_the_poller_reaches_them(tmp_path, monkeypatch):
+    
+    async def scenario(node, listener, rpc, fixture, db):
+        await _until(_caught_up(listener, FIRST_BLOCK + 2))
+        # A new head whose logs only the subscription delivers: the next poll is a minute away
+        rpc.head = FIRST_BLOCK + 5
+        for log in _block_logs(fixture, FIRST_BLOCK + 5):
+            node.pushes.put_nowait(log)
+        await _until(_recorded(db, _hashes(5)))
+        return node.subscriptions, await _swap_hashes(db), listener.last_processed_block
+    
+    subscriptions, hashes, checkpoint = _run(tmp_path, monkeypatch, scenario, poll_interval=60)
+    
+    assert subscriptions[0]['topics'] == [[
+        COPEEventListener.TRANSFER_EVENT_SIGNATURE, DEXSwapEventListener.SWAP_EVENT_SIGNATURE
+    ]]
+    assert hashes == _hashes(0, 1, 2, 5)
+    # Pushed logs don't move the checkpoint: blocks 3 and 4 may still hold unseen logs
+    assert checkpoint == FIRST_BLOCK + 2
+
+
+def test_logs_pushed_twice_and_polled_again_are_decoded_once(tmp_path, monkeypatch):
+    
+    async def scenario(node, listener, rpc, fixture, db):
+        await _until(_caught_up(listener, FIRST_BLOCK + 2))
+        rpc.head = FIRST_BLOCK + 4
+        for number in (3, 4, 3):
+            for log in _block_logs(fixture, FIRST_BLOCK + number):
+                node.pushes.put_nowait(log)
+        await _until(_recorded(db, _hashes(3, 4)))
+        # Reconnecting polls the gap since the checkpoint, which the pushes already covered
+        node.pushes.put_nowait(None)
+        await _until(_caught_up(listener, FIRST_BLOCK + 4))
+        return listener.decoded, await _swap_hashes(db)
+    
+    decoded, hashes = _run(tmp_path, monkeypatch, scenario, poll_interval=60)
+    
+    assert sorted(decoded) == sorted(set(decoded))
+    # A Transfer and a Swap log per block
+    assert len(decoded) == 10
+    assert hashes == _hashes(0, 1, 2, 3, 4)
+
+
+def test_reconnect_resumes_polling_from_the_checkpoint(tmp_path, monkeypatch):
+    
+    async def scenario(node, listener, rpc, fixture, db):
+        await _until(_caught_up(listener, FIRST_BLOCK + 2))
+        node.pushes.put_nowait(None)  # Drop the connection
+        
+        async def resubscribed():
+            return len(node.subscriptions) == 2
+        
+        await _until(resubscribed)
+        # Blocks mined around the reconnect that the subscription never pushed
+        rpc.head = FIRST_BLOCK + 6
+        await _until(_caught_up(listener, FIRST_BLOCK + 6))
+        return listener.polled, await _swap_hashes(db)
+    
+    polled, hashes = _run(tmp_path, monkeypatch, scenario)
+    
+    assert hashes == _hashes(0, 1, 2, 3, 4, 5, 6)
+    # Each polled range starts right after the previous one: nothing skipped or fetched twice
+    assert polled[0][0] == FIRST_BLOCK
+    assert all(later[0] == earlier[1] + 1 for earlier, later in zip(polled, polled[1:]))
+    assert polled[-1][1] == FIRST_BLOCK + 6
+
+
+def test_polling_carries_ingestion_while_the_subscription_is_down(tmp_path, monkeypatch):
+    
+    async def scenario(node, listener, rpc, fixture, db):
+        await _until(_caught_up(listener, FIRST_BLOCK + 2))
+        rpc.head = fixture['to_block']
+        await _until(_caught_up(listener, fixture['to_block']))
+        return node.subscriptions, await _swap_hashes(db)
+    
+    subscriptions, hashes = _run(tmp_path, monkeypatch, scenario, refuse=True)
+    
+    assert subscriptions == []
+    assert hashes == _hashes(*range(10))
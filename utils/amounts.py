@@ -0,0 +1,29 @@
+"""
+Token amount helpers
+Amounts are kept as exact integer wei everywhere except at render time
+"""
+from decimal import Decimal
+from fractions import Fraction
+from typing import Union
+
+from config import TOKEN_DECIMALS
+
+
+WEI_PER_TOKEN = 10 ** TOKEN_DECIMALS
+
+
+def to_wei(amount: Union[int, float, str, Decimal]) -> int:
+    """Convert a token-unit amount (e.g. 1.5 COPE) to integer wei"""
+    # str() first so floats convert by their shortest repr, not their binary expansion
+    return int((Decimal(str(amount)) * WEI_PER_TOKEN).to_integral_value())
+
+
+def from_wei(wei: int) -> float:
+    """Convert integer wei to token units for display only"""
+    return float(Decimal(int(wei)) / WEI_PER_TOKEN)
+
+
+def apply_percentage(wei: int, percentage: float) -> int:
+    """Exact share of a wei amount, e.g. apply_percentage(tax, 0.5) for the referrer's half"""
+    share = Fraction(str(percentage))
+    return int(wei) * share.numerator // share.denominator
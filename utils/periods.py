@@ -0,0 +1,11 @@
+"""
+Settlement period helpers
+Weekly periods run Monday 00:00 UTC to the following Monday 00:00 UTC
+"""
+from datetime import datetime, timedelta
+
+
+def week_start(date: datetime) -> datetime:
+    """Monday 00:00 UTC of the week containing `date` (same boundaries as weekly settlement)"""
+    monday = date - timedelta(days=date.weekday())
+    return monday.replace(hour=0, minute=0, second=0, microsecond=0)